@@ -20,7 +20,7 @@ for certain keys, again depending on format.
 
 from mutagen._util import MutagenError
 from mutagen._file import FileType, StreamInfo, File
-from mutagen._tags import Tags, Metadata, PaddingInfo
+from mutagen._tags import Tags, Metadata, PaddingInfo, PictureInfo
 
 version = (1, 48, 1)
 """Version tuple."""
@@ -36,6 +36,7 @@ __all__ = [
     "Tags",
     "Metadata",
     "PaddingInfo",
+    "PictureInfo",
     "version",
     "version_string",
 ]
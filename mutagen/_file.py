@@ -8,7 +8,7 @@
 import warnings
 from typing import List
 
-from mutagen._util import DictMixin, loadfile
+from mutagen._util import DictMixin, loadfile, convert_error, MutagenError
 
 
 class FileType(DictMixin):
@@ -131,6 +131,41 @@ class FileType(DictMixin):
         if self.tags is not None:
             return self.tags.save(filething, **kwargs)
 
+    def iter_pictures(self):
+        """Yields information about all embedded pictures.
+
+        Returns:
+            Iterator[PictureInfo]
+        """
+
+        if self.tags is None:
+            return iter([])
+        return self.tags._iter_pictures()
+
+    @convert_error(IOError, MutagenError)
+    def extract_picture(self, index, dest_fileobj):
+        """Writes the image data of a picture to a file.
+
+        If the file was loaded from a path and the image data is still
+        stored as is at the same place, it gets copied straight from the
+        file using constant memory, otherwise the loaded data gets
+        written.
+
+        Args:
+            index (int): index of the picture in :meth:`iter_pictures`
+            dest_fileobj (fileobj): the file to write to
+        Raises:
+            IndexError: if there is no picture with that index
+            MutagenError
+        """
+
+        picture = list(self.iter_pictures())[index]
+        if picture.offset is not None and self.filename is not None:
+            with open(self.filename, "rb") as h:
+                if picture._copy_from(h, dest_fileobj):
+                    return
+        picture._write_data(dest_fileobj)
+
     def pprint(self) -> str:
         """
         Returns:
@@ -5,7 +5,7 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
-from ._util import loadfile
+from ._util import loadfile, get_size, copy_bytes
 
 
 class PaddingInfo(object):
@@ -73,6 +73,73 @@ class PaddingInfo(object):
             type(self).__name__, self.size, self.padding)
 
 
+class PictureInfo(object):
+    """PictureInfo()
+
+    Information about an embedded picture, as yielded by
+    :meth:`mutagen.FileType.iter_pictures`.
+
+    Attributes:
+        mime (`str`): MIME type of the image data
+        type (`int` or `None`): picture type
+            (see `mutagen.id3.PictureType`) if stored
+        desc (`str`): description, empty if none is stored
+        width (`int` or `None`): width in pixels if stored
+        height (`int` or `None`): height in pixels if stored
+        size (`int`): size of the image data in bytes
+        offset (`int` or `None`): offset of the image data in the file
+            if it is stored there as is
+    """
+
+    _HEAD_SIZE = 16
+
+    def __init__(self, write_data, size, mime, type=None, desc=u"",
+                 width=None, height=None, offset=None, head=b""):
+        # writes the image data to a file object, used if it can't be
+        # copied from the file
+        self._write_data = write_data
+        # the start of the image data, to check that the file still
+        # contains it at `offset`
+        self._head = head
+        self.mime = mime
+        self.type = type
+        self.desc = desc
+        self.width = width
+        self.height = height
+        self.size = size
+        self.offset = offset
+
+    @classmethod
+    def _from_data(cls, get_data, offset=None, **kwargs):
+        """Creates an instance for the image data returned by `get_data`,
+        without keeping a reference to it.
+        """
+
+        data = get_data()
+        head = data[:cls._HEAD_SIZE] if offset is not None else b""
+        return cls(lambda fileobj: fileobj.write(get_data()), len(data),
+                   offset=offset, head=head, **kwargs)
+
+    def _copy_from(self, fileobj, dest_fileobj):
+        """Copies the image data from `fileobj`, if it is still stored
+        at `offset` there. Returns False if not.
+        """
+
+        if self.offset is None or \
+                get_size(fileobj) < self.offset + self.size:
+            return False
+        fileobj.seek(self.offset)
+        if fileobj.read(len(self._head)) != self._head:
+            return False
+        copy_bytes(fileobj, dest_fileobj, self.offset, self.size)
+        return True
+
+    def __repr__(self):
+        return "<%s mime=%r type=%r size=%d offset=%r>" % (
+            type(self).__name__, self.mime, self.type, self.size,
+            self.offset)
+
+
 class Tags(object):
     """`Tags` is the base class for many of the tag objects in Mutagen.
 
@@ -89,6 +156,11 @@ class Tags(object):
 
         raise NotImplementedError
 
+    def _iter_pictures(self):
+        """Yields a `PictureInfo` for each embedded picture"""
+
+        return iter([])
+
 
 class Metadata(Tags):
     """Metadata(filething=None, **kwargs)
@@ -17,6 +17,9 @@ from ._util import SignalHandler, OptionParser
 
 _sig = SignalHandler()
 
+# read and write buffer size, pages get copied between them as is
+_BUFFER_SIZE = 2 ** 20
+
 
 def main(argv):
     from mutagen.ogg import OggPage
@@ -35,39 +38,58 @@ def main(argv):
     parser.add_option(
         "--m3u", dest="m3u", action="store_true", default=False,
         help="generate an m3u (playlist) file")
+    parser.add_option(
+        "--serial", dest="serials", action="append", type="int",
+        metavar='serial', help="only split out the stream with this serial "
+        "number (can be given multiple times)")
+    parser.add_option(
+        "--stats", dest="stats", action="store_true", default=False,
+        help="print the number of pages and bytes of each stream "
+        "instead of splitting")
 
     (options, args) = parser.parse_args(argv[1:])
     if not args:
         raise SystemExit(parser.print_help() or 1)
 
+    serials = options.serials and set(options.serials)
     format = {'ext': options.extension}
     for filename in args:
         with _sig.block():
             fileobjs = {}
+            stats = {}
             format["base"] = os.path.splitext(os.path.basename(filename))[0]
             with open(filename, "rb") as fileobj:
-                if options.m3u:
+                if options.m3u and not options.stats:
                     m3u = open(format["base"] + ".m3u", "w")
                     fileobjs["m3u"] = m3u
                 else:
                     m3u = None
-                while True:
-                    try:
-                        page = OggPage(fileobj)
-                    except EOFError:
-                        break
-                    else:
-                        format["stream"] = page.serial
-                        if page.serial not in fileobjs:
-                            new_filename = options.pattern % format
-                            new_fileobj = open(new_filename, "wb")
-                            fileobjs[page.serial] = new_fileobj
-                            if m3u:
-                                m3u.write(new_filename + "\r\n")
-                        fileobjs[page.serial].write(page.write())
+                for page, data in OggPage._iter_raw_pages(
+                        fileobj, _BUFFER_SIZE):
+                    serial = page.serial
+                    if serials and serial not in serials:
+                        continue
+                    if options.stats:
+                        pages, size = stats.get(serial, (0, 0))
+                        stats[serial] = (pages + 1, size + len(data))
+                        continue
+                    if serial not in fileobjs:
+                        format["stream"] = serial
+                        new_filename = options.pattern % format
+                        new_fileobj = open(
+                            new_filename, "wb", buffering=_BUFFER_SIZE)
+                        fileobjs[serial] = new_fileobj
+                        if m3u:
+                            m3u.write(new_filename + "\r\n")
+                    fileobjs[serial].write(data)
                 for f in fileobjs.values():
                     f.close()
 
+        if options.stats:
+            print(u"--", filename)
+            for serial, (pages, size) in stats.items():
+                print(u"- %d: %d pages, %d bytes" % (serial, pages, size))
+
 
 def entry_point():
     _sig.init()
@@ -11,6 +11,7 @@ You should not rely on the interfaces here being stable. They are
 intended for internal use in Mutagen only.
 """
 
+import os
 import sys
 import struct
 import codecs
@@ -849,6 +850,143 @@ def resize_bytes(fobj, old_size: int, new_size: int, offset: int) -> None:
         insert_bytes(fobj, insert_size, insert_at)
 
 
+def copy_bytes(src, dest, offset: int, count: int,
+               BUFFER_SIZE: int = _DEFAULT_BUFFER_SIZE) -> None:
+    """Copies an area of one file to the current position of another.
+
+    If both are backed by file descriptors the data gets copied by the
+    kernel using os.copy_file_range() or os.sendfile(), otherwise
+    read()/write() with a fixed size buffer is used.
+
+    Args:
+        src (fileobj): The file to copy from
+        dest (fileobj): The file to copy to
+        offset (int): The start of the area in src
+        count (int): The size of the area
+    Raises:
+        IOError: In case an operation on the fileobj fails or src is
+            too small
+        ValueError: In case invalid parameters were given
+    """
+
+    if offset < 0 or count < 0:
+        raise ValueError
+
+    try:
+        src_fd = src.fileno()
+        dest_fd = dest.fileno()
+    except (AttributeError, OSError, ValueError):
+        src_fd = dest_fd = None
+
+    if src_fd is not None and count:
+        dest.flush()
+        try:
+            start = dest.tell()
+        except (OSError, ValueError):
+            start = None
+
+        copied = 0
+        if start is not None and hasattr(os, "copy_file_range"):
+            try:
+                while copied < count:
+                    done = os.copy_file_range(
+                        src_fd, dest_fd, count - copied, offset + copied,
+                        start + copied)
+                    if not done:
+                        break
+                    copied += done
+            except OSError:
+                pass
+
+        if copied < count and hasattr(os, "sendfile"):
+            if start is not None:
+                dest.seek(start + copied)
+            try:
+                while copied < count:
+                    done = os.sendfile(
+                        dest_fd, src_fd, offset + copied, count - copied)
+                    if not done:
+                        break
+                    copied += done
+            except OSError:
+                pass
+
+        if start is not None:
+            dest.seek(start + copied)
+        offset += copied
+        count -= copied
+
+    src.seek(offset)
+    while count:
+        data = src.read(min(BUFFER_SIZE, count))
+        if not data:
+            raise IOError("area outside of file")
+        dest.write(data)
+        count -= len(data)
+
+
+class _FileData(object):
+    """Data of a file, which gets copied when written instead of being
+    kept in memory.
+
+    Args:
+        filething (filething): a path or a file object; for file objects
+            the data starts at the current position
+    """
+
+    def __init__(self, filething):
+        if is_fileobj(filething):
+            self._filename = None
+            self._fileobj = filething
+            self._offset = filething.tell()
+            self._size = get_size(filething) - self._offset
+        else:
+            self._filename = filething
+            self._fileobj = None
+            self._offset = 0
+            self._size = os.path.getsize(filething)
+
+    def __len__(self):
+        return self._size
+
+    def read(self):
+        """Returns the data"""
+
+        if self._fileobj is not None:
+            self._fileobj.seek(self._offset)
+            return read_full(self._fileobj, self._size)
+        with open(self._filename, "rb") as h:
+            return read_full(h, self._size)
+
+    def write_to(self, fileobj):
+        """Writes the data to the current position of fileobj"""
+
+        if self._fileobj is not None:
+            copy_bytes(self._fileobj, fileobj, self._offset, self._size)
+        else:
+            with open(self._filename, "rb") as h:
+                copy_bytes(h, fileobj, 0, self._size)
+
+
+def _join_parts(parts):
+    """Joins a list of bytes and _FileData"""
+
+    data = bytearray()
+    for part in parts:
+        data += part.read() if isinstance(part, _FileData) else part
+    return data
+
+
+def _write_parts(fileobj, parts):
+    """Writes a list of bytes and _FileData to the current position"""
+
+    for part in parts:
+        if isinstance(part, _FileData):
+            part.write_to(fileobj)
+        else:
+            fileobj.write(part)
+
+
 def dict_match(d, key, default=None):
     """Like __getitem__ but works as if the keys() are all filename patterns.
     Returns the value of any dict key that matches the passed key.
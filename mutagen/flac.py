@@ -21,14 +21,16 @@ http://flac.sourceforge.net/format.html
 
 __all__ = ["FLAC", "Open", "delete"]
 
+import os
 import struct
 from io import BytesIO
 from ._vorbis import VCommentDict
 import mutagen
 
 from mutagen._util import resize_bytes, MutagenError, get_size, loadfile, \
-    convert_error, bchr, endswith
-from mutagen._tags import PaddingInfo
+    convert_error, bchr, endswith, _openfile, _FileData, _join_parts, \
+    _write_parts
+from mutagen._tags import PaddingInfo, PictureInfo
 from mutagen.id3._util import BitPaddedInt
 from functools import reduce
 
@@ -73,6 +75,122 @@ class StrictFileObject(object):
         return self._fileobj.read(*args)
 
 
+def _picture_fields(picture):
+    return (picture.type, picture.mime, picture.desc, picture.width,
+            picture.height, picture.depth, picture.colors)
+
+
+def _block_state(block, data):
+    """Returns what is needed to tell later whether a loaded block was
+    changed, without keeping a second copy of large data.
+
+    `data` is the block content as read, or None for blocks which got
+    parsed from the file directly.
+    """
+
+    if isinstance(block, (VCFLACDict, Padding)):
+        return None
+    elif isinstance(block, Picture):
+        return (block._data, _picture_fields(block))
+    elif type(block) is MetadataBlock:
+        return block.data
+    return data
+
+
+def _block_unchanged(block, header, state):
+    """Returns True if the block would still be written as it was read
+    together with `header`, given the state from `_block_state`.
+
+    Pictures and unknown blocks are only compared by identity of their
+    data, the small remaining ones get rendered.
+    """
+
+    if ord(header[:1]) & 0x7F != block.code:
+        return False
+    elif isinstance(block, Picture):
+        data, fields = state
+        return block._data_source is None and block._data is data and \
+            _picture_fields(block) == fields
+    elif type(block) is MetadataBlock:
+        return block.data is state
+    return state is not None and block.write() == state
+
+
+def _read_block_headers(fileobj):
+    """Returns a list of (offset, header) of the metadata blocks starting
+    at the current position and the offset behind the last one.
+
+    The sizes in the headers are trusted, unlike in FLAC.load(), so this
+    is only for blocks which were just written.
+    """
+
+    headers = []
+    while True:
+        offset = fileobj.tell()
+        header = fileobj.read(4)
+        if len(header) != 4:
+            raise error("truncated metadata block header")
+        headers.append((offset, header))
+        fileobj.seek(offset + 4 + to_int_be(header[1:]))
+        if ord(header[:1]) & 0x80:
+            return headers, fileobj.tell()
+
+
+class _BufferedFileObject(StrictFileObject):
+    """A read-only StrictFileObject which reads ahead in large chunks.
+
+    Metadata blocks are parsed with many small reads, which for remote
+    file systems means one round trip each. This serves them from a
+    buffer which gets refilled with at least `buffer_size` bytes.
+    """
+
+    def __init__(self, fileobj, buffer_size=2 ** 16):
+        self._fileobj = fileobj
+        self._buffer_size = buffer_size
+        self._buffer = b""
+        self._start = fileobj.tell()
+        self._index = 0
+
+    def tell(self):
+        return self._start + self._index
+
+    def seek(self, offset, whence=0):
+        if whence == 0 and \
+                self._start <= offset <= self._start + len(self._buffer):
+            self._index = offset - self._start
+        else:
+            self._fileobj.seek(self.tell())
+            self._fileobj.seek(offset, whence)
+            self._start = self._fileobj.tell()
+            self._buffer = b""
+            self._index = 0
+
+    def tryread(self, size=-1):
+        available = len(self._buffer) - self._index
+        if size < 0 or size > available:
+            self._fileobj.seek(self._start + len(self._buffer))
+            if size < 0:
+                new = self._fileobj.read()
+            else:
+                new = self._fileobj.read(
+                    max(size - available, self._buffer_size))
+            self._buffer = self._buffer[self._index:] + new
+            self._start += self._index
+            self._index = 0
+            if size < 0:
+                size = len(self._buffer)
+        data = self._buffer[self._index:self._index + size]
+        self._index += len(data)
+        return data
+
+    def read(self, size=-1):
+        data = self.tryread(size)
+        if size >= 0 and len(data) != size:
+            raise error("file said %d bytes, read %d bytes" % (
+                        size, len(data)))
+        return data
+
+
 class MetadataBlock(object):
     """A generic block of FLAC metadata.
 
@@ -113,6 +231,11 @@ class MetadataBlock(object):
     def write(self):
         return self.data
 
+    def _write_parts(self):
+        """Like write(), but returns a list of bytes and `_FileData`"""
+
+        return [self.write()]
+
     @classmethod
     def _writeblock(cls, block, is_last=False):
         """Returns the block content + header.
@@ -120,10 +243,20 @@ class MetadataBlock(object):
         Raises error.
         """
 
+        return _join_parts(cls._writeblock_parts(block, is_last))
+
+    @classmethod
+    def _writeblock_parts(cls, block, is_last=False):
+        """Like _writeblock(), but returns a list of bytes and
+        `_FileData`.
+
+        Raises error.
+        """
+
         data = bytearray()
         code = (block.code | 128) if is_last else block.code
-        datum = block.write()
-        size = len(datum)
+        parts = block._write_parts()
+        size = sum(len(part) for part in parts)
         if size > cls._MAX_SIZE:
             if block._distrust_size and block._invalid_overflow_size != -1:
                 # The original size of this block was (1) wrong and (2)
@@ -138,20 +271,26 @@ class MetadataBlock(object):
         length = struct.pack(">I", size)[-3:]
         data.append(code)
         data += length
-        data += datum
-        return data
+        return [data] + parts
 
     @classmethod
     def _writeblocks(cls, blocks, available, cont_size, padding_func):
         """Render metadata block as a byte string."""
 
+        return _join_parts(
+            cls._writeblocks_parts(blocks, available, cont_size, padding_func))
+
+    @classmethod
+    def _writeblocks_parts(cls, blocks, available, cont_size, padding_func):
+        """Render metadata blocks as a list of bytes and `_FileData`."""
+
         # write everything except padding
-        data = bytearray()
+        data = []
         for block in blocks:
             if isinstance(block, Padding):
                 continue
-            data += cls._writeblock(block)
-        blockssize = len(data)
+            data += cls._writeblock_parts(block)
+        blockssize = sum(len(part) for part in data)
 
         # take the padding overhead into account. we always add one
         # to make things simple.
@@ -162,7 +301,7 @@ class MetadataBlock(object):
         info = PaddingInfo(available - blockssize, cont_size)
         padding_block.length = min(info._get_padding(padding_func),
                                    cls._MAX_SIZE)
-        data += cls._writeblock(padding_block, is_last=True)
+        data.append(cls._writeblock(padding_block, is_last=True))
 
         return data
 
@@ -355,6 +494,9 @@ class VCFLACDict(VCommentDict):
     def write(self, framing=False):
         return super(VCFLACDict, self).write(framing=framing)
 
+    def _write_parts(self):
+        return [self.write()]
+
 
 class CueSheetTrackIndex(tuple):
     """CueSheetTrackIndex(index_number, index_offset)
@@ -569,10 +711,17 @@ class Picture(MetadataBlock):
         pic.width = 500
         pic.height = 500
         pic.depth = 16 # color depth
+
+    To avoid keeping large images in memory use :meth:`set_data_file`
+    instead of setting `data`. For MP4 files see
+    :meth:`mutagen.mp4.MP4Cover.from_file`, ID3 `mutagen.id3.APIC` frames
+    always keep the image data in memory.
     """
 
     code = 6
     _distrust_size = True
+    _data_source = None
+    _data_offset = None
 
     def __init__(self, data=None):
         self.type = 0
@@ -609,7 +758,45 @@ class Picture(MetadataBlock):
          self.colors, length) = struct.unpack('>5I', data.read(20))
         self.data = data.read(length)
 
+    @property
+    def data(self):
+        if self._data_source is not None:
+            return self._data_source.read()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data_source = None
+        self._data_offset = None
+        self._data = value
+
+    def set_data_file(self, filething):
+        """Use the content of a file as image data.
+
+        The data doesn't get read into memory, but copied into the FLAC
+        file when saving, or when extracted with
+        :meth:`mutagen.FileType.extract_picture`. Accessing `data` reads
+        it. The file has to stay unchanged until then.
+
+        Args:
+            filething (filething): a path or a file object, for which the
+                data starts at its current position
+        Raises:
+            OSError
+        """
+
+        source = _FileData(filething)
+        self._data = b""
+        self._data_offset = None
+        self._data_source = source
+
     def write(self):
+        return bytes(_join_parts(self._write_parts()))
+
+    def _write_parts(self):
+        data = self._data_source
+        if data is None:
+            data = self._data
         f = BytesIO()
         mime = self.mime.encode('UTF-8')
         f.write(struct.pack('>2I', self.type, len(mime)))
@@ -618,13 +805,15 @@ class Picture(MetadataBlock):
         f.write(struct.pack('>I', len(desc)))
         f.write(desc)
         f.write(struct.pack('>5I', self.width, self.height, self.depth,
-                            self.colors, len(self.data)))
-        f.write(self.data)
-        return f.getvalue()
+                            self.colors, len(data)))
+        return [f.getvalue(), data]
 
     def __repr__(self):
+        data = self._data_source
+        if data is None:
+            data = self._data
         return "<%s '%s' (%d bytes)>" % (type(self).__name__, self.mime,
-                                         len(self.data))
+                                         len(data))
 
 
 class Padding(MetadataBlock):
@@ -669,6 +858,169 @@ class Padding(MetadataBlock):
         return "<%s (%d bytes)>" % (type(self).__name__, self.length)
 
 
+class _MetadataBlocks(list):
+    """A list of metadata blocks which keeps an index of the blocks by
+    their code.
+
+    The index is built on first use and dropped whenever the list gets
+    modified. Changing the code of a block in the list is not tracked.
+    """
+
+    _index = None
+
+    def by_code(self, code):
+        """Returns a list of all blocks with the given code, in order"""
+
+        index = self._index
+        if index is None:
+            index = {}
+            for block in self:
+                index.setdefault(block.code, []).append(block)
+            self._index = index
+        return index.get(code, [])
+
+    def __setitem__(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).__setitem__(*args)
+
+    def __delitem__(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).__delitem__(*args)
+
+    def __iadd__(self, *args):  # type: ignore[misc]
+        self._index = None
+        return super(_MetadataBlocks, self).__iadd__(*args)
+
+    def __imul__(self, *args):  # type: ignore[misc]
+        self._index = None
+        return super(_MetadataBlocks, self).__imul__(*args)
+
+    def append(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).append(*args)
+
+    def extend(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).extend(*args)
+
+    def insert(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).insert(*args)
+
+    def remove(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).remove(*args)
+
+    def pop(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).pop(*args)
+
+    def clear(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).clear(*args)
+
+    def sort(self, *args, **kwargs):
+        self._index = None
+        return super(_MetadataBlocks, self).sort(*args, **kwargs)
+
+    def reverse(self, *args):
+        self._index = None
+        return super(_MetadataBlocks, self).reverse(*args)
+
+
+def _make_crc8_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for j in range(8):
+            crc = ((crc << 1) ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+
+_CRC8_TABLE = _make_crc8_table()
+
+
+def _crc8(data):
+    """CRC-8 as used for FLAC frame headers (polynomial 0x07)."""
+
+    crc = 0
+    for byte in bytearray(data):
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+class _FrameHeader(object):
+    """A FLAC audio frame header.
+
+    Attributes:
+        variable (`bool`): if the stream uses a variable block size
+        number (`int`): the frame number for fixed block size streams,
+            the number of the first sample for variable ones
+        blocksize (`int`): number of samples in the frame
+        size (`int`): size of the header in bytes, including the CRC
+    """
+
+    MAX_SIZE = 16
+    """The maximum size of a frame header"""
+
+    def __init__(self, data):
+        """Parse the header at the start of data.
+
+        Raises error in case data doesn't start with a valid header.
+        """
+
+        data = bytearray(data[:self.MAX_SIZE])
+        if len(data) < 6 or data[0] != 0xFF or data[1] & 0xFE != 0xF8:
+            raise error("no frame sync")
+        self.variable = bool(data[1] & 1)
+
+        blocksize_code = data[2] >> 4
+        rate_code = data[2] & 0xF
+        if not blocksize_code or rate_code == 0xF:
+            raise error("reserved block size or sample rate")
+        if data[3] >> 4 > 10 or (data[3] >> 1) & 7 == 3 or data[3] & 1:
+            raise error("reserved channels or sample size")
+
+        # UTF-8 like coded frame/sample number
+        first = data[4]
+        ones = 0
+        while ones < 8 and first & (0x80 >> ones):
+            ones += 1
+        if ones == 1 or ones == 8:
+            raise error("invalid coded number")
+        number = first & (0xFF >> (ones + 1))
+        pos = 5
+        for i in range(ones - 1):
+            if pos >= len(data) or data[pos] & 0xC0 != 0x80:
+                raise error("invalid coded number")
+            number = (number << 6) | (data[pos] & 0x3F)
+            pos += 1
+        self.number = number
+
+        if blocksize_code == 1:
+            self.blocksize = 192
+        elif blocksize_code <= 5:
+            self.blocksize = 576 << (blocksize_code - 2)
+        elif blocksize_code == 6:
+            self.blocksize = to_int_be(data[pos:pos + 1]) + 1
+            pos += 1
+        elif blocksize_code == 7:
+            self.blocksize = to_int_be(data[pos:pos + 2]) + 1
+            pos += 2
+        else:
+            self.blocksize = 256 << (blocksize_code - 8)
+
+        if rate_code == 12:
+            pos += 1
+        elif rate_code in (13, 14):
+            pos += 2
+
+        if pos >= len(data) or _crc8(data[:pos]) != data[pos]:
+            raise error("frame header CRC mismatch")
+        self.size = pos + 1
+
+
 class FLAC(mutagen.FileType):
     """FLAC(filething)
 
@@ -676,6 +1028,9 @@ class FLAC(mutagen.FileType):
 
     Args:
         filething (filething)
+        scan_frames (bool): if the stream information doesn't contain the
+            number of samples, compute the length from the last audio
+            frame instead of reporting 0
 
     Attributes:
         cuesheet (`CueSheet`): if any or `None`
@@ -689,6 +1044,14 @@ class FLAC(mutagen.FileType):
 
     tags = None
 
+    _header_offset = None
+
+    _pictures_token = None
+
+    _audio_offset = None
+
+    _block_headers = None
+
     METADATA_BLOCKS = [StreamInfo, Padding, None, SeekTable, VCFLACDict,
                        CueSheet, Picture]
     """Known metadata block types, indexed by ID."""
@@ -699,8 +1062,10 @@ class FLAC(mutagen.FileType):
                 endswith(filename.lower(), ".flac") * 3)
 
     def __read_metadata_block(self, fileobj):
-        byte = ord(fileobj.read(1))
-        size = to_int_be(fileobj.read(3))
+        offset = fileobj.tell()
+        block_header = fileobj.read(4)
+        byte = ord(block_header[:1])
+        size = to_int_be(block_header[1:])
         code = byte & 0x7F
         last_block = bool(byte & 0x80)
 
@@ -724,11 +1089,20 @@ class FLAC(mutagen.FileType):
             real_size = fileobj.tell() - start
             if real_size > MetadataBlock._MAX_SIZE:
                 block._invalid_overflow_size = size
+            data = None
         else:
             data = fileobj.read(size)
             block = block_type(data)
         block.code = code
 
+        # remember where the block is and what it looked like, so the
+        # Vorbis comment can be updated in place on save
+        self._block_layout.append((block, offset, fileobj.tell(),
+                                   block_header, _block_state(block, data)))
+        if block_type is Picture:
+            block._data_offset = (
+                self._pictures_token, fileobj.tell() - len(block._data))
+
         if block.code == VCFLACDict.code:
             if self.tags is None:
                 self.tags = block
@@ -780,7 +1154,7 @@ class FLAC(mutagen.FileType):
 
     @convert_error(IOError, error)
     @loadfile()
-    def load(self, filething):
+    def load(self, filething, scan_frames=False):
         """Load file information from a filename."""
 
         fileobj = filething.fileobj
@@ -790,31 +1164,103 @@ class FLAC(mutagen.FileType):
         self.cuesheet = None
         self.seektable = None
 
-        fileobj = StrictFileObject(fileobj)
-        self.__check_header(fileobj, filething.name)
+        self._block_layout = []
+        self._pictures_token = object()
+        fileobj = _BufferedFileObject(fileobj)
+        self._header_offset = self.__check_header(fileobj, filething.name)
         while self.__read_metadata_block(fileobj):
             pass
+        audio_offset = fileobj.tell()
+        self._audio_offset = audio_offset
+        self._block_headers = [
+            (offset, header) for block, offset, end, header, state
+            in self._block_layout]
 
         try:
             self.info.length
         except (AttributeError, IndexError):
             raise FLACNoHeaderError("Stream info block not found")
 
+        if scan_frames and not self.info.total_samples:
+            samples = self.__scan_total_samples(fileobj, audio_offset)
+            if samples is not None:
+                self.info.length = samples / float(self.info.sample_rate)
+
         if self.info.length:
-            start = fileobj.tell()
-            fileobj.seek(0, 2)
+            size = get_size(filething.fileobj)
             self.info.bitrate = int(
-                float(fileobj.tell() - start) * 8 / self.info.length)
+                float(size - audio_offset) * 8 / self.info.length)
         else:
             self.info.bitrate = 0
 
+    def __frame_sample(self, header):
+        if header.variable:
+            return header.number
+        return header.number * self.info.max_blocksize
+
+    def __scan_total_samples(self, fileobj, audio_offset):
+        """Returns the number of samples up to the end of the last audio
+        frame, or None if it couldn't be found.
+
+        The end of the file is searched for frame headers with a valid
+        CRC. The last one which continues an earlier one (or is the
+        first frame) is taken, which rules out sync codes in the audio
+        data. The search area grows until a frame is found, so only the
+        tail of the file is read.
+        """
+
+        fileobj.seek(audio_offset)
+        try:
+            first = _FrameHeader(fileobj.tryread(_FrameHeader.MAX_SIZE))
+        except error:
+            return None
+        sync = b"\xff\xf9" if first.variable else b"\xff\xf8"
+
+        end = get_size(fileobj)
+        size = 2 ** 16
+        while True:
+            start = max(audio_offset, end - size)
+            fileobj.seek(start)
+            data = fileobj.read(end - start)
+
+            frames = []
+            index = data.find(sync)
+            while index != -1:
+                try:
+                    header = _FrameHeader(
+                        data[index:index + _FrameHeader.MAX_SIZE])
+                except error:
+                    pass
+                else:
+                    if header.variable == first.variable:
+                        frames.append((start + index, header))
+                index = data.find(sync, index + 1)
+
+            ends = {}
+            for i, (offset, header) in enumerate(frames):
+                ends.setdefault(
+                    self.__frame_sample(header) + header.blocksize, i)
+            for i in reversed(range(len(frames))):
+                offset, header = frames[i]
+                sample = self.__frame_sample(header)
+                if offset == audio_offset or ends.get(sample, i) < i:
+                    return sample + header.blocksize
+
+            if start == audio_offset or size >= 2 ** 24:
+                return None
+            size *= 2
+
+    @property
+    def metadata_blocks(self):
+        return self._metadata_blocks
+
+    @metadata_blocks.setter
+    def metadata_blocks(self, blocks):
+        self._metadata_blocks = _MetadataBlocks(blocks)
+
     @property
     def info(self):
-        streaminfo_blocks = [
-            block for block in self.metadata_blocks
-            if block.code == StreamInfo.code
-        ]
-        return streaminfo_blocks[0]
+        return self.metadata_blocks.by_code(StreamInfo.code)[0]
 
     def add_picture(self, picture):
         """Add a new picture to the file.
@@ -832,7 +1278,168 @@ class FLAC(mutagen.FileType):
 
     @property
     def pictures(self):
-        return [b for b in self.metadata_blocks if b.code == Picture.code]
+        return list(self.metadata_blocks.by_code(Picture.code))
+
+    def iter_pictures(self):
+        for picture in self.metadata_blocks.by_code(Picture.code):
+            kwargs = dict(mime=picture.mime, type=picture.type,
+                          desc=picture.desc, width=picture.width,
+                          height=picture.height)
+            source = picture._data_source
+            if source is not None:
+                # don't read the file, copy it only when extracting
+                yield PictureInfo(source.write_to, len(source), **kwargs)
+                continue
+            token, offset = picture._data_offset or (None, None)
+            if token is not self._pictures_token:
+                offset = None
+            yield PictureInfo._from_data(
+                lambda picture=picture: picture.data, offset=offset,
+                **kwargs)
+
+    @convert_error(IOError, error)
+    def build_seektable(self, filething=None, interval_seconds=10):
+        """Create a seek table by scanning the audio frames.
+
+        A seek point is added for the frame containing the first sample
+        of every `interval_seconds` long span of audio. The table
+        replaces the existing one, if any, and gets written with the
+        next :meth:`save`, which will usually fit it into the existing
+        padding.
+
+        Args:
+            filething (filething)
+            interval_seconds (float): time between seek points
+        Returns:
+            SeekTable: the new seek table
+        Raises:
+            mutagen.MutagenError
+
+        If no filename is given, the one most recently loaded is used.
+        The file is only read.
+        """
+
+        interval = int(interval_seconds * self.info.sample_rate)
+        if interval <= 0:
+            raise ValueError("interval_seconds too small")
+
+        if filething is None:
+            filething = self.filename
+        # read only, and unlike loadfile() on a method this doesn't
+        # replace self.filename
+        with _openfile(None, filething, None, None, False, False) as h:
+            fileobj = StrictFileObject(h.fileobj)
+            header = self.__check_header(fileobj, h.name)
+            audio_offset = self.__get_audio_offset(h.fileobj, header)
+
+            seekpoints = []
+            target = 0
+            for offset, sample, blocksize in self.__iter_frames(
+                    fileobj, audio_offset):
+                if target < sample + blocksize:
+                    seekpoints.append(SeekPoint(sample, offset, blocksize))
+                    target += interval * (
+                        (sample + blocksize - target - 1) // interval + 1)
+
+        if self.seektable is None:
+            self.seektable = SeekTable(None)
+        self.seektable.seekpoints = seekpoints
+        return self.seektable
+
+    def __iter_frames(self, fileobj, audio_offset, buffer_size=2 ** 20):
+        """Yields (offset, first_sample, blocksize) for all audio frames,
+        with the offset relative to the first frame.
+
+        Frames are found by their sync code and the header CRC. A frame
+        which continues where the previous one ended is accepted right
+        away. Other ones, like the first frame after a damaged part of
+        the stream, are only accepted once the frame after them is found,
+        so sync codes in the audio data get skipped.
+        """
+
+        fileobj.seek(audio_offset)
+        data = fileobj.tryread(buffer_size)
+        eof = len(data) < buffer_size
+        try:
+            header = _FrameHeader(data)
+        except error:
+            header = None
+            variable = None
+        else:
+            variable = header.variable
+        fixed_blocksize = self.info.max_blocksize
+        total = self.info.total_samples
+
+        base = audio_offset
+        index = 0
+        next_sample = None
+        # unconfirmed frames by the sample they end at
+        pending = {}
+        found = False
+        while True:
+            if header is not None and (
+                    variable is None or header.variable == variable):
+                if header.variable:
+                    sample = header.number
+                else:
+                    sample = header.number * fixed_blocksize
+                offset = base + index - audio_offset
+                end = sample + header.blocksize
+
+                confirmed = []
+                if next_sample is None and offset == 0 or \
+                        sample == next_sample:
+                    confirmed.append((offset, sample, header.blocksize))
+                elif sample in pending:
+                    confirmed.append(pending[sample])
+                    confirmed.append((offset, sample, header.blocksize))
+                elif next_sample is None or sample >= next_sample:
+                    pending[end] = (offset, sample, header.blocksize)
+
+                if confirmed:
+                    for frame in confirmed:
+                        yield frame
+                    found = True
+                    variable = header.variable
+                    next_sample = end
+                    pending.clear()
+                    if total and next_sample >= total:
+                        break
+                    index += header.size
+                else:
+                    index += 1
+            elif header is not None:
+                index += 1
+            header = None
+
+            if variable is None:
+                found_at = [i for i in (data.find(b"\xff\xf8", index),
+                                        data.find(b"\xff\xf9", index))
+                            if i != -1]
+                index = min(found_at) if found_at else -1
+            else:
+                index = data.find(
+                    b"\xff\xf9" if variable else b"\xff\xf8", index)
+            if index == -1 or (
+                    not eof and len(data) - index < _FrameHeader.MAX_SIZE):
+                if eof:
+                    break
+                keep = len(data) - 1 if index == -1 else index
+                new = fileobj.tryread(buffer_size)
+                eof = len(new) < buffer_size
+                data = data[keep:] + new
+                base += keep
+                index = 0
+                continue
+
+            try:
+                header = _FrameHeader(
+                    data[index:index + _FrameHeader.MAX_SIZE])
+            except error:
+                index += 1
+
+        if not found:
+            raise error("no audio frame found")
 
     @convert_error(IOError, error)
     @loadfile(writable=True)
@@ -861,7 +1468,7 @@ class FLAC(mutagen.FileType):
     def _save(self, filething, metadata_blocks, deleteid3, padding):
         f = StrictFileObject(filething.fileobj)
         header = self.__check_header(f, filething.name)
-        audio_offset = self.__find_audio_offset(f)
+        audio_offset = self.__get_audio_offset(filething.fileobj, header)
         # "fLaC" and maybe ID3
         available = audio_offset - header
 
@@ -872,14 +1479,31 @@ class FLAC(mutagen.FileType):
 
         content_size = get_size(f) - audio_offset
         assert content_size >= 0
-        data = MetadataBlock._writeblocks(
+
+        if not deleteid3 and header == self._header_offset and \
+                self.__save_in_place(f, metadata_blocks, audio_offset,
+                                     content_size, padding):
+            return
+
+        parts = MetadataBlock._writeblocks_parts(
             metadata_blocks, available, content_size, padding)
-        data_size = len(data)
+        data_size = sum(len(part) for part in parts)
 
         resize_bytes(filething.fileobj, available, data_size, header)
         f.seek(header - 4)
         f.write(b"fLaC")
-        f.write(data)
+        _write_parts(filething.fileobj, parts)
+        self._block_layout = []
+        self._pictures_token = object()
+        self._header_offset = header
+        if any(getattr(b, "_invalid_overflow_size", -1) != -1
+               for b in metadata_blocks):
+            # written with the wrong size again, see _writeblock_parts()
+            self._block_headers = None
+        else:
+            filething.fileobj.seek(header)
+            self._block_headers, self._audio_offset = _read_block_headers(
+                filething.fileobj)
 
         # Delete ID3v1
         if deleteid3:
@@ -892,6 +1516,89 @@ class FLAC(mutagen.FileType):
                     f.seek(-128, 2)
                     f.truncate()
 
+    def __save_in_place(self, fileobj, metadata_blocks, audio_offset,
+                        content_size, padding):
+        """Rewrites only the Vorbis comment and the padding block right
+        after it, if no other block changed since load and the padding
+        can absorb the size difference. Returns True if it did.
+        """
+
+        layout = self._block_layout
+        if len(layout) != len(metadata_blocks) or \
+                any(a is not b[0] for a, b in zip(metadata_blocks, layout)):
+            return False
+
+        for i, (block, offset, end, header, state) in enumerate(layout):
+            if block is self.tags:
+                break
+        else:
+            return False
+        if i + 1 >= len(layout) or \
+                not isinstance(layout[i + 1][0], Padding):
+            return False
+        padding_block, padding_offset, padding_end, padding_header, state = \
+            layout[i + 1]
+        padding_last = bool(ord(padding_header[:1]) & 0x80)
+
+        for block, start, end, header, state in layout:
+            if block is not self.tags and block is not padding_block and \
+                    not _block_unchanged(block, header, state):
+                return False
+
+        tags_data = MetadataBlock._writeblock(block=self.tags)
+        new_padding = padding_end - offset - len(tags_data) - 4
+        info = PaddingInfo(new_padding, content_size)
+        if new_padding < 0 or info._get_padding(padding) != new_padding:
+            return False
+
+        # make sure the file still looks like it did on load
+        if layout[-1][2] != audio_offset:
+            return False
+        for block, start, end, header, state in layout:
+            fileobj.seek(start)
+            if fileobj.tryread(4) != header:
+                return False
+
+        old_length = padding_block.length
+        padding_block.length = new_padding
+        try:
+            padding_data = MetadataBlock._writeblock(
+                padding_block, is_last=padding_last)
+        except error:
+            padding_block.length = old_length
+            return False
+
+        fileobj.seek(offset)
+        fileobj.write(tags_data)
+        fileobj.write(padding_data)
+        layout[i] = (self.tags, offset, offset + len(tags_data),
+                     bytes(tags_data[:4]), None)
+        layout[i + 1] = (padding_block, offset + len(tags_data),
+                         padding_end, bytes(padding_data[:4]), None)
+        self._block_headers = [
+            (start, header) for block, start, end, header, state in layout]
+        return True
+
+    def __get_audio_offset(self, fileobj, header):
+        """Returns the offset of the first audio frame, given the offset
+        of the first metadata block.
+
+        The one from load or the last save is used if the file still has
+        the same block headers at the same places, otherwise all blocks
+        get walked.
+        """
+
+        if header == self._header_offset and self._block_headers:
+            for offset, block_header in self._block_headers:
+                fileobj.seek(offset)
+                if fileobj.read(4) != block_header:
+                    break
+            else:
+                return self._audio_offset
+
+        fileobj.seek(header)
+        return self.__find_audio_offset(_BufferedFileObject(fileobj))
+
     def __find_audio_offset(self, fileobj):
         byte = 0x00
         while not (byte & 0x80):
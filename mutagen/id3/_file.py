@@ -170,6 +170,7 @@ class ID3(ID3Tags, mutagen.Metadata):
             size = self.size - 10
             if self.f_extended:
                 size -= 4 + len(self._header._extdata)
+            data_offset = fileobj.tell()
             data = read_full(fileobj, size)
             remaining_data = self._read(self._header, data)
             self._padding = len(remaining_data)
@@ -188,6 +189,9 @@ class ID3(ID3Tags, mutagen.Metadata):
             else:
                 self.update_to_v24()
 
+        if self._header is not None:
+            self._set_picture_offsets(data, data_offset)
+
     def _prepare_data(self, fileobj, start, available, v2_version, v23_sep,
                       pad_func):
 
@@ -196,6 +200,8 @@ class ID3(ID3Tags, mutagen.Metadata):
 
         config = ID3SaveConfig(v2_version, v23_sep)
         framedata = self._write(config)
+        # the image data will move
+        self._pictures_token = None
 
         needed = len(framedata) + 10
 
@@ -1267,6 +1267,12 @@ class APIC(Frame):
 
     salt = u''
 
+    def __setattr__(self, name, value):
+        if name == "data":
+            # the image data is no longer the one stored in the file
+            self.__dict__.pop("_data_offset", None)
+        super(APIC, self).__setattr__(name, value)
+
     def __eq__(self, other):
         return self.data == other
 
@@ -10,7 +10,7 @@ import re
 import struct
 from itertools import zip_longest
 
-from mutagen._tags import Tags
+from mutagen._tags import Tags, PictureInfo
 from mutagen._util import DictProxy, convert_error, read_full
 
 from ._util import BitPaddedInt, unsynch, ID3JunkFrameError, \
@@ -169,6 +169,8 @@ class ID3Tags(DictProxy, Tags):
 
     __module__ = "mutagen.id3"
 
+    _pictures_token = None
+
     def __init__(self, *args, **kwargs):
         self.unknown_frames = []
         self._unknown_v2_version = 4
@@ -295,6 +297,32 @@ class ID3Tags(DictProxy, Tags):
         frames = sorted(Frame.pprint(s) for s in self.values())
         return "\n".join(frames)
 
+    def _set_picture_offsets(self, data, data_offset):
+        """Records where the image data of the APIC frames is stored, given
+        the raw tag data and its offset in the file.
+
+        Frames can be unsynchronized or compressed, so instead of
+        following the frame layout the image data is searched for, and
+        only found if it is stored as is.
+        """
+
+        self._pictures_token = token = object()
+        for frame in self.getall("APIC"):
+            if not frame.data:
+                continue
+            index = data.find(frame.data)
+            if index != -1:
+                frame._data_offset = (token, data_offset + index)
+
+    def _iter_pictures(self):
+        for frame in self.getall("APIC"):
+            token, offset = getattr(frame, "_data_offset", (None, None))
+            if token is None or token is not self._pictures_token:
+                offset = None
+            yield PictureInfo._from_data(
+                lambda frame=frame: frame.data, offset=offset,
+                mime=frame.mime, type=frame.type, desc=frame.desc)
+
     def _add(self, frame, strict):
         """Add a frame.
 
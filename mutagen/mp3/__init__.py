@@ -11,7 +11,7 @@ import struct
 
 from mutagen import StreamInfo
 from mutagen._util import MutagenError, enum, BitReader, BitReaderError, \
-    convert_error, intround, endswith
+    convert_error, intround, endswith, loadfile
 from mutagen.id3 import ID3FileType, delete
 from mutagen.id3._util import BitPaddedInt
 
@@ -184,8 +184,12 @@ class MPEGFrame(object):
             self.sketchy = False
             self.bitrate_mode = _guess_xing_bitrate_mode(xing)
             self.encoder_settings = xing.get_encoder_settings()
+            if lame is not None:
+                self.encoder_delay = lame.encoder_delay_start
+                self.encoder_padding = lame.encoder_padding_end
             if xing.frames != -1:
                 samples = frame_size * xing.frames
+                self.total_samples = samples
                 if xing.bytes != -1 and samples > 0:
                     # the first frame is only included in xing.bytes but
                     # not in xing.frames, skip it.
@@ -199,6 +203,9 @@ class MPEGFrame(object):
                     # older lame versions wrote bogus delay/padding for short
                     # files with low bitrate
                     samples = 0
+                    self.playable_samples = self.total_samples
+                else:
+                    self.playable_samples = samples
                 self.length = float(samples) / self.sample_rate
             if xing.lame_version_desc:
                 self.encoder_info = u"LAME %s" % xing.lame_version_desc
@@ -219,7 +226,9 @@ class MPEGFrame(object):
             self.bitrate_mode = BitrateMode.VBR
             self.encoder_info = u"FhG"
             self.sketchy = False
-            self.length = float(frame_size * vbri.frames) / self.sample_rate
+            self.total_samples = frame_size * vbri.frames
+            self.playable_samples = self.total_samples
+            self.length = float(self.total_samples) / self.sample_rate
             if self.length:
                 self.bitrate = int((vbri.bytes * 8) / self.length)
 
@@ -316,6 +325,17 @@ class MPEGInfo(StreamInfo):
         track_gain (`float` or `None`): replaygain track gain (89db) or None
         track_peak (`float` or `None`): replaygain track peak or None
         album_gain (`float` or `None`): replaygain album gain (89db) or None
+        encoder_delay (`int` or `None`): number of samples added by the
+            encoder at the start or None
+        encoder_padding (`int` or `None`): number of samples added by the
+            encoder at the end or None
+        total_samples (`int` or `None`): number of decoded samples,
+            including delay and padding, or None
+        playable_samples (`int` or `None`): number of samples without delay
+            and padding or None
+
+    The gapless attributes are taken from the LAME header, or if there is
+    none, from an ``iTunSMPB`` comment in the ID3 tag.
 
     Useless attributes:
 
@@ -332,6 +352,8 @@ class MPEGInfo(StreamInfo):
     encoder_settings = u""
     bitrate_mode = BitrateMode.UNKNOWN
     track_gain = track_peak = album_gain = album_peak = None
+    encoder_delay = encoder_padding = None
+    total_samples = playable_samples = None
 
     @convert_error(IOError, error)
     def __init__(self, fileobj, offset=None):
@@ -413,6 +435,32 @@ class MPEGInfo(StreamInfo):
             content_size = fileobj.tell() - first_frame.frame_offset
             self.length = 8 * content_size / float(self.bitrate)
 
+    def _parse_itunsmpb(self, tags):
+        """Fills in the gapless info from an iTunSMPB comment in case
+        the stream itself doesn't provide it. Does not raise.
+        """
+
+        if self.encoder_delay is not None:
+            return
+
+        getall = getattr(tags, "getall", None)
+        if getall is None:
+            return
+
+        for frame in getall("COMM"):
+            if frame.desc != "iTunSMPB" or not frame.text:
+                continue
+            values = frame.text[0].split()
+            try:
+                delay, padding, playable = [int(v, 16) for v in values[1:4]]
+            except ValueError:
+                continue
+            self.encoder_delay = delay
+            self.encoder_padding = padding
+            self.playable_samples = playable
+            self.total_samples = delay + playable + padding
+            break
+
     def pprint(self):
         info = str(self.bitrate_mode).split(".", 1)[-1]
         if self.bitrate_mode == BitrateMode.UNKNOWN:
@@ -446,6 +494,14 @@ class MP3(ID3FileType):
 
     _mimes = ["audio/mpeg", "audio/mpg", "audio/x-mpeg"]
 
+    @loadfile()
+    def load(self, filething, ID3=None, **kwargs):
+        super(MP3, self).load(filething, ID3, **kwargs)
+        if self.tags is not None:
+            # EasyID3 wraps the ID3 instance holding the frames
+            tags = getattr(self.tags, "_EasyID3__id3", self.tags)
+            self.info._parse_itunsmpb(tags)
+
     @property
     def mime(self):
         l = self.info.layer
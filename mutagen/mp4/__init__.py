@@ -22,17 +22,23 @@ c041828_ISO_IEC_14496-12_2005(E).zip
 were all consulted.
 """
 
+import codecs
+import operator
 import struct
 import sys
+from array import array
 from io import BytesIO
 from collections.abc import Sequence
 from datetime import timedelta
+from itertools import accumulate, chain, repeat
+from bisect import bisect_left, bisect_right
 
-from mutagen import FileType, Tags, StreamInfo, PaddingInfo
+from mutagen import FileType, Tags, StreamInfo, PaddingInfo, PictureInfo
 from mutagen._constants import GENRES
 from mutagen._util import cdata, insert_bytes, DictProxy, MutagenError, \
     hashable, enum, get_size, resize_bytes, loadfile, convert_error, bchr, \
-    reraise
+    reraise, read_full, resize_file, move_bytes, _FileData, _join_parts, \
+    _write_parts
 from ._atom import Atoms, Atom, AtomError
 from ._util import parse_full_atom
 from ._as_entry import AudioSampleEntry, ASEntryError
@@ -136,6 +142,8 @@ class AtomDataType(object):
 class MP4Cover(bytes):
     """A cover artwork.
 
+    To avoid keeping large images in memory use :meth:`from_file`.
+
     Attributes:
         imageformat (`AtomDataType`): format of the image
             (either FORMAT_JPEG or FORMAT_PNG)
@@ -144,15 +152,45 @@ class MP4Cover(bytes):
     FORMAT_JPEG = AtomDataType.JPEG
     FORMAT_PNG = AtomDataType.PNG
 
+    _data_source = None
+
     def __new__(cls, data, *args, **kwargs):
         return bytes.__new__(cls, data)
 
     def __init__(self, data, imageformat=FORMAT_JPEG):
         self.imageformat = imageformat
 
+    @classmethod
+    def from_file(cls, filething, imageformat=FORMAT_JPEG):
+        """Returns a cover using the content of a file as image data.
+
+        The data doesn't get read into memory, but copied into the MP4
+        file when saving, or when extracted with
+        :meth:`mutagen.FileType.extract_picture`. The file has to stay
+        unchanged until then. Since the data isn't available, the
+        returned cover is empty and only equal to itself.
+
+        Args:
+            filething (filething): a path or a file object, for which the
+                data starts at its current position
+            imageformat (`AtomDataType`): format of the image
+        Returns:
+            MP4Cover
+        Raises:
+            OSError
+        """
+
+        cover = cls(b"", imageformat)
+        cover._data_source = _FileData(filething)
+        return cover
+
     __hash__ = bytes.__hash__
 
     def __eq__(self, other):
+        if self._data_source is not None or \
+                getattr(other, "_data_source", None) is not None:
+            return self is other
+
         if not isinstance(other, MP4Cover):
             return bytes(self) == other
 
@@ -163,6 +201,10 @@ class MP4Cover(bytes):
         return not self.__eq__(other)
 
     def __repr__(self):
+        if self._data_source is not None:
+            return "<%s from file (%d bytes), %r>" % (
+                type(self).__name__, len(self._data_source),
+                AtomDataType(self.imageformat))
         return "%s(%r, %r)" % (
             type(self).__name__, bytes(self),
             AtomDataType(self.imageformat))
@@ -205,6 +247,536 @@ class MP4FreeForm(bytes):
             AtomDataType(self.dataformat))
 
 
+# array type code for unsigned 32 bit integers
+_UINT32_TYPECODE = "I" if array("I").itemsize == 4 else "L"
+
+
+def _add_to_entries(data, itemsize, delta):
+    """Returns data, a table of big endian unsigned integers, with delta
+    added to each entry.
+
+    This is done with a single addition on a big integer, which is much
+    faster than handling each entry. The caller has to make sure no
+    entry over- or underflows, as that would carry into the next one.
+    """
+
+    ones = (b"\x00" * (itemsize - 1) + b"\x01") * (len(data) // itemsize)
+    value = int.from_bytes(data, "big") + delta * int.from_bytes(ones, "big")
+    return value.to_bytes(len(data), "big")
+
+
+def _parts_size(parts):
+    """Returns the size of a list of bytes and _FileData"""
+
+    return sum(len(part) for part in parts)
+
+
+def _render_parts(name, parts):
+    """Like Atom.render(), but for a list of bytes and _FileData, which
+    is returned as such a list.
+    """
+
+    return [Atom.render_header(name, _parts_size(parts))] + parts
+
+
+def _shift_offset(offset, shifts):
+    """Returns offset moved by all (offset, delta) shifts in front of it"""
+
+    return offset + sum(d for o, d in shifts if offset > o)
+
+
+def _find_paths(atom, names, parents=()):
+    """Yields the paths to all atoms with one of the given names below
+    atom, including atom itself as first element.
+    """
+
+    parents += (atom,)
+    for child in atom.children or []:
+        if child.name in names:
+            yield list(parents) + [child]
+        elif child.children is not None:
+            for path in _find_paths(child, names, parents):
+                yield path
+
+
+def _update_parents(fileobj, path, delta, position=None):
+    """Update all parent atoms with the new size.
+
+    `position` maps the offset of an atom as it was on load to its
+    current offset in the file.
+    """
+
+    if delta == 0:
+        return
+
+    if position is None:
+        def position(offset):
+            return offset
+
+    for atom in path:
+        offset = position(atom.offset)
+        fileobj.seek(offset)
+        size = cdata.uint_be(fileobj.read(4))
+        if size == 1:  # 64bit
+            # skip name (4B) and read size (8B)
+            size = cdata.ulonglong_be(fileobj.read(12)[4:])
+            fileobj.seek(offset + 8)
+            fileobj.write(cdata.to_ulonglong_be(size + delta))
+        else:  # 32bit
+            fileobj.seek(offset)
+            fileobj.write(cdata.to_uint_be(size + delta))
+
+
+def _read_offset_table(fileobj, atom, offset):
+    """Returns the entries of the 'stco' or 'co64' atom located at
+    offset, as a native byte order array.
+    """
+
+    typecode = _UINT32_TYPECODE if atom.name == b"stco" else "Q"
+    fileobj.seek(offset + 12)
+    data = fileobj.read(atom.length - 12)
+    offsets = array(typecode)
+    if len(data) < 4 or \
+            len(data) - 4 != cdata.uint_be(data[:4]) * offsets.itemsize:
+        raise MP4MetadataError("wrong offset inside %r" % atom.name)
+    offsets.frombytes(data[4:])
+    if sys.byteorder == "little":
+        offsets.byteswap()
+    return offsets
+
+
+def _update_offset_table(fileobj, atom, offset, offsets, shifts):
+    """Update the offset table of the atom located at offset.
+
+    `shifts` is a list of (offset, delta) tuples, every entry larger
+    than an offset gets moved by its delta. Only the part of the table
+    starting with the first changed entry gets written back.
+    """
+
+    if not offsets:
+        return
+
+    first = min(o for o, d in shifts)
+    last = max(o for o, d in shifts)
+    if max(offsets) <= first:
+        return
+
+    limit = 2 ** (8 * offsets.itemsize) - 1
+    if min(offsets) > last:
+        # the common case, all chunks are behind the changes
+        delta = sum(d for o, d in shifts)
+        if max(offsets) + delta > limit or min(offsets) + delta < 0:
+            raise MP4MetadataError("wrong offset inside %r" % atom.name)
+        if sys.byteorder == "little":
+            offsets.byteswap()
+        fileobj.seek(offset + 16)
+        fileobj.write(
+            _add_to_entries(offsets.tobytes(), offsets.itemsize, delta))
+        return
+
+    start = next(i for i, o in enumerate(offsets) if o > first)
+    try:
+        offsets = array(offsets.typecode,
+                        (_shift_offset(o, shifts)
+                         for o in offsets[start:]))
+    except OverflowError:
+        raise MP4MetadataError("wrong offset inside %r" % atom.name)
+    if sys.byteorder == "little":
+        offsets.byteswap()
+    fileobj.seek(offset + 16 + start * offsets.itemsize)
+    fileobj.write(offsets.tobytes())
+
+
+def _promote_offset_table(fileobj, atom, offset, offsets, shifts):
+    """Replace the 'stco' atom located at offset with a 'co64' atom
+    containing the moved entries. Returns the size difference.
+    """
+
+    fileobj.seek(offset + 8)
+    version_flags = fileobj.read(4)
+    entries = array("Q", (_shift_offset(o, shifts) for o in offsets))
+    if sys.byteorder == "little":
+        entries.byteswap()
+    data = Atom.render(
+        b"co64",
+        version_flags + cdata.to_uint_be(len(entries)) + entries.tobytes())
+    resize_bytes(fileobj, atom.length, len(data), offset)
+    fileobj.seek(offset)
+    fileobj.write(data)
+    return len(data) - atom.length
+
+
+def _update_tfhd(data, atom, shifts):
+    """Update the base data offset of the 'tfhd' atom in data"""
+
+    if atom.datalength < 4:
+        raise MP4MetadataError("invalid tfhd atom")
+    pos = atom._dataoffset
+    flags = cdata.uint_be(b"\x00" + data[pos + 1:pos + 4])
+    if flags & 1:
+        if atom.datalength < 16:
+            raise MP4MetadataError("invalid tfhd atom")
+        o = cdata.ulonglong_be(data[pos + 8:pos + 16])
+        data[pos + 8:pos + 16] = cdata.to_ulonglong_be(
+            _shift_offset(o, shifts))
+
+
+def _update_tfra(data, atom, shifts):
+    """Update the moof offsets of all entries of the 'tfra' atom in data"""
+
+    pos = atom._dataoffset
+    end = atom.offset + atom.length
+    if atom.datalength < 16:
+        raise MP4MetadataError("invalid tfra atom")
+    version = data[pos]
+    sizes = cdata.uint_be(data[pos + 8:pos + 12])
+    count = cdata.uint_be(data[pos + 12:pos + 16])
+    pos += 16
+
+    # time and moof offset followed by traf, trun and sample number
+    item_size = 8 if version == 1 else 4
+    entry_size = 2 * item_size + 3 + \
+        ((sizes >> 4) & 3) + ((sizes >> 2) & 3) + (sizes & 3)
+    if pos + count * entry_size > end:
+        raise MP4MetadataError("invalid tfra atom")
+
+    limit = 2 ** (8 * item_size) - 1
+    for i in range(pos + item_size, pos + count * entry_size, entry_size):
+        o = _shift_offset(int.from_bytes(data[i:i + item_size], "big"), shifts)
+        if o > limit:
+            raise MP4MetadataError("wrong offset inside tfra")
+        data[i:i + item_size] = o.to_bytes(item_size, "big")
+
+
+def _read_fragments(fileobj, atoms):
+    """Reads all 'moof' and 'mfra' atoms and checks that their offsets
+    can be updated, so invalid ones are found before the file gets
+    modified.
+
+    Returns a list of (atom, data, updates) for _render_fragments(), with
+    `updates` being a list of (function, child atom) to apply to data.
+    """
+
+    fragments = []
+    for atom in atoms.atoms:
+        if atom.name not in (b"moof", b"mfra"):
+            continue
+
+        fileobj.seek(atom.offset)
+        data = read_full(fileobj, atom.length)
+        updates = []
+        try:
+            parsed = Atom(BytesIO(data))
+            if atom.name == b"moof":
+                for tfhd in parsed.findall(b"tfhd", True):
+                    updates.append((_update_tfhd, tfhd))
+            else:
+                # not in _CONTAINERS
+                child_fileobj = BytesIO(data)
+                child_fileobj.seek(parsed._dataoffset)
+                while child_fileobj.tell() < parsed.length:
+                    child = Atom(child_fileobj, 1)
+                    if child.name == b"tfra":
+                        updates.append((_update_tfra, child))
+        except AtomError as err:
+            reraise(MP4MetadataError, err, sys.exc_info()[2])
+
+        check = bytearray(data)
+        for update, child in updates:
+            update(check, child, [])
+        fragments.append((atom, data, updates))
+    return fragments
+
+
+def _render_fragments(fragments, shifts):
+    """Returns a list of (offset, data) of the fragments from
+    _read_fragments() which change with `shifts`, as in
+    _update_chunk_offsets(). Nothing gets written, so this can be used
+    to check for overflowing offsets first.
+    """
+
+    rendered = []
+    for atom, original, updates in fragments:
+        data = bytearray(original)
+        for update, child in updates:
+            update(data, child, shifts)
+        if data != original:
+            rendered.append((_shift_offset(atom.offset, shifts), data))
+    return rendered
+
+
+def _update_fragments(fileobj, fragments, shifts):
+    """Update the offsets in all fragments from _read_fragments()"""
+
+    for offset, data in _render_fragments(fragments, shifts):
+        fileobj.seek(offset)
+        fileobj.write(data)
+
+
+def _update_chunk_offsets(fileobj, moov, shifts, applied, behind_moov=None):
+    """Update offset tables in all 'stco' and 'co64' atoms below moov.
+
+    Offsets are tracked as they were on load, `shifts` is a list of
+    (offset, delta) changes applied to every chunk offset behind offset,
+    `applied` the ones already written to fileobj, used to locate the
+    atoms of moov.
+
+    'stco' atoms which would overflow get converted to 'co64' atoms,
+    which in turn moves all data behind them and might require
+    converting more of them. The resulting changes get appended to
+    `shifts`. If moov gets placed somewhere else, `behind_moov` is the
+    offset behind which data follows moov in the new layout.
+    """
+
+    tables = []
+    for path in _find_paths(moov, (b"stco", b"co64")):
+        atom = path[-1]
+        tables.append((path, _read_offset_table(
+            fileobj, atom, _shift_offset(atom.offset, applied))))
+
+    promoted = []
+    limit = 0xFFFFFFFF
+    while True:
+        for path, offsets in tables:
+            if path[-1].name == b"stco" and path not in promoted and \
+                    offsets and _shift_offset(max(offsets), shifts) > limit:
+                break
+        else:
+            break
+        promoted.append(path)
+        if behind_moov is None:
+            shifts.append((path[-1].offset, 4 * len(offsets)))
+        else:
+            shifts.append((behind_moov, 4 * len(offsets)))
+
+    for path, offsets in tables:
+        if path not in promoted:
+            atom = path[-1]
+            _update_offset_table(
+                fileobj, atom, _shift_offset(atom.offset, applied),
+                offsets, shifts)
+
+    # Convert back to front, so the offsets of the remaining atoms
+    # only depend on the changes already written.
+    applied = list(applied)
+    for path, offsets in sorted(tables, key=lambda t: -t[0][-1].offset):
+        if path not in promoted:
+            continue
+        atom = path[-1]
+        size_delta = _promote_offset_table(
+            fileobj, atom, _shift_offset(atom.offset, applied),
+            offsets, shifts)
+        _update_parents(
+            fileobj, path[:-1], size_delta,
+            lambda o: _shift_offset(o, applied))
+        applied.append((atom.offset, size_delta))
+
+
+def _update_offsets(fileobj, atoms, fragments, delta, offset):
+    """Update all chunk offsets after the data behind offset was moved
+    by delta. `fragments` are from _read_fragments(), read before the
+    move.
+    """
+
+    if delta == 0:
+        return
+
+    shifts = [(offset, delta)]
+    _update_chunk_offsets(fileobj, atoms[b"moov"], shifts, shifts[:])
+    _update_fragments(fileobj, fragments, shifts)
+
+
+def _render_ilst(fileobj, path, ilst_data, padding_func, content_size=None):
+    """Returns the offset and length of the ilst atom at the end of path
+    and its adjacent padding, and the data to replace them with: the new
+    ilst data followed by new padding. The data is passed and returned as
+    a list of bytes and _FileData. content_size defaults to the size of
+    the data following them in fileobj.
+    """
+
+    ilst = path[-1]
+    offset = ilst.offset
+    length = ilst.length
+
+    # Use adjacent free atom if there is one
+    free = _find_padding(path)
+    if free is not None:
+        offset = min(offset, free.offset)
+        length += free.length
+
+    # Always add a padding atom to make things easier
+    padding_overhead = len(Atom.render(b"free", b""))
+    if content_size is None:
+        content_size = get_size(fileobj) - (offset + length)
+    padding_size = length - (_parts_size(ilst_data) + padding_overhead)
+    info = PaddingInfo(padding_size, content_size)
+    new_padding = info._get_padding(padding_func)
+    # Limit padding size so we can be sure the free atom overhead is as we
+    # calculated above (see Atom.render)
+    new_padding = min(0xFFFFFFFF, new_padding)
+
+    return offset, length, \
+        ilst_data + [Atom.render(b"free", b"\x00" * new_padding)]
+
+
+def _replace_ilst(fileobj, path, offset, length, data):
+    """Replaces the ilst and its padding with the result of
+    _render_ilst() and updates the sizes of all parents.
+
+    Returns by how much the data behind offset was moved.
+    """
+
+    size = _parts_size(data)
+    resize_bytes(fileobj, length, size, offset)
+    delta = size - length
+
+    fileobj.seek(offset)
+    _write_parts(fileobj, data)
+    _update_parents(fileobj, path[:-1], delta)
+    return delta
+
+
+def _insert_meta(fileobj, path, ilst_data, padding_func, content_size=None):
+    """Inserts a meta atom containing the ilst data (a list of bytes and
+    _FileData) and padding at the
+    start of the udta atom at the end of path, or a new udta atom
+    containing it if path ends with moov, and updates the sizes of all
+    parents. content_size defaults to the size of the data following it
+    in fileobj.
+
+    Returns the offset behind which data was moved and by how much.
+    """
+
+    hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"mdirappl" + b"\x00" * 9)
+    meta_data = [b"\x00\x00\x00\x00", hdlr] + ilst_data
+
+    offset = path[-1]._dataoffset
+
+    # ignoring some atom overhead... but we don't have padding left anyway
+    # and padding_size is guaranteed to be less than zero
+    if content_size is None:
+        content_size = get_size(fileobj) - offset
+    padding_size = -_parts_size(meta_data)
+    assert padding_size < 0
+    info = PaddingInfo(padding_size, content_size)
+    new_padding = info._get_padding(padding_func)
+    new_padding = min(0xFFFFFFFF, new_padding)
+
+    free = Atom.render(b"free", b"\x00" * new_padding)
+    meta = _render_parts(b"meta", meta_data + [free])
+    if path[-1].name != b"udta":
+        # moov.udta not found -- create one
+        data = _render_parts(b"udta", meta)
+    else:
+        data = meta
+
+    size = _parts_size(data)
+    insert_bytes(fileobj, size, offset)
+    fileobj.seek(offset)
+    _write_parts(fileobj, data)
+    _update_parents(fileobj, path, size)
+    return offset, size
+
+
+def _find_reclaimable(path):
+    """Returns the paths to all 'free' and 'skip' atoms in moov which are
+    not part of ilst or its adjacent padding.
+    """
+
+    moov, ilst = path[0], path[-1]
+    padding = _find_padding(path)
+    return [p for p in _find_paths(moov, [b"free", b"skip"])
+            if p[-1] is not padding and ilst not in p]
+
+
+def _reclaim_padding(fileobj, path, ilst_data, padding_func):
+    """Like _replace_ilst(), but if the new ilst doesn't fit, 'free' and
+    'skip' atoms anywhere in moov are removed to make room and the atoms
+    in between get moved, so the size of moov stays the same and no
+    chunk offsets need to be updated.
+
+    Returns False and does nothing if the ilst fits in place, if moov is
+    the last atom, or if there isn't enough free space in moov.
+    """
+
+    moov, ilst = path[0], path[-1]
+    offset = ilst.offset
+    length = ilst.length
+    free = _find_padding(path)
+    if free is not None:
+        offset = min(offset, free.offset)
+        length += free.length
+
+    size = get_size(fileobj)
+    padding_overhead = len(Atom.render(b"free", b""))
+    needed = _parts_size(ilst_data) + padding_overhead - length
+    if needed <= 0 or moov.offset + moov.length >= size:
+        return False
+
+    info = PaddingInfo(-needed, size - (offset + length))
+    wanted = needed + info._get_padding(padding_func)
+
+    # take the closest ones first, to move as little data as possible
+    candidates = _find_reclaimable(path)
+    candidates.sort(key=lambda p: abs(p[-1].offset - offset))
+    removed = []
+    available = 0
+    for candidate in candidates:
+        if available >= wanted:
+            break
+        removed.append(candidate)
+        available += candidate[-1].length
+    if available < needed:
+        return False
+
+    new_padding = available - needed
+    if new_padding > 0xFFFFFFFF - padding_overhead:
+        return False
+    # the moved area gets assembled in memory, including covers which
+    # would otherwise be copied from their file
+    ilst_data = bytes(_join_parts(ilst_data)) + \
+        Atom.render(b"free", b"\x00" * new_padding)
+
+    # (offset, old length, new data) and the size change of all parents
+    edits = [(offset, length, ilst_data)]
+    deltas = {}
+    for atom in path[:-1]:
+        deltas[atom.offset] = [atom, len(ilst_data) - length]
+    for p in removed:
+        edits.append((p[-1].offset, p[-1].length, b""))
+        for atom in p[:-1]:
+            deltas.setdefault(atom.offset, [atom, 0])[1] -= p[-1].length
+    edits.sort(key=lambda e: e[0])
+    parents = [(a, d) for a, d in deltas.values() if d]
+
+    # moov keeps its size, so only the area between the first and the
+    # last change needs to be rewritten
+    start = min([e[0] for e in edits] + [a.offset for a, d in parents])
+    end = max(o + n for o, n, data in edits)
+    fileobj.seek(start)
+    data = read_full(fileobj, end - start)
+
+    parts = []
+    shifts = []
+    position = start
+    for edit_offset, edit_length, edit_data in edits:
+        parts.append(data[position - start:edit_offset - start])
+        parts.append(edit_data)
+        position = edit_offset + edit_length
+        shifts.append((edit_offset, len(edit_data) - edit_length))
+    parts.append(data[position - start:])
+    buf = BytesIO(b"".join(parts))
+    assert len(buf.getvalue()) == end - start
+
+    for atom, delta in parents:
+        _update_parents(buf, [atom], delta,
+                        lambda o: _shift_offset(o, shifts) - start)
+
+    fileobj.seek(start)
+    fileobj.write(buf.getvalue())
+    return True
+
+
 def _name2key(name):
     return name.decode("latin-1")
 
@@ -214,9 +786,8 @@ def _key2name(key):
 
 
 def _find_padding(atom_path):
-    # Check for padding "free" atom
-    # XXX: we only use them if they are adjacent to ilst, and only one.
-    # and there also is a top level free atom which we could use maybe..?
+    # Check for padding "free" atom adjacent to ilst. Other ones in moov
+    # only get used if the ilst doesn't fit, see _reclaim_padding()
 
     meta, ilst = atom_path[-2:]
     assert meta.name == b"meta" and ilst.name == b"ilst"
@@ -336,6 +907,7 @@ class MP4Tags(DictProxy, Tags):
 
     def __init__(self, *args, **kwargs):
         self._failed_atoms = {}
+        self._pictures_token = object()
         super(MP4Tags, self).__init__()
         if args or kwargs:
             self.load(*args, **kwargs)
@@ -389,15 +961,20 @@ class MP4Tags(DictProxy, Tags):
 
     @convert_error(IOError, error)
     @loadfile(writable=True)
-    def save(self, filething=None, padding=None):
+    def save(self, filething=None, padding=None, moov_at_end=False):
 
         values = []
         items = sorted(self.items(), key=lambda kv: _item_sort_key(*kv))
         for key, value in items:
             try:
-                values.append(self._render(key, value))
+                rendered = self._render(key, value)
             except (TypeError, ValueError) as s:
                 reraise(MP4MetadataValueError, s, sys.exc_info()[2])
+            # covers are rendered as a list of bytes and _FileData
+            if isinstance(rendered, list):
+                values.extend(rendered)
+            else:
+                values.append(rendered)
 
         for key, failed in self._failed_atoms.items():
             # don't write atoms back if we have added a new one with
@@ -410,7 +987,7 @@ class MP4Tags(DictProxy, Tags):
             for data in failed:
                 values.append(Atom.render(_key2name(key), data))
 
-        data = Atom.render(b"ilst", b"".join(values))
+        data = _render_parts(b"ilst", values)
 
         # Find the old atoms.
         try:
@@ -418,142 +995,117 @@ class MP4Tags(DictProxy, Tags):
         except AtomError as err:
             reraise(error, err, sys.exc_info()[2])
 
-        self.__save(filething.fileobj, atoms, data, padding)
+        if moov_at_end and self.__needs_resize(atoms, data) and \
+                self.__can_relocate(filething.fileobj, atoms):
+            atoms = self.__relocate_moov(filething.fileobj, atoms)
 
-    def __save(self, fileobj, atoms, data, padding):
-        try:
-            path = atoms.path(b"moov", b"udta", b"meta", b"ilst")
-        except KeyError:
-            self.__save_new(fileobj, atoms, data, padding)
-        else:
-            self.__save_existing(fileobj, atoms, path, data, padding)
+        self.__save(filething.fileobj, atoms, data, padding)
+        self._pictures_token = object()
 
-    def __save_new(self, fileobj, atoms, ilst_data, padding_func):
-        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"mdirappl" + b"\x00" * 9)
-        meta_data = b"\x00\x00\x00\x00" + hdlr + ilst_data
+    def __needs_resize(self, atoms, ilst_data):
+        """If the new ilst doesn't fit into the space of the old one and
+        the free space in moov.
+        """
 
         try:
-            path = atoms.path(b"moov", b"udta")
+            path = atoms.path(b"moov", b"udta", b"meta", b"ilst")
         except KeyError:
-            path = atoms.path(b"moov")
-
-        offset = path[-1]._dataoffset
-
-        # ignoring some atom overhead... but we don't have padding left anyway
-        # and padding_size is guaranteed to be less than zero
-        content_size = get_size(fileobj) - offset
-        padding_size = -len(meta_data)
-        assert padding_size < 0
-        info = PaddingInfo(padding_size, content_size)
-        new_padding = info._get_padding(padding_func)
-        new_padding = min(0xFFFFFFFF, new_padding)
-
-        free = Atom.render(b"free", b"\x00" * new_padding)
-        meta = Atom.render(b"meta", meta_data + free)
-        if path[-1].name != b"udta":
-            # moov.udta not found -- create one
-            data = Atom.render(b"udta", meta)
-        else:
-            data = meta
-
-        insert_bytes(fileobj, len(data), offset)
-        fileobj.seek(offset)
-        fileobj.write(data)
-        self.__update_parents(fileobj, path, len(data))
-        self.__update_offsets(fileobj, atoms, len(data), offset)
-
-    def __save_existing(self, fileobj, atoms, path, ilst_data, padding_func):
-        # Replace the old ilst atom.
-        ilst = path[-1]
-        offset = ilst.offset
-        length = ilst.length
+            return True
 
-        # Use adjacent free atom if there is one
+        length = path[-1].length
         free = _find_padding(path)
         if free is not None:
-            offset = min(offset, free.offset)
             length += free.length
+        length += sum(p[-1].length for p in _find_reclaimable(path))
+        return _parts_size(ilst_data) + len(Atom.render(b"free", b"")) > \
+            length
+
+    def __can_relocate(self, fileobj, atoms):
+        """If moov can be moved to the end of the file"""
+
+        names = [atom.name for atom in atoms.atoms]
+        if b"moov" not in names or b"moof" in names:
+            # fragments have to follow moov
+            return False
+
+        last = atoms.atoms[-1]
+        if last.name == b"moov":
+            # nothing to gain
+            return False
+
+        if last.offset + last.length != get_size(fileobj):
+            return False
+
+        # an atom with a size of zero extends to the end of the file
+        fileobj.seek(last.offset)
+        return cdata.uint_be(read_full(fileobj, 4)) != 0
+
+    def __relocate_moov(self, fileobj, atoms):
+        """Appends a copy of moov to the end of the file and replaces the
+        old one with a free atom. Chunk offsets stay valid since no media
+        data gets moved. Returns the new atoms.
+        """
 
-        # Always add a padding atom to make things easier
-        padding_overhead = len(Atom.render(b"free", b""))
-        content_size = get_size(fileobj) - (offset + length)
-        padding_size = length - (len(ilst_data) + padding_overhead)
-        info = PaddingInfo(padding_size, content_size)
-        new_padding = info._get_padding(padding_func)
-        # Limit padding size so we can be sure the free atom overhead is as we
-        # calculated above (see Atom.render)
-        new_padding = min(0xFFFFFFFF, new_padding)
-
-        ilst_data += Atom.render(b"free", b"\x00" * new_padding)
+        moov = atoms[b"moov"]
+        fileobj.seek(moov.offset)
+        data = read_full(fileobj, moov.length)
+        fileobj.seek(0, 2)
+        fileobj.write(data)
 
-        resize_bytes(fileobj, length, len(ilst_data), offset)
-        delta = len(ilst_data) - length
+        fileobj.seek(moov.offset + 4)
+        fileobj.write(b"free")
+        fileobj.seek(moov._dataoffset)
+        remaining = moov.datalength
+        while remaining:
+            size = min(remaining, 2 ** 16)
+            fileobj.write(b"\x00" * size)
+            remaining -= size
 
-        fileobj.seek(offset)
-        fileobj.write(ilst_data)
-        self.__update_parents(fileobj, path[:-1], delta)
-        self.__update_offsets(fileobj, atoms, delta, offset)
+        try:
+            return Atoms(fileobj)
+        except AtomError as err:
+            reraise(error, err, sys.exc_info()[2])
 
-    def __update_parents(self, fileobj, path, delta):
-        """Update all parent atoms with the new size."""
+    def __save(self, fileobj, atoms, data, padding):
+        try:
+            path = atoms.path(b"moov", b"udta", b"meta", b"ilst")
+        except KeyError:
+            self.__save_new(fileobj, atoms, data, padding)
+        else:
+            self.__save_existing(fileobj, atoms, path, data, padding)
 
-        if delta == 0:
-            return
+    def __read_for_move(self, fileobj, atoms):
+        """Reads everything needed to update the offsets after data got
+        moved, before the file gets modified. Returns the fragments.
+        """
 
-        for atom in path:
-            fileobj.seek(atom.offset)
-            size = cdata.uint_be(fileobj.read(4))
-            if size == 1:  # 64bit
-                # skip name (4B) and read size (8B)
-                size = cdata.ulonglong_be(fileobj.read(12)[4:])
-                fileobj.seek(atom.offset + 8)
-                fileobj.write(cdata.to_ulonglong_be(size + delta))
-            else:  # 32bit
-                fileobj.seek(atom.offset)
-                fileobj.write(cdata.to_uint_be(size + delta))
-
-    def __update_offset_table(self, fileobj, fmt, atom, delta, offset):
-        """Update offset table in the specified atom."""
-        if atom.offset > offset:
-            atom.offset += delta
-        fileobj.seek(atom.offset + 12)
-        data = fileobj.read(atom.length - 12)
-        fmt = fmt % cdata.uint_be(data[:4])
         try:
-            offsets = struct.unpack(fmt, data[4:])
-            offsets = [o + (0, delta)[offset < o] for o in offsets]
-            fileobj.seek(atom.offset + 16)
-            fileobj.write(struct.pack(fmt, *offsets))
-        except struct.error:
-            raise MP4MetadataError("wrong offset inside %r" % atom.name)
+            atoms.preload(b"moov")
+        except AtomError as err:
+            reraise(error, err, sys.exc_info()[2])
+        return _read_fragments(fileobj, atoms)
 
-    def __update_tfhd(self, fileobj, atom, delta, offset):
-        if atom.offset > offset:
-            atom.offset += delta
-        fileobj.seek(atom.offset + 9)
-        data = fileobj.read(atom.length - 9)
-        flags = cdata.uint_be(b"\x00" + data[:3])
-        if flags & 1:
-            o = cdata.ulonglong_be(data[7:15])
-            if o > offset:
-                o += delta
-            fileobj.seek(atom.offset + 16)
-            fileobj.write(cdata.to_ulonglong_be(o))
-
-    def __update_offsets(self, fileobj, atoms, delta, offset):
-        """Update offset tables in all 'stco' and 'co64' atoms."""
-        if delta == 0:
-            return
-        moov = atoms[b"moov"]
-        for atom in moov.findall(b'stco', True):
-            self.__update_offset_table(fileobj, ">%dI", atom, delta, offset)
-        for atom in moov.findall(b'co64', True):
-            self.__update_offset_table(fileobj, ">%dQ", atom, delta, offset)
+    def __save_new(self, fileobj, atoms, ilst_data, padding_func):
         try:
-            for atom in atoms[b"moof"].findall(b'tfhd', True):
-                self.__update_tfhd(fileobj, atom, delta, offset)
+            path = atoms.path(b"moov", b"udta")
         except KeyError:
-            pass
+            path = atoms.path(b"moov")
+
+        fragments = self.__read_for_move(fileobj, atoms)
+        offset, delta = _insert_meta(fileobj, path, ilst_data, padding_func)
+        _update_offsets(fileobj, atoms, fragments, delta, offset)
+
+    def __save_existing(self, fileobj, atoms, path, ilst_data, padding_func):
+        if _reclaim_padding(fileobj, path, ilst_data, padding_func):
+            return
+        offset, length, data = _render_ilst(
+            fileobj, path, ilst_data, padding_func)
+        # nothing to update if everything stays in place
+        fragments = []
+        if _parts_size(data) != length:
+            fragments = self.__read_for_move(fileobj, atoms)
+        delta = _replace_ilst(fileobj, path, offset, length, data)
+        _update_offsets(fileobj, atoms, fragments, delta, offset)
 
     def __parse_data(self, atom, data):
         pos = 0
@@ -774,6 +1326,8 @@ class MP4Tags(DictProxy, Tags):
                 imageformat = MP4Cover.FORMAT_JPEG
             cover = MP4Cover(data[pos + 16:pos + length], imageformat)
             values.append(cover)
+            cover._data_offset = (
+                self._pictures_token, atom._dataoffset + pos + 16)
             pos += length
 
         key = _name2key(atom.name)
@@ -786,9 +1340,12 @@ class MP4Tags(DictProxy, Tags):
                 imageformat = cover.imageformat
             except AttributeError:
                 imageformat = MP4Cover.FORMAT_JPEG
-            atom_data.append(Atom.render(
-                b"data", struct.pack(">2I", imageformat, 0) + cover))
-        return Atom.render(_key2name(key), b"".join(atom_data))
+            data = getattr(cover, "_data_source", None)
+            if data is None:
+                data = bytes(cover)
+            atom_data += _render_parts(
+                b"data", [struct.pack(">2I", imageformat, 0), data])
+        return _render_parts(_key2name(key), atom_data)
 
     def __parse_text(self, atom, data, implicit=True):
         # implicit = False, for parsing unknown atoms only take utf8 ones.
@@ -827,6 +1384,24 @@ class MP4Tags(DictProxy, Tags):
 
         return self.__render_data(key, 0, flags, encoded)
 
+    def _iter_pictures(self):
+        for cover in self.get("covr", []):
+            token, offset = getattr(cover, "_data_offset", (None, None))
+            if token is not self._pictures_token:
+                offset = None
+            imageformat = getattr(cover, "imageformat", MP4Cover.FORMAT_JPEG)
+            if imageformat == MP4Cover.FORMAT_PNG:
+                mime = u"image/png"
+            else:
+                mime = u"image/jpeg"
+            source = getattr(cover, "_data_source", None)
+            if source is not None:
+                # don't read the file, copy it only when extracting
+                yield PictureInfo(source.write_to, len(source), mime=mime)
+                continue
+            yield PictureInfo._from_data(
+                lambda cover=cover: cover, offset=offset, mime=mime)
+
     def delete(self, filename):
         """Remove the metadata from the given filename."""
 
@@ -885,7 +1460,9 @@ class MP4Tags(DictProxy, Tags):
                 key = key.decode("latin-1")
             if key == "covr":
                 values.append(u"%s=%s" % (key, u", ".join(
-                    [u"[%d bytes of data]" % len(data) for data in value])))
+                    [u"[%d bytes of data]" %
+                     len(getattr(data, "_data_source", None) or data)
+                     for data in value])))
             elif isinstance(value, list):
                 for v in value:
                     values.append(to_line(key, v))
@@ -909,7 +1486,8 @@ class MP4Chapters(Sequence):
 
     MPEG-4 Chapter information.
 
-    Supports the 'moov.udta.chpl' box.
+    Supports the 'moov.udta.chpl' box and, if there is none, QuickTime
+    text chapter tracks referenced through 'tref/chap'.
 
     A sequence of Chapter objects with the following members:
         start (`float`): position from the start of the file in seconds
@@ -944,14 +1522,24 @@ class MP4Chapters(Sequence):
 
         try:
             chpl = atoms.path(b"moov", b"udta", b"chpl")[-1]
-        except KeyError as key:
-            return MP4MetadataError(key)
-
-        self._parse_chpl(chpl, fileobj)
+        except KeyError:
+            self._parse_chapter_track(atoms[b"moov"], fileobj)
+        else:
+            self._parse_chpl(chpl, fileobj)
 
     @classmethod
     def _can_load(cls, atoms):
-        return b"moov.udta.chpl" in atoms and b"moov.mvhd" in atoms
+        if b"moov.mvhd" not in atoms:
+            return False
+        if b"moov.udta.chpl" in atoms:
+            return True
+        for trak in atoms[b"moov"].findall(b"trak"):
+            try:
+                trak[b"tref", b"chap"]
+            except (KeyError, AtomError):
+                continue
+            return True
+        return False
 
     def _parse_mvhd(self, atom, fileobj):
         assert atom.name == b"mvhd"
@@ -1005,12 +1593,413 @@ class MP4Chapters(Sequence):
 
             self._chapters.append(Chapter(start, title))
 
+    def _parse_chapter_track(self, moov, fileobj):
+        traks = list(moov.findall(b"trak"))
+
+        track_ids = []
+        for trak in traks:
+            try:
+                chap = trak[b"tref", b"chap"]
+            except (KeyError, AtomError):
+                continue
+            ok, data = chap.read(fileobj)
+            if not ok:
+                raise MP4MetadataError("Invalid chap")
+            track_ids.extend(
+                struct.unpack(">%dI" % (len(data) // 4), data[:len(data) & ~3]))
+
+        # the chapter references can also point to image tracks
+        for trak in traks:
+            try:
+                track_id = _parse_tkhd(trak[b"tkhd", ], fileobj)
+                hdlr = trak[b"mdia", b"hdlr"]
+            except (KeyError, AtomError):
+                continue
+            if track_id not in track_ids:
+                continue
+            ok, data = hdlr.read(fileobj)
+            if ok and data[8:12] in (b"text", b"sbtl"):
+                break
+        else:
+            raise MP4MetadataError("No text chapter track")
+
+        timescale = _parse_mdhd(trak[b"mdia", b"mdhd"], fileobj)[0]
+        if not timescale:
+            raise MP4MetadataError("Invalid chapter track timescale")
+
+        stbl = trak[b"mdia", b"minf", b"stbl"]
+        durations = _parse_stts(stbl[b"stts", ], fileobj)
+        sample_size, count, sizes = _parse_stsz(stbl[b"stsz", ], fileobj)
+        for atom in stbl.children:
+            if atom.name in (b"stco", b"co64"):
+                chunks = _read_offset_table(fileobj, atom, atom.offset)
+                break
+        else:
+            raise MP4MetadataError("Chapter track without chunk offsets")
+        stsc = stbl[b"stsc", ]
+        ok, data = stsc.read(fileobj)
+        if not ok or len(data) < 8:
+            raise MP4MetadataError("Invalid stsc")
+        runs = _read_table(stsc, data, 8, cdata.uint_be(data[4:8]) * 3)
+
+        # read every chunk at once and split it into samples, the counts
+        # are only bounded by the chunk data actually present in the file
+        file_size = get_size(fileobj)
+        samples = []
+        for i in range(0, len(runs), 3):
+            first, per_chunk = runs[i:i + 2]
+            if not first:
+                raise MP4MetadataError("Invalid stsc first chunk")
+            last = runs[i + 3] if i + 3 < len(runs) else len(chunks) + 1
+            for chunk in range(first, last):
+                if chunk > len(chunks) or len(samples) >= count:
+                    break
+                wanted = min(per_chunk, count - len(samples))
+                offset = chunks[chunk - 1]
+                available = max(0, file_size - offset)
+                fileobj.seek(offset)
+                if sizes is None:
+                    data = fileobj.read(min(wanted * sample_size, available))
+                    chunk_sizes = [sample_size] * min(
+                        wanted, -(-len(data) // sample_size))
+                else:
+                    chunk_sizes = sizes[len(samples):len(samples) + wanted]
+                    data = fileobj.read(min(sum(chunk_sizes), available))
+                pos = 0
+                for size in chunk_sizes:
+                    samples.append(data[pos:pos + size])
+                    pos += size
+
+        starts = accumulate(chain.from_iterable(
+            repeat(delta, count) for count, delta in durations), initial=0)
+        for i, (start, sample) in enumerate(zip(starts, samples)):
+            if len(sample) < 2:
+                raise MP4MetadataError("chapter %d: truncated sample" % i)
+            text = sample[2:2 + cdata.ushort_be(sample[:2])]
+            try:
+                if text[:2] in (codecs.BOM_UTF16_BE, codecs.BOM_UTF16_LE):
+                    title = text.decode("utf-16")
+                else:
+                    title = text.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise MP4MetadataError("chapter %d title: %s" % (i, e))
+            self._chapters.append(Chapter(start / timescale, title))
+
     def pprint(self):
         chapters = ["%s %s" % (timedelta(seconds=chapter.start), chapter.title)
                     for chapter in self._chapters]
         return "chapters=%s" % '\n  '.join(chapters)
 
 
+class MP4TrackInfo(object):
+    """MP4TrackInfo()
+
+    Information about a single track of a MPEG-4 file.
+
+    Attributes:
+        track_id (`int`): track ID, 0 if unknown
+        handler_type (`str`): e.g. ``"soun"`` for audio, ``"vide"`` for
+            video or ``"text"`` for chapter tracks
+        length (`float`): track length in seconds
+        language (`str`): ISO 639-2/T language code, e.g. ``"eng"``,
+            ``"und"`` if unknown
+        codec (`str`): codec of the first sample entry, e.g.
+            ``"mp4a.40.2"`` or ``"avc1"``, see `MP4Info.codec`
+        codec_description (`str`): name of the codec, for display
+            purposes only
+        bitrate (`int`): average bitrate in bits per second, 0 if unknown
+        max_bitrate (`int`): highest bitrate over one second, 0 if
+            unknown
+        channels (`int`): number of audio channels, 0 if not audio
+        sample_rate (`int`): audio sampling rate in Hz, 0 if not audio
+        bits_per_sample (`int`): bits per sample, 0 if not audio
+    """
+
+    track_id = 0
+    handler_type = u""
+    length = 0.0
+    language = u"und"
+    codec = u""
+    codec_description = u""
+    bitrate = 0
+    max_bitrate = 0
+    channels = 0
+    sample_rate = 0
+    bits_per_sample = 0
+
+
+def _parse_tkhd(atom, fileobj):
+    """Returns the track ID"""
+
+    ok, data = atom.read(fileobj)
+    if not ok:
+        raise MP4StreamInfoError("Invalid tkhd")
+
+    try:
+        version, flags, data = parse_full_atom(data)
+    except ValueError as e:
+        raise MP4StreamInfoError(e)
+
+    # skip creation and modification time
+    offset = 16 if version == 1 else 8
+    try:
+        return cdata.uint32_be_from(data, offset)[0]
+    except cdata.error as e:
+        raise MP4StreamInfoError(e)
+
+
+def _parse_mdhd(atom, fileobj):
+    """Returns the timescale, the duration and the language"""
+
+    ok, data = atom.read(fileobj)
+    if not ok:
+        raise MP4StreamInfoError("Not enough data")
+
+    try:
+        version, flags, data = parse_full_atom(data)
+    except ValueError as e:
+        raise MP4StreamInfoError(e)
+
+    if version == 0:
+        offset = 8
+        fmt = ">2I"
+    elif version == 1:
+        offset = 16
+        fmt = ">IQ"
+    else:
+        raise MP4StreamInfoError("Unknown mdhd version %d" % version)
+
+    end = offset + struct.calcsize(fmt)
+    try:
+        timescale, duration = struct.unpack(fmt, data[offset:end])
+    except struct.error as e:
+        raise MP4StreamInfoError(e)
+
+    # three 5 bit characters, each stored as offset from 0x60
+    language = u"und"
+    if len(data) >= end + 2:
+        code = cdata.ushort_be(data[end:end + 2])
+        chars = [(code >> shift & 0x1f) + 0x60 for shift in (10, 5, 0)]
+        if all(0x61 <= c <= 0x7a for c in chars):
+            language = bytes(chars).decode("ascii")
+
+    return timescale, duration, language
+
+
+def _parse_stsd(atom, fileobj, track, is_audio):
+    """Sets the codec of the track from the first sample entry and, for
+    audio tracks, channels, bits_per_sample, sample_rate and bitrate.
+
+    Can raise MP4StreamInfoError.
+    """
+
+    assert atom.name == b"stsd"
+
+    ok, data = atom.read(fileobj)
+    if not ok:
+        raise MP4StreamInfoError("Invalid stsd")
+
+    try:
+        version, flags, data = parse_full_atom(data)
+    except ValueError as e:
+        raise MP4StreamInfoError(e)
+
+    if version != 0:
+        raise MP4StreamInfoError("Unsupported stsd version")
+
+    try:
+        num_entries, offset = cdata.uint32_be_from(data, 0)
+    except cdata.error as e:
+        raise MP4StreamInfoError(e)
+
+    if num_entries == 0:
+        return
+
+    # look at the first entry if there is one
+    entry_fileobj = BytesIO(data[offset:])
+    try:
+        entry_atom = Atom(entry_fileobj)
+    except AtomError as e:
+        raise MP4StreamInfoError(e)
+
+    if not is_audio:
+        track.codec = entry_atom.name.decode("latin-1")
+        track.codec_description = track.codec.upper()
+        return
+
+    try:
+        entry = AudioSampleEntry(entry_atom, entry_fileobj)
+    except ASEntryError as e:
+        raise MP4StreamInfoError(e)
+    else:
+        track.channels = entry.channels
+        track.bits_per_sample = entry.sample_size
+        track.sample_rate = entry.sample_rate
+        track.bitrate = entry.bitrate
+        track.codec = entry.codec
+        track.codec_description = entry.codec_description
+
+
+def _read_table(atom, data, offset, count):
+    """Returns count uint32 items of the atom data starting at offset as
+    a native byte order array.
+    """
+
+    table = array(_UINT32_TYPECODE)
+    end = offset + count * table.itemsize
+    if len(data) < end:
+        raise MP4StreamInfoError("Invalid %r" % atom.name)
+    table.frombytes(data[offset:end])
+    if sys.byteorder == "little":
+        table.byteswap()
+    return table
+
+
+def _parse_stts(atom, fileobj):
+    """Returns a list of (sample count, sample duration) runs"""
+
+    ok, data = atom.read(fileobj)
+    if not ok or len(data) < 8:
+        raise MP4StreamInfoError("Invalid stts")
+    entries = _read_table(atom, data, 8, cdata.uint_be(data[4:8]) * 2)
+    return [(count, delta) for count, delta in
+            zip(entries[::2], entries[1::2]) if count]
+
+
+def _parse_stsz(atom, fileobj):
+    """Returns (sample size, sample count, sizes) where sizes is an array
+    with the size of every sample, or None if all have the same size.
+    """
+
+    ok, data = atom.read(fileobj)
+    if not ok or len(data) < 12:
+        raise MP4StreamInfoError("Invalid stsz")
+    sample_size, count = struct.unpack(">II", data[4:12])
+    if sample_size:
+        return sample_size, count, None
+    return 0, count, _read_table(atom, data, 12, count)
+
+
+def _truncate_runs(runs, count):
+    """Returns the (count, value) runs limited to `count` items in total"""
+
+    result = []
+    for run_count, value in runs:
+        if count <= 0:
+            break
+        result.append((min(run_count, count), value))
+        count -= run_count
+    return result
+
+
+def _max_window_count(runs, timescale):
+    """Returns the highest number of samples starting within one second,
+    given the (sample count, sample duration) runs.
+
+    Moving the end of the window by one sample adds one sample and drops
+    as many as fit into its duration, so while the start and the end of
+    the window each stay within one run, the count only goes up or down.
+    The count is only computed at the samples where that changes, which
+    keeps this independent of the number of samples.
+    """
+
+    first_index = []
+    first_time = []
+    last_time = []
+    index = time = 0
+    for count, delta in runs:
+        first_index.append(index)
+        first_time.append(time)
+        last_time.append(time + (count - 1) * delta)
+        index += count
+        time += count * delta
+    total = index
+
+    def time_of(sample):
+        i = bisect_right(first_index, sample) - 1
+        return first_time[i] + (sample - first_index[i]) * runs[i][1]
+
+    def first_from(time):
+        # the first sample starting at time or later
+        i = bisect_left(last_time, time)
+        if i == len(runs):
+            return total
+        delta = runs[i][1]
+        skip = -(-(time - first_time[i]) // delta) if delta else 0
+        return first_index[i] + max(0, skip)
+
+    candidates = set()
+    for i in range(len(runs)):
+        candidates.add(first_index[i])
+        candidates.add(first_index[i] + runs[i][0] - 1)
+        for time in (first_time[i], last_time[i]):
+            end = first_from(time + timescale)
+            candidates.update((end - 1, end))
+
+    peak = 0
+    for end in candidates:
+        if 0 <= end < total:
+            start = first_from(time_of(end) - timescale + 1)
+            peak = max(peak, end - start + 1)
+    return peak
+
+
+def _parse_sample_bitrates(stbl, fileobj, timescale):
+    """Returns the average bitrate and the highest bitrate over one second
+    computed from the sample tables, or (0, 0) if not available.
+
+    Nothing gets expanded to one entry per sample beyond the size table
+    stored in the file, as the sample counts can be arbitrary large.
+    """
+
+    try:
+        runs = _parse_stts(stbl[b"stts", ], fileobj)
+        sample_size, count, sizes = _parse_stsz(stbl[b"stsz", ], fileobj)
+    except (KeyError, MP4StreamInfoError):
+        return 0, 0
+
+    runs = _truncate_runs(runs, count)
+    count = sum(c for c, d in runs)
+    total = sum(c * d for c, d in runs)
+    if not total or not timescale:
+        return 0, 0
+
+    if sizes is None:
+        bitrate = int(sample_size * count * 8 * timescale / total)
+        peak = sample_size * _max_window_count(runs, timescale)
+        return bitrate, max(bitrate, peak * 8)
+
+    del sizes[count:]
+    bitrate = int(sum(sizes) * 8 * timescale / total)
+
+    # sums[i] is the size of the first i samples
+    sums = list(accumulate(sizes, initial=0))
+    if len(runs) == 1:
+        # all samples have the same duration, so does every window
+        window = -(-timescale // runs[0][1])
+        if window >= count:
+            peak = sums[-1]
+        else:
+            peak = max(map(operator.sub, sums[window:], sums))
+    else:
+        durations = array(_UINT32_TYPECODE)
+        for run_count, delta in runs:
+            durations += array(_UINT32_TYPECODE, [delta]) * run_count
+        times = list(accumulate(durations, initial=0))
+        peak = 0
+        start = 0
+        for end in range(count):
+            # skip samples starting a second or more before this one
+            limit = times[end] - timescale
+            while times[start] <= limit:
+                start += 1
+            window = sums[end + 1] - sums[start]
+            if window > peak:
+                peak = window
+
+    return bitrate, max(bitrate, peak * 8)
+
+
 class MP4Info(StreamInfo):
     """MP4Info()
 
@@ -1033,9 +2022,13 @@ class MP4Info(StreamInfo):
         codec_description (`mutagen.text`):
             Name of the codec used (ALAC, AAC LC, AC-3...). Values might
             change in the future, use for display purposes only.
+        max_bitrate (`int`): highest bitrate over one second, only
+            available if the sample tables were scanned, otherwise 0
+        tracks (list[MP4TrackInfo]): information about all tracks
     """
 
     bitrate = 0
+    max_bitrate = 0
     length = 0.0
     channels = 0
     sample_rate = 0
@@ -1044,24 +2037,66 @@ class MP4Info(StreamInfo):
     codec_description = u""
 
     def __init__(self, *args, **kwargs):
+        self.tracks = []
         if args or kwargs:
             self.load(*args, **kwargs)
 
     @convert_error(IOError, MP4StreamInfoError)
-    def load(self, atoms, fileobj):
+    def load(self, atoms, fileobj, scan_samples=False):
         try:
             moov = atoms[b"moov"]
         except KeyError:
             raise MP4StreamInfoError("not a MP4 file")
 
+        self.tracks = []
+        audio = None
         for trak in moov.findall(b"trak"):
-            hdlr = trak[b"mdia", b"hdlr"]
-            ok, data = hdlr.read(fileobj)
-            if not ok:
-                raise MP4StreamInfoError("Not enough data")
-            if data[8:12] == b"soun":
-                break
-        else:
+            track = MP4TrackInfo()
+            self.tracks.append(track)
+            is_audio = False
+
+            try:
+                track.track_id = _parse_tkhd(trak[b"tkhd", ], fileobj)
+            except (KeyError, MP4StreamInfoError, AtomError):
+                pass
+
+            try:
+                # tracks without a handler can't be the audio one
+                hdlr = trak[b"mdia", b"hdlr"]
+                ok, data = hdlr.read(fileobj)
+                if not ok:
+                    raise MP4StreamInfoError("Not enough data")
+                track.handler_type = data[8:12].decode("latin-1")
+                is_audio = audio is None and data[8:12] == b"soun"
+                if is_audio:
+                    audio = track
+
+                timescale, duration, track.language = _parse_mdhd(
+                    trak[b"mdia", b"mdhd"], fileobj)
+                try:
+                    track.length = float(duration) / timescale
+                except ZeroDivisionError:
+                    track.length = 0
+
+                try:
+                    stsd = trak[b"mdia", b"minf", b"stbl", b"stsd"]
+                except KeyError:
+                    pass
+                else:
+                    _parse_stsd(stsd, fileobj, track, data[8:12] == b"soun")
+
+                if scan_samples:
+                    stbl = trak[b"mdia", b"minf", b"stbl"]
+                    bitrate, max_bitrate = _parse_sample_bitrates(
+                        stbl, fileobj, timescale)
+                    if bitrate:
+                        track.bitrate = bitrate
+                        track.max_bitrate = max_bitrate
+            except (KeyError, MP4StreamInfoError, AtomError):
+                if is_audio:
+                    raise
+
+        if audio is None:
             try:
                 # No track info. Fall back to reading the overall length
                 # from mvhd.
@@ -1071,85 +2106,14 @@ class MP4Info(StreamInfo):
             except KeyError:
                 raise MP4NoTrackError("track has no audio data")
 
-        mdhd = trak[b"mdia", b"mdhd"]
-        ok, data = mdhd.read(fileobj)
-        if not ok:
-            raise MP4StreamInfoError("Not enough data")
-
-        try:
-            version, flags, data = parse_full_atom(data)
-        except ValueError as e:
-            raise MP4StreamInfoError(e)
-
-        if version == 0:
-            offset = 8
-            fmt = ">2I"
-        elif version == 1:
-            offset = 16
-            fmt = ">IQ"
-        else:
-            raise MP4StreamInfoError("Unknown mdhd version %d" % version)
-
-        end = offset + struct.calcsize(fmt)
-        unit, length = struct.unpack(fmt, data[offset:end])
-        try:
-            self.length = float(length) / unit
-        except ZeroDivisionError:
-            self.length = 0
-
-        try:
-            atom = trak[b"mdia", b"minf", b"stbl", b"stsd"]
-        except KeyError:
-            pass
-        else:
-            self._parse_stsd(atom, fileobj)
-
-    def _parse_stsd(self, atom, fileobj):
-        """Sets channels, bits_per_sample, sample_rate and optionally bitrate.
-
-        Can raise MP4StreamInfoError.
-        """
-
-        assert atom.name == b"stsd"
-
-        ok, data = atom.read(fileobj)
-        if not ok:
-            raise MP4StreamInfoError("Invalid stsd")
-
-        try:
-            version, flags, data = parse_full_atom(data)
-        except ValueError as e:
-            raise MP4StreamInfoError(e)
-
-        if version != 0:
-            raise MP4StreamInfoError("Unsupported stsd version")
-
-        try:
-            num_entries, offset = cdata.uint32_be_from(data, 0)
-        except cdata.error as e:
-            raise MP4StreamInfoError(e)
-
-        if num_entries == 0:
-            return
-
-        # look at the first entry if there is one
-        entry_fileobj = BytesIO(data[offset:])
-        try:
-            entry_atom = Atom(entry_fileobj)
-        except AtomError as e:
-            raise MP4StreamInfoError(e)
-
-        try:
-            entry = AudioSampleEntry(entry_atom, entry_fileobj)
-        except ASEntryError as e:
-            raise MP4StreamInfoError(e)
-        else:
-            self.channels = entry.channels
-            self.bits_per_sample = entry.sample_size
-            self.sample_rate = entry.sample_rate
-            self.bitrate = entry.bitrate
-            self.codec = entry.codec
-            self.codec_description = entry.codec_description
+        self.length = audio.length
+        self.channels = audio.channels
+        self.bits_per_sample = audio.bits_per_sample
+        self.sample_rate = audio.sample_rate
+        self.bitrate = audio.bitrate
+        self.max_bitrate = audio.max_bitrate
+        self.codec = audio.codec
+        self.codec_description = audio.codec_description
 
     def _parse_mvhd(self, mvhd, fileobj):
         ok, data = mvhd.read(fileobj)
@@ -1178,11 +2142,14 @@ class MP4(FileType):
 
     An MPEG-4 audio file, probably containing AAC.
 
-    If more than one track is present in the file, the first is used.
-    Only audio ('soun') tracks will be read.
+    If more than one track is present in the file, the first audio
+    ('soun') track is used for the stream information. All tracks are
+    listed in `MP4Info.tracks`.
 
     Arguments:
         filething (filething)
+        scan_samples (bool): compute the exact average and the highest
+            bitrate of every track from its sample tables
 
     Attributes:
         info (`MP4Info`)
@@ -1195,7 +2162,7 @@ class MP4(FileType):
     _mimes = ["audio/mp4", "audio/x-m4a", "audio/mpeg4", "audio/aac"]
 
     @loadfile()
-    def load(self, filething):
+    def load(self, filething, scan_samples=False):
         fileobj = filething.fileobj
 
         try:
@@ -1205,7 +2172,7 @@ class MP4(FileType):
 
         self.info = MP4Info()
         try:
-            self.info.load(atoms, fileobj)
+            self.info.load(atoms, fileobj, scan_samples)
         except MP4NoTrackError:
             pass
         except error:
@@ -1225,6 +2192,12 @@ class MP4(FileType):
 
         if not MP4Chapters._can_load(atoms):
             self.chapters = None
+        elif b"moov.udta.chpl" not in atoms:
+            # chapter tracks are a fallback, ignore them if broken
+            try:
+                self.chapters = self.MP4Chapters(atoms, fileobj)
+            except (error, AtomError, struct.error, IndexError, ValueError):
+                self.chapters = None
         else:
             try:
                 self.chapters = self.MP4Chapters(atoms, fileobj)
@@ -1241,10 +2214,177 @@ class MP4(FileType):
             return self.tags._padding
 
     def save(self, *args, **kwargs):
-        """save(filething=None, padding=None)"""
+        """save(filething=None, padding=None, moov_at_end=False)
+
+        Save changes to a file.
+
+        Args:
+            filething (filething):
+                Filename to save the tag to. If no filename is given,
+                the one most recently loaded is used.
+            padding (:obj:`mutagen.PaddingFunction`)
+            moov_at_end (bool):
+                If the tags don't fit into the available padding, move
+                the 'moov' atom to the end of the file instead of
+                resizing it in place, so the media data doesn't have to
+                be rewritten. The old 'moov' atom gets replaced by a
+                'free' atom. Ignored for fragmented files or if 'moov'
+                is the last atom already.
+
+        Raises:
+            mutagen.MutagenError
+        """
 
         super(MP4, self).save(*args, **kwargs)
 
+    @convert_error(IOError, error)
+    @loadfile(writable=True)
+    def optimize_layout(self, filething=None, faststart=True, padding=None):
+        """optimize_layout(filething=None, faststart=True, padding=None)
+
+        Rearranges the top level atoms of the file, moving the 'moov'
+        atom in front of or behind the media data and updating all chunk
+        offsets. Top level 'free' and 'skip' atoms get removed and the
+        padding following the tags gets resized, so future saves can
+        happen in place.
+
+        Args:
+            filething (filething)
+            faststart (bool):
+                If True, 'moov' gets placed in front of the media data, so
+                playback can start before the whole file is downloaded.
+                If False, it gets placed at the end of the file.
+            padding (:obj:`mutagen.PaddingFunction`)
+
+        Raises:
+            mutagen.MutagenError
+        """
+
+        fileobj = filething.fileobj
+        try:
+            atoms = Atoms(fileobj)
+        except AtomError as err:
+            reraise(error, err, sys.exc_info()[2])
+
+        try:
+            moov = atoms[b"moov"]
+        except KeyError:
+            raise error("no moov atom")
+
+        names = [atom.name for atom in atoms.atoms]
+        if not faststart and b"moof" in names:
+            raise error("fragments have to follow moov")
+        fragments = _read_fragments(fileobj, atoms)
+
+        size = get_size(fileobj)
+        last = atoms.atoms[-1]
+        fileobj.seek(last.offset)
+        if cdata.uint_be(read_full(fileobj, 4)) == 0:
+            # extends to the end of file, make the size explicit
+            if last.length > 0xFFFFFFFF:
+                raise error("can't move atom %r" % last.name)
+            fileobj.seek(last.offset)
+            fileobj.write(cdata.to_uint_be(last.length))
+
+        fileobj.seek(moov.offset)
+        original = read_full(fileobj, moov.length)
+
+        others = [atom for atom in atoms.atoms
+                  if atom is not moov and atom.name not in (b"free", b"skip")]
+        index = len(others)
+        if faststart:
+            for i, atom in enumerate(others):
+                if atom.name in (b"mdat", b"moof", b"mfra"):
+                    index = i
+                    break
+        before = [(atom.offset, atom.length) for atom in others[:index]]
+        after = [(atom.offset, atom.length) for atom in others[index:]]
+        end = last.offset + last.length
+        if end < size:
+            # keep trailing garbage
+            after.append((end, size - end))
+        behind_moov = after[0][0] - 1 if after else size
+
+        buf = BytesIO(original)
+        content_size = sum(length for offset, length in after)
+        try:
+            buf_moov = Atom(buf)
+            path = [buf_moov]
+            for name in [b"udta", b"meta", b"ilst"]:
+                path.append(path[-1][name, ])
+        except AtomError as err:
+            reraise(error, err, sys.exc_info()[2])
+        except KeyError:
+            # reserve space for tags, so adding them later doesn't move
+            # the media data again
+            _insert_meta(buf, path[:2], [Atom.render(b"ilst", b"")],
+                         padding, content_size)
+        else:
+            buf.seek(path[-1].offset)
+            ilst_data = read_full(buf, path[-1].length)
+            _replace_ilst(buf, path, *_render_ilst(
+                buf, path, [ilst_data], padding, content_size))
+        buf.seek(0)
+        buf_moov = Atom(buf)
+
+        try:
+            buf_moov.preload()
+        except AtomError as err:
+            reraise(error, err, sys.exc_info()[2])
+
+        moov_offset = sum(length for offset, length in before)
+        moov_length = len(buf.getvalue())
+
+        # (old offset, new offset, length) of everything but moov
+        moves = []
+        position = 0
+        for offset, length in before:
+            moves.append((offset, position, length))
+            position += length
+        position += moov_length
+        for offset, length in after:
+            moves.append((offset, position, length))
+            position += length
+
+        shifts = []
+        previous = 0
+        for offset, position, length in moves:
+            shifts.append((offset - 1, position - offset - previous))
+            previous = position - offset
+        _update_chunk_offsets(buf, buf_moov, shifts, [], behind_moov)
+        data = buf.getvalue()
+
+        # converted offset tables grow moov
+        growth = len(data) - moov_length
+        moves = [(o, p + growth if o > behind_moov else p, n)
+                 for o, p, n in moves]
+        new_size = sum(n for o, p, n in moves) + len(data)
+
+        if data == original and moov_offset == moov.offset and \
+                all(o == p for o, p, n in moves) and new_size == size:
+            return
+        fragments = _render_fragments(fragments, shifts)
+
+        if new_size > size:
+            resize_file(fileobj, new_size - size)
+        # Nothing gets overwritten before it was moved, see move_bytes
+        for offset, dest, length in reversed(moves):
+            if dest > offset:
+                move_bytes(fileobj, dest, offset, length)
+        for offset, dest, length in moves:
+            if dest < offset:
+                move_bytes(fileobj, dest, offset, length)
+        fileobj.seek(moov_offset)
+        fileobj.write(data)
+        if new_size < size:
+            resize_file(fileobj, new_size - size)
+        for offset, fragment in fragments:
+            fileobj.seek(offset)
+            fileobj.write(fragment)
+
+        if isinstance(self.tags, MP4Tags):
+            self.tags._pictures_token = object()
+
     def pprint(self):
         """
         Returns:
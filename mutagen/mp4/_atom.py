@@ -12,7 +12,7 @@ from mutagen._util import convert_error
 # This is not an exhaustive list of container atoms, but just the
 # ones this module needs to peek inside.
 _CONTAINERS = [b"moov", b"udta", b"trak", b"mdia", b"meta", b"ilst",
-               b"stbl", b"minf", b"moof", b"traf"]
+               b"stbl", b"minf", b"moof", b"traf", b"tref"]
 _SKIP_SIZE = {b"meta": 4}
 
 
@@ -24,16 +24,22 @@ class Atom(object):
     """An individual atom.
 
     Attributes:
-    children -- list child atoms (or None for non-container atoms)
+    children -- list child atoms (or None for non-container atoms),
+                parsed on first access
     length -- length of this atom, including length and name
     datalength = -- length of this atom without length, name
     name -- four byte name of the atom, as a str
     offset -- location in the constructor-given fileobj of this atom
 
+    Since children are parsed lazily, the fileobj has to stay open and
+    unchanged until they are accessed, see preload(). Accessing them
+    may raise AtomError.
+
     This structure should only be used internally by Mutagen.
     """
 
-    children = None
+    _children = None
+    _fileobj = None
 
     @convert_error(IOError, AtomError)
     def __init__(self, fileobj, level=0):
@@ -68,12 +74,37 @@ class Atom(object):
                 "atom length can only be 0, 1 or 8 and higher")
 
         if self.name in _CONTAINERS:
-            self.children = []
-            fileobj.seek(_SKIP_SIZE.get(self.name, 0), 1)
-            while fileobj.tell() < self.offset + self.length:
-                self.children.append(Atom(fileobj, level + 1))
-        else:
-            fileobj.seek(self.offset + self.length, 0)
+            self._fileobj = fileobj
+            self._level = level
+        fileobj.seek(self.offset + self.length, 0)
+
+    @property
+    def children(self):
+        if self._fileobj is not None:
+            self._children = self.__parse_children(self._fileobj)
+            self._fileobj = None
+        return self._children
+
+    # ValueError in case the file got closed
+    @convert_error((IOError, ValueError, struct.error), AtomError)
+    def __parse_children(self, fileobj):
+        children = []
+        fileobj.seek(self._dataoffset + _SKIP_SIZE.get(self.name, 0))
+        while fileobj.tell() < self.offset + self.length:
+            children.append(Atom(fileobj, self._level + 1))
+        return children
+
+    def preload(self, skip=()):
+        """Parses all child atoms recursively, so the tree stays valid
+        after the file gets modified. The children of atoms with a name
+        in skip are left alone.
+
+        May raise AtomError
+        """
+
+        for child in self.children or []:
+            if child.name not in skip:
+                child.preload(skip)
 
     @property
     def datalength(self):
@@ -90,11 +121,16 @@ class Atom(object):
     def render(name, data):
         """Render raw atom data."""
         # this raises OverflowError if Py_ssize_t can't handle the atom data
-        size = len(data) + 8
+        return Atom.render_header(name, len(data)) + data
+
+    @staticmethod
+    def render_header(name, datalength):
+        """Render the header of an atom with datalength bytes of data."""
+        size = datalength + 8
         if size <= 0xFFFFFFFF:
-            return struct.pack(">I4s", size, name) + data
+            return struct.pack(">I4s", size, name)
         else:
-            return struct.pack(">I4sQ", 1, name, size + 8) + data
+            return struct.pack(">I4sQ", 1, name, size + 8)
 
     def findall(self, name, recursive=False):
         """Recursively find all child atoms by specified name."""
@@ -123,7 +159,11 @@ class Atom(object):
 
     def __repr__(self):
         cls = self.__class__.__name__
-        if self.children is None:
+        if self._fileobj is not None:
+            # not parsed yet, don't touch the file for that
+            return "<%s name=%r length=%r offset=%r ...>" % (
+                cls, self.name, self.length, self.offset)
+        elif self.children is None:
             return "<%s name=%r length=%r offset=%r>" % (
                 cls, self.name, self.length, self.offset)
         else:
@@ -139,17 +179,40 @@ class Atoms(object):
     Attributes:
     atoms -- a list of top-level atoms as Atom objects
 
+    The 'moov' atoms get parsed on construction, except for the children
+    of their 'trak' atoms which, like the children of the other top-level
+    atoms (e.g. the possibly many 'moof' atoms of fragmented files), are
+    parsed on first access and may raise AtomError then. Use preload()
+    before modifying the file.
+
     This structure should only be used internally by Mutagen.
     """
 
     @convert_error(IOError, AtomError)
     def __init__(self, fileobj):
         self.atoms = []
+        self._index = {}
         fileobj.seek(0, 2)
         end = fileobj.tell()
         fileobj.seek(0)
         while fileobj.tell() + 8 <= end:
-            self.atoms.append(Atom(fileobj))
+            atom = Atom(fileobj)
+            self.atoms.append(atom)
+            self._index.setdefault(atom.name, atom)
+        for atom in self.atoms:
+            if atom.name == b"moov":
+                atom.preload(skip=(b"trak",))
+
+    def preload(self, *names):
+        """Parses all atoms, or only the top level atoms with the given
+        names and their children, see Atom.preload()
+
+        May raise AtomError
+        """
+
+        for atom in self.atoms:
+            if not names or atom.name in names:
+                atom.preload()
 
     def path(self, *names):
         """Look up and return the complete path of an atom.
@@ -181,11 +244,11 @@ class Atoms(object):
         if isinstance(names, bytes):
             names = names.split(b".")
 
-        for child in self.atoms:
-            if child.name == names[0]:
-                return child[names[1:]]
-        else:
+        try:
+            child = self._index[names[0]]
+        except KeyError:
             raise KeyError("%r not found" % names[0])
+        return child[names[1:]]
 
     def __repr__(self):
         return "\n".join([repr(child) for child in self.atoms])
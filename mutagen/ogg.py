@@ -18,12 +18,14 @@ http://www.xiph.org/ogg/doc/rfc3533.txt.
 import struct
 import sys
 import zlib
+from array import array
+from bisect import bisect_right
 from io import BytesIO
 from typing import Type
 
 from mutagen import FileType
 from mutagen._util import cdata, resize_bytes, MutagenError, loadfile, \
-    seek_end, bchr, reraise
+    seek_end, bchr, reraise, get_size
 from mutagen._file import StreamInfo
 from mutagen._tags import Tags
 
@@ -34,6 +36,34 @@ class error(MutagenError):
     pass
 
 
+_MAX_PAGE_SIZE = 27 + 255 + 255 * 255
+
+
+def _crc32(parts):
+    """Returns the Ogg CRC-32 (not reflected, initial value 0, no final
+    XOR) of the concatenation of the given bytes-like objects.
+    """
+
+    # zlib's CRC-32 uses the same polynomial but is bit-reflected, so feed
+    # it bit-swapped data and swap the result back. This is a lot faster
+    # than a table-driven CRC in Python, even with the copy.
+    return _crc32_swapped([
+        part.translate(cdata.bitswap) if isinstance(part, (bytes, bytearray))
+        else bytes(part).translate(cdata.bitswap) for part in parts])
+
+
+def _crc32_swapped(parts):
+    """Like _crc32(), but for bit-swapped data. Parts can be memoryviews,
+    they don't get copied.
+    """
+
+    crc = 0xffffffff
+    for part in parts:
+        crc = zlib.crc32(part, crc) & 0xffffffff
+    crc = (~crc) & 0xffffffff
+    return cdata.uint_le(cdata.to_uint_be(crc).translate(cdata.bitswap))
+
+
 class OggPage(object):
     """A single Ogg page (not necessarily a single encoded packet).
 
@@ -70,6 +100,12 @@ class OggPage(object):
     offset = None
     complete = True
 
+    # (memoryview, lacings) of not yet materialized packet data
+    _lazy = None
+
+    # the CRC as read from the file
+    _crc = None
+
     def __init__(self, fileobj=None):
         """Raises error, IOError, EOFError"""
 
@@ -87,29 +123,48 @@ class OggPage(object):
         if len(header) < 27 and all(byte == 0 for byte in header):
             raise EOFError
 
-        if len(header) == 0:
-            raise EOFError
+        segments = self._parse_header(header, self.offset)
+
+        lacing_bytes = fileobj.read(segments)
+        if len(lacing_bytes) != segments:
+            raise error("unable to read %r lacing bytes" % segments)
+        lacings = self._parse_lacings(lacing_bytes)
+
+        data_size = sum(lacings)
+        data = fileobj.read(data_size)
+        if len(data) != data_size:
+            raise error("unable to read full data")
+        self._lazy = (memoryview(data), lacings)
+
+    def _parse_header(self, header, offset):
+        """Parses the fixed size page header and returns the number of
+        lacing bytes following it.
+
+        Raises error
+        """
 
         try:
             (oggs, self.version, self.__type_flags,
              self.position, self.serial, self.sequence,
-             crc, segments) = struct.unpack("<4sBBqIIiB", header)
+             self._crc, segments) = struct.unpack("<4sBBqIIIB", header)
         except struct.error:
             raise error("unable to read full header; got %r" % header)
 
         if oggs != b"OggS":
             raise error("read %r, expected %r, at 0x%x" % (
-                oggs, b"OggS", fileobj.tell() - 27))
+                oggs, b"OggS", offset))
 
         if self.version != 0:
             raise error("version %r unsupported" % self.version)
 
+        return segments
+
+    def _parse_lacings(self, lacing_bytes):
+        """Returns a list of packet sizes and sets 'complete'"""
+
         total = 0
         lacings = []
-        lacing_bytes = fileobj.read(segments)
-        if len(lacing_bytes) != segments:
-            raise error("unable to read %r lacing bytes" % segments)
-        for c in bytearray(lacing_bytes):
+        for c in lacing_bytes:
             total += c
             if c < 255:
                 lacings.append(total)
@@ -117,10 +172,122 @@ class OggPage(object):
         if total:
             lacings.append(total)
             self.complete = False
+        return lacings
 
-        self.packets = [fileobj.read(l) for l in lacings]
-        if [len(p) for p in self.packets] != lacings:
-            raise error("unable to read full data")
+    @classmethod
+    def iter_pages(cls, fileobj, buffer_size=2 ** 16):
+        """Iterate over the Ogg pages starting at the current position
+        of fileobj, until the end of the file.
+
+        Compared to calling the constructor in a loop this reads the file
+        in chunks of at least buffer_size bytes and parses the pages from
+        memory. The packet data is only copied out of the read buffer once
+        the `packets` attribute of a page gets accessed.
+
+        The iterator keeps track of the read offset itself, so the position
+        of fileobj can be changed (e.g. for writing to it) between
+        iterations. Once exhausted, fileobj points to the end of the last
+        page. If an error is raised, fileobj points to the start of the
+        invalid page.
+
+        Like the constructor this stops at trailing null bytes.
+
+        Raises error, IOError
+        """
+
+        for page, data in cls._iter_raw_pages(fileobj, buffer_size):
+            yield page
+
+    @classmethod
+    def _iter_raw_pages(cls, fileobj, buffer_size, swapped=False):
+        """Like iter_pages(), but yields (page, data) tuples, with data
+        being a memoryview of the page as found in the file.
+
+        If swapped is True, (page, data, swapped_data) tuples are yielded
+        instead, swapped_data being a memoryview of the bit-swapped page
+        for use with _crc32_swapped(). The read buffer only gets swapped
+        once, not every page.
+        """
+
+        buf = b""
+        buf_offset = fileobj.tell()
+        start = 0
+        swapped_buf = None
+
+        def fill(needed):
+            # Returns a buffer starting at the current page, containing
+            # at least 'needed' bytes if the file is large enough.
+            remaining = buf[start:]
+            fileobj.seek(buf_offset + len(buf), 0)
+            data = fileobj.read(max(buffer_size, needed - len(remaining)))
+            return remaining + data
+
+        while True:
+            page_offset = buf_offset + start
+
+            if len(buf) - start < 27:
+                buf = fill(27)
+                buf_offset, start = page_offset, 0
+
+            header = buf[start:start + 27]
+            if len(header) < 27 and all(byte == 0 for byte in header):
+                fileobj.seek(page_offset, 0)
+                return
+
+            page = cls()
+            page.offset = page_offset
+            try:
+                segments = page._parse_header(header, page_offset)
+                header_size = 27 + segments
+                if len(buf) - start < header_size:
+                    buf = fill(header_size)
+                    buf_offset, start = page_offset, 0
+                lacing_bytes = buf[start + 27:start + header_size]
+                if len(lacing_bytes) != segments:
+                    raise error("unable to read %r lacing bytes" % segments)
+                lacings = page._parse_lacings(lacing_bytes)
+
+                size = header_size + sum(lacings)
+                if len(buf) - start < size:
+                    buf = fill(size)
+                    buf_offset, start = page_offset, 0
+                if len(buf) - start < size:
+                    raise error("unable to read full data")
+            except error:
+                fileobj.seek(page_offset, 0)
+                raise
+
+            data = memoryview(buf)[start:start + size]
+            page._lazy = (data[header_size:], lacings)
+            start += size
+
+            if swapped:
+                if swapped_buf is None or swapped_buf[0] is not buf:
+                    swapped_buf = (
+                        buf, memoryview(buf.translate(cdata.bitswap)))
+                yield page, data, swapped_buf[1][start - size:start]
+            else:
+                yield page, data
+
+    def __get_packets(self):
+        lazy = self._lazy
+        if lazy is not None:
+            data, lacings = lazy
+            packets = []
+            offset = 0
+            for lacing in lacings:
+                packets.append(bytes(data[offset:offset + lacing]))
+                offset += lacing
+            self.__packets = packets
+            self._lazy = None
+        return self.__packets
+
+    def __set_packets(self, packets):
+        self._lazy = None
+        self.__packets = packets
+
+    packets = property(__get_packets, __set_packets,
+                       doc="List of raw packet data")
 
     def __eq__(self, other):
         """Two Ogg pages are the same if they write the same data."""
@@ -146,45 +313,51 @@ class OggPage(object):
         single page.
         """
 
-        data = [
-            struct.pack("<4sBBqIIi", b"OggS", self.version, self.__type_flags,
-                        self.position, self.serial, self.sequence, 0)
-        ]
+        lazy = self._lazy
+        if lazy is not None:
+            sizes = lazy[1]
+            packets = [lazy[0]]
+        else:
+            packets = self.packets
+            sizes = [len(datum) for datum in packets]
 
         lacing_data = []
-        for datum in self.packets:
-            quot, rem = divmod(len(datum), 255)
+        for datum_size in sizes:
+            quot, rem = divmod(datum_size, 255)
             lacing_data.append(b"\xff" * quot + bchr(rem))
         lacing_data = b"".join(lacing_data)
         if not self.complete and lacing_data.endswith(b"\x00"):
             lacing_data = lacing_data[:-1]
-        data.append(bchr(len(lacing_data)))
-        data.append(lacing_data)
-        data.extend(self.packets)
-        data = b"".join(data)
-
-        # Python's CRC is swapped relative to Ogg's needs.
-        # crc32 returns uint prior to py2.6 on some platforms, so force uint
-        crc = (~zlib.crc32(data.translate(cdata.bitswap), -1)) & 0xffffffff
-        # Although we're using to_uint_be, this actually makes the CRC
-        # a proper le integer, since Python's CRC is byteswapped.
-        crc = cdata.to_uint_be(crc).translate(cdata.bitswap)
-        data = data[:22] + crc + data[26:]
-        return data
+        data = [bchr(len(lacing_data)), lacing_data]
+        data.extend(packets)
+
+        header = struct.pack(
+            "<4sBBqIII", b"OggS", self.version, self.__type_flags,
+            self.position, self.serial, self.sequence, 0)
+        crc = _crc32([header] + data)
+        header = header[:22] + struct.pack("<I", crc)
+
+        return b"".join([header] + data)
 
     @property
     def size(self) -> int:
         """Total frame size."""
 
+        lazy = self._lazy
+        if lazy is not None:
+            sizes = lazy[1]
+        else:
+            sizes = [len(datum) for datum in self.packets]
+
         size = 27  # Initial header size
-        for datum in self.packets:
-            quot, rem = divmod(len(datum), 255)
+        for datum_size in sizes:
+            quot, rem = divmod(datum_size, 255)
             size += quot + 1
         if not self.complete and rem == 0:
             # Packet contains a multiple of 255 bytes and is not
             # terminated, so we don't have a \x00 at the end.
             size -= 1
-        size += sum(map(len, self.packets))
+        size += sum(sizes)
         return size
 
     def __set_flag(self, bit, val):
@@ -231,22 +404,25 @@ class OggPage(object):
         """
 
         number = start
-        while True:
-            try:
-                page = OggPage(fileobj)
-            except EOFError:
-                break
-            else:
-                if page.serial != serial:
-                    # Wrong stream, skip this page.
-                    continue
-                # Changing the number can't change the page size,
-                # so seeking back based on the current size is safe.
-                fileobj.seek(-page.size, 1)
-            page.sequence = number
-            fileobj.write(page.write())
-            fileobj.seek(page.offset + page.size, 0)
+        end = fileobj.tell()
+        for page, data, swapped in OggPage._iter_raw_pages(
+                fileobj, 2 ** 16, swapped=True):
+            end = page.offset + page.size
+            if page.serial != serial:
+                # Wrong stream, skip this page.
+                continue
+            if page.sequence != number:
+                # Only the sequence number and the CRC change, so just
+                # update those in place. The CRC gets computed from the
+                # data as found in the file, even if the old one was wrong.
+                new = struct.pack("<I", number)
+                crc = _crc32_swapped([
+                    swapped[:18], (new + b"\x00" * 4).translate(cdata.bitswap),
+                    swapped[26:]])
+                fileobj.seek(page.offset + 18, 0)
+                fileobj.write(new + struct.pack("<I", crc))
             number += 1
+        fileobj.seek(end, 0)
 
     @staticmethod
     def to_packets(pages, strict=False):
@@ -286,12 +462,17 @@ class OggPage(object):
         return [b"".join(p) for p in packets]
 
     @classmethod
-    def _from_packets_try_preserve(cls, packets, old_pages):
+    def _from_packets_try_preserve(cls, packets, old_pages, keep_count=False):
         """Like from_packets but in case the size and number of the packets
         is the same as in the given pages the layout of the pages will
         be copied (the page size and number will match).
 
-        If the packets don't match this behaves like::
+        If the packets don't match and keep_count is True, the packets
+        will be distributed over the same number of pages if possible
+        (see _from_packets_keep_count), so that replacing the old pages
+        doesn't require renumbering the rest of the stream.
+
+        Otherwise this behaves like::
 
             OggPage.from_packets(packets, sequence=old_pages[0].sequence)
         """
@@ -300,6 +481,10 @@ class OggPage(object):
 
         if [len(p) for p in packets] != [len(p) for p in old_packets]:
             # doesn't match, fall back
+            if keep_count:
+                new_pages = cls._from_packets_keep_count(packets, old_pages)
+                if new_pages is not None:
+                    return new_pages
             return cls.from_packets(packets, old_pages[0].sequence)
 
         new_data = b"".join(packets)
@@ -318,6 +503,72 @@ class OggPage(object):
 
         return new_pages
 
+    @classmethod
+    def _from_packets_keep_count(cls, packets, old_pages):
+        """Distribute the packets evenly over as many pages as there are in
+        old_pages. The last packet is left unfinished if the last old page
+        didn't finish it either.
+
+        This is meant for header packets: all pages on which a packet
+        finishes get a granule position of 0, except the last one, which
+        keeps the position of the last old page.
+
+        Returns None if the packets don't fit into that many pages.
+        """
+
+        count = len(old_pages)
+        if not packets or old_pages[0].continued:
+            return None
+        complete = old_pages[-1].complete
+
+        # split all packets into lacing segments: (packet index, size)
+        segments = []
+        last_index = len(packets) - 1
+        for index, packet in enumerate(packets):
+            quot, rem = divmod(len(packet), 255)
+            segments.extend([(index, 255)] * quot)
+            if complete or index != last_index:
+                segments.append((index, rem))
+            elif rem or not quot:
+                # an unfinished packet has to fill its last segment
+                return None
+
+        total = len(segments)
+        if not count <= total <= 255 * count:
+            return None
+
+        offsets = [0] * len(packets)
+        new_pages = []
+        for i, old in enumerate(old_pages):
+            page_segments = segments[total * i // count:
+                                     total * (i + 1) // count]
+
+            new = cls()
+            new.sequence = old.sequence
+            new.continued = offsets[page_segments[0][0]] != 0
+
+            fragments = []
+            for index, size in page_segments:
+                if fragments and fragments[-1][0] == index:
+                    fragments[-1][1] += size
+                else:
+                    fragments.append([index, size])
+            for index, size in fragments:
+                start = offsets[index]
+                new.packets.append(packets[index][start:start + size])
+                offsets[index] = start + size
+
+            new.complete = page_segments[-1][1] < 255
+            if not any(size < 255 for index, size in page_segments):
+                new.position = -1
+            elif i == count - 1 and old.position != -1:
+                new.position = old.position
+            else:
+                new.position = 0
+            new_pages.append(new)
+
+        return new_pages
+
     @staticmethod
     def from_packets(packets, sequence=0, default_size=4096,
                      wiggle_room=2048):
@@ -422,18 +673,31 @@ class OggPage(object):
         elif pages_diff < 0:
             new_data[pages_diff - 1:] = [b"".join(new_data[pages_diff - 1:])]
 
-        # Replace pages one by one. If the sizes match no resize happens.
-        offset_adjust = 0
-        new_data_end = None
         assert len(old_pages) == len(new_data)
-        for old_page, data in zip(old_pages, new_data):
-            offset = old_page.offset + offset_adjust
-            data_size = len(data)
-            resize_bytes(fileobj, old_page.size, data_size, offset)
+        if all(a.offset + a.size == b.offset
+               for a, b in zip(old_pages, old_pages[1:])):
+            # No pages of other streams in between, so replace them all at
+            # once. This resizes the file at most once and not at all if
+            # the total size matches.
+            offset = old_pages[0].offset
+            old_size = sum(p.size for p in old_pages)
+            data = b"".join(new_data)
+            resize_bytes(fileobj, old_size, len(data), offset)
             fileobj.seek(offset, 0)
             fileobj.write(data)
-            new_data_end = offset + data_size
-            offset_adjust += (data_size - old_page.size)
+            new_data_end = offset + len(data)
+        else:
+            # Replace pages one by one. If the sizes match no resize
+            # happens.
+            offset_adjust = 0
+            for old_page, data in zip(old_pages, new_data):
+                offset = old_page.offset + offset_adjust
+                data_size = len(data)
+                resize_bytes(fileobj, old_page.size, data_size, offset)
+                fileobj.seek(offset, 0)
+                fileobj.write(data)
+                new_data_end = offset + data_size
+                offset_adjust += (data_size - old_page.size)
 
         # Finally, if there's any discrepancy in length, we need to
         # renumber the pages for the logical stream.
@@ -448,7 +712,9 @@ class OggPage(object):
         """Find the last page of the stream 'serial'.
 
         If the file is not multiplexed this function is fast. If it is,
-        it must read the whole the stream.
+        the file gets searched backwards starting from the end, and only
+        in case pages with CRC errors are encountered the whole stream
+        is read.
 
         This finds the last page in the actual file object, or the last
         page in the stream (with eos set), whichever comes first.
@@ -489,22 +755,287 @@ class OggPage(object):
             else:
                 best_page = None
 
-        # The stream is muxed, so use the slow way.
+        # The stream is muxed (or the last page isn't marked as such), so
+        # search backwards from the end for the last page of the stream.
+        page, reliable = OggPage._find_last_backwards(
+            fileobj, serial, finishing)
+        if page is not None or reliable:
+            return page
+
+        # We found pages with CRC errors, the best we can do is to use the
+        # slow way and read the whole stream.
         fileobj.seek(0)
         try:
-            page = OggPage(fileobj)
-            while True:
+            for page in OggPage.iter_pages(fileobj):
                 if page.serial == serial:
                     if is_valid(page):
                         best_page = page
                     if page.last:
                         break
-                page = OggPage(fileobj)
             return best_page
         except error:
             return best_page
-        except EOFError:
-            return best_page
+
+    @staticmethod
+    def _find_last_backwards(fileobj, serial, finishing):
+        """Search the file backwards in growing chunks for the last page
+        of the stream 'serial' with a valid CRC.
+
+        Returns a (page, reliable) tuple. page is None if nothing was found.
+        reliable is False if a page of the stream with a CRC mismatch
+        was encountered, in which case the search was aborted.
+
+        Raises IOError.
+        """
+
+        fileobj.seek(0, 2)
+        search_end = fileobj.tell()
+        chunk_size = 2 ** 16
+
+        while search_end > 0:
+            start = max(0, search_end - chunk_size)
+            fileobj.seek(start, 0)
+            # pages starting right before search_end can extend past it
+            data = fileobj.read(search_end - start + _MAX_PAGE_SIZE)
+            bytesobj = BytesIO(data)
+
+            limit = search_end - start + 3
+            while True:
+                index = data.rfind(b"OggS", 0, limit)
+                if index == -1:
+                    break
+                limit = index + 3
+
+                bytesobj.seek(index, 0)
+                try:
+                    page = OggPage(bytesobj)
+                except (error, EOFError):
+                    continue
+
+                if page.serial != serial:
+                    continue
+                if page.write() != data[index:index + page.size]:
+                    return None, False
+                if finishing and page.position == -1:
+                    continue
+                page.offset = start + index
+                return page, True
+
+            search_end = start
+            chunk_size = min(chunk_size * 2, 2 ** 24)
+
+        return None, True
+
+
+class OggChainLink(object):
+    """OggChainLink()
+
+    A logical bitstream of a chained and/or multiplexed Ogg file, as
+    returned by :func:`build_chain_index`.
+
+    Attributes:
+        serial (`int`): logical stream serial number
+        offset (`int`): offset of the first page of the stream
+        end (`int`): offset right after the last page of the stream
+        first_position (`int`): granule position of the first page on
+            which a packet finishes, or -1
+        last_position (`int`): granule position of the last page on which
+            a packet finishes, or -1
+        header (`bytes`): the first packet of the stream, usually the
+            codec identification header
+    """
+
+    serial = 0
+    offset = 0
+    end = 0
+    first_position = -1
+    last_position = -1
+    header = b""
+
+    def __repr__(self):
+        return "<%s serial=%d offset=%d end=%d positions=%d..%d>" % (
+            type(self).__name__, self.serial, self.offset, self.end,
+            self.first_position, self.last_position)
+
+
+def build_chain_index(fileobj):
+    """Returns a list of `OggChainLink` for all logical streams in the
+    file, in the order in which they start.
+
+    This reads the page headers of the whole file once and seeks past the
+    packet data, which is only read for the first page of each stream.
+    Reading stops at the first invalid page.
+
+    Raises IOError
+    """
+
+    size = get_size(fileobj)
+    fileobj.seek(0, 0)
+    links = []
+    current = {}
+    offset = 0
+    while True:
+        # only read the page header and the lacing values, and skip the
+        # packet data
+        header = fileobj.read(27)
+        if len(header) < 27:
+            break
+        page = OggPage()
+        try:
+            segments = page._parse_header(header, offset)
+        except error:
+            break
+        lacing_bytes = fileobj.read(segments)
+        if len(lacing_bytes) != segments:
+            break
+        lacings = page._parse_lacings(lacing_bytes)
+        end = offset + 27 + segments + sum(lacings)
+        if end > size:
+            break
+
+        link = current.get(page.serial)
+        if link is None or page.first:
+            link = OggChainLink()
+            link.serial = page.serial
+            link.offset = offset
+            if lacings:
+                link.header = fileobj.read(lacings[0])
+            current[page.serial] = link
+            links.append(link)
+        link.end = end
+        if page.position != -1:
+            if link.first_position == -1:
+                link.first_position = page.position
+            link.last_position = page.position
+
+        offset = end
+        fileobj.seek(offset, 0)
+
+    return links
+
+
+class OggSeekIndex(object):
+    """OggSeekIndex()
+
+    Granule position to file offset mapping for one logical stream, as
+    returned by :func:`build_seek_index`.
+
+    Each entry is a ``(granule, offset)`` tuple, where ``offset`` is the
+    offset of a page of the stream and ``granule`` its granule position.
+    Entries are sorted by offset.
+
+    Attributes:
+        serial (`int`): logical stream serial number
+        granules (`array.array`): granule positions of all entries
+        offsets (`array.array`): page offsets of all entries
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.granules = array("q")
+        self.offsets = array("q")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return (self.granules[index], self.offsets[index])
+
+    def __repr__(self):
+        return "<%s serial=%d, %d entries>" % (
+            type(self).__name__, self.serial, len(self))
+
+    def find(self, granule):
+        """Returns the offset of the last indexed page with a granule
+        position less than or equal to 'granule', or None if there is
+        none. Decoding from there on will reach 'granule'.
+        """
+
+        index = bisect_right(self.granules, granule)
+        if index == 0:
+            return None
+        return self.offsets[index - 1]
+
+
+def build_seek_index(fileobj, serial, interval=0):
+    """Build a seek index for the logical stream 'serial'.
+
+    The page headers of the file are read once, sequentially, using a
+    constant amount of memory apart from the index itself. Only pages on
+    which a packet of the stream finishes are indexed, and of those only
+    the ones whose granule position is at least 'interval' larger than
+    the one of the previous entry (so 0 indexes all of them).
+
+    Indexing stops at the last page of the stream or at the first
+    invalid page.
+
+    Returns an `OggSeekIndex`.
+    Raises IOError
+    """
+
+    index = OggSeekIndex(serial)
+    granules = index.granules
+    offsets = index.offsets
+    last = None
+
+    fileobj.seek(0, 0)
+    try:
+        for page in OggPage.iter_pages(fileobj):
+            if page.serial != serial:
+                continue
+            position = page.position
+            if position != -1 and \
+                    (last is None or position - last >= interval):
+                granules.append(position)
+                offsets.append(page.offset)
+                last = position
+            if page.last:
+                break
+    except error:
+        pass
+
+    return index
+
+
+def _read_last_page(fileobj):
+    """Returns the last page of the file or None if it can't be found.
+
+    Raises IOError
+    """
+
+    seek_end(fileobj, 256 * 256)
+    data = fileobj.read()
+    index = data.rfind(b"OggS")
+    if index == -1:
+        return None
+    try:
+        return OggPage(BytesIO(data[index:]))
+    except (error, EOFError):
+        return None
+
+
+def _is_chained(fileobj, serial, last):
+    """Returns True if the last page of the file, as returned by
+    _read_last_page(), belongs to a logical stream that didn't start at
+    the beginning of the file.
+
+    Raises IOError
+    """
+
+    if last is None or last.serial == serial:
+        return False
+
+    fileobj.seek(0, 0)
+    serials = set()
+    try:
+        for page in OggPage.iter_pages(fileobj, buffer_size=4096):
+            if not page.first:
+                break
+            serials.add(page.serial)
+    except error:
+        return False
+
+    return last.serial not in serials
 
 
 class OggFileType(FileType):
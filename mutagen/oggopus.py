@@ -17,12 +17,14 @@ __all__ = ["OggOpus", "Open", "delete"]
 
 import struct
 from io import BytesIO
+from typing import List
 
 from mutagen import StreamInfo
 from mutagen._util import get_size, loadfile, convert_error
 from mutagen._tags import PaddingInfo
 from mutagen._vorbis import VCommentDict
-from mutagen.ogg import OggPage, OggFileType, error as OggError
+from mutagen.ogg import OggPage, OggFileType, error as OggError, \
+    build_chain_index, _is_chained, _read_last_page
 
 
 class error(OggError):
@@ -42,13 +44,18 @@ class OggOpusInfo(StreamInfo):
         length (`float`): File length in seconds, as a float
         channels (`int`): Number of channels
         bitrate (`int`): Bitrate in bits per second, as an int
+        chain (list[OggOpusInfo]): In case of a chained file, the stream
+            information of each Opus link, in file order. The length is
+            the sum of their lengths. Empty otherwise.
     """
 
     length = 0
     channels = 0
     bitrate = 0
+    chain: List["OggOpusInfo"]
 
     def __init__(self, fileobj):
+        self.chain = []
         page = OggPage(fileobj)
         while not page.packets[0].startswith(b"OpusHead"):
             page = OggPage(fileobj)
@@ -59,8 +66,16 @@ class OggOpusInfo(StreamInfo):
             raise OggOpusHeaderError(
                 "page has ID header, but doesn't start a stream")
 
-        (version, self.channels, pre_skip, orig_sample_rate, output_gain,
-         channel_map) = struct.unpack("<BBHIhB", page.packets[0][8:19])
+        self._parse_header(page.packets[0])
+
+    def _parse_header(self, packet):
+        """Raises OggOpusHeaderError"""
+
+        try:
+            (version, self.channels, pre_skip, orig_sample_rate, output_gain,
+             channel_map) = struct.unpack("<BBHIhB", packet[8:19])
+        except struct.error:
+            raise OggOpusHeaderError("header too short")
 
         self.__pre_skip = pre_skip
 
@@ -69,13 +84,46 @@ class OggOpusInfo(StreamInfo):
         if major != 0:
             raise OggOpusHeaderError("version %r unsupported" % major)
 
+    @classmethod
+    def _from_link(cls, link):
+        """Returns the stream information of a link in a chained file or
+        None if it isn't a valid Opus stream.
+        """
+
+        if not link.header.startswith(b"OpusHead") or \
+                link.last_position == -1:
+            return None
+        info = cls.__new__(cls)
+        info.chain = []
+        try:
+            info._parse_header(link.header)
+        except OggOpusHeaderError:
+            return None
+        info.serial = link.serial
+        info.length = (link.last_position - info.__pre_skip) / float(48000)
+        return info
+
     def _post_tags(self, fileobj):
         audio_size = get_size(fileobj) - fileobj.tell()
 
-        page = OggPage.find_last(fileobj, self.serial, finishing=True)
-        if page is None:
-            raise OggOpusHeaderError
-        self.length = (page.position - self.__pre_skip) / float(48000)
+        last = _read_last_page(fileobj)
+        if _is_chained(fileobj, self.serial, last):
+            chain = [self._from_link(l) for l in build_chain_index(fileobj)]
+            self.chain = [info for info in chain if info is not None]
+
+        if self.chain:
+            self.length = sum(info.length for info in self.chain)
+        else:
+            if last is not None and last.serial == self.serial and \
+                    last.last and last.position != -1:
+                # not muxed, no need to search
+                page = last
+            else:
+                page = OggPage.find_last(
+                    fileobj, self.serial, finishing=True)
+            if page is None:
+                raise OggOpusHeaderError
+            self.length = (page.position - self.__pre_skip) / float(48000)
 
         if self.length:
             self.bitrate = round(audio_size * 8 / self.length)
@@ -137,10 +185,13 @@ class OggOpusVComment(VCommentDict):
             content_size = get_size(fileobj) - len(packets[0])  # approx
             padding_left = len(packets[0]) - len(vcomment_data)
             info = PaddingInfo(padding_left, content_size)
+            # the default keeps the old size of the header pages if the
+            # padding fits, so the rest of the file doesn't have to be moved
             new_padding = info._get_padding(padding_func)
             packets[0] = vcomment_data + b"\x00" * new_padding
 
-        new_pages = OggPage._from_packets_try_preserve(packets, old_pages)
+        new_pages = OggPage._from_packets_try_preserve(
+            packets, old_pages, keep_count=True)
         OggPage.replace(fileobj, old_pages, new_pages)
 
 
@@ -17,12 +17,14 @@ on the specification at http://www.xiph.org/vorbis/doc/Vorbis_I_spec.html.
 __all__ = ["OggVorbis", "Open", "delete"]
 
 import struct
+from typing import List
 
 from mutagen import StreamInfo
 from mutagen._vorbis import VCommentDict
 from mutagen._util import get_size, loadfile, convert_error
 from mutagen._tags import PaddingInfo
-from mutagen.ogg import OggPage, OggFileType, error as OggError
+from mutagen.ogg import OggPage, OggFileType, error as OggError, \
+    build_chain_index, _is_chained, _read_last_page
 
 
 class error(OggError):
@@ -43,6 +45,9 @@ class OggVorbisInfo(StreamInfo):
         channels (`int`): Number of channels
         bitrate (`int`): Nominal ('average') bitrate in bits per second
         sample_rate (`int`): Sample rate in Hz
+        chain (list[OggVorbisInfo]): In case of a chained file, the stream
+            information of each Vorbis link, in file order. The length is
+            the sum of their lengths. Empty otherwise.
 
     """
 
@@ -50,10 +55,12 @@ class OggVorbisInfo(StreamInfo):
     channels = 0
     bitrate = 0
     sample_rate = 0
+    chain: List["OggVorbisInfo"]
 
     def __init__(self, fileobj):
         """Raises ogg.error, IOError"""
 
+        self.chain = []
         page = OggPage(fileobj)
         if not page.packets:
             raise OggVorbisHeaderError("page has not packets")
@@ -62,14 +69,19 @@ class OggVorbisInfo(StreamInfo):
         if not page.first:
             raise OggVorbisHeaderError(
                 "page has ID header, but doesn't start a stream")
-        if len(page.packets[0]) < 28:
+        self._parse_header(page.packets[0])
+        self.serial = page.serial
+
+    def _parse_header(self, packet):
+        """Raises OggVorbisHeaderError"""
+
+        if len(packet) < 28:
             raise OggVorbisHeaderError(
                 "page contains a packet too short to be valid")
         (self.channels, self.sample_rate, max_bitrate, nominal_bitrate,
-         min_bitrate) = struct.unpack("<BI3i", page.packets[0][11:28])
+         min_bitrate) = struct.unpack("<BI3i", packet[11:28])
         if self.sample_rate == 0:
             raise OggVorbisHeaderError("sample rate can't be zero")
-        self.serial = page.serial
 
         max_bitrate = max(0, max_bitrate)
         min_bitrate = max(0, min_bitrate)
@@ -86,10 +98,42 @@ class OggVorbisInfo(StreamInfo):
         else:
             self.bitrate = nominal_bitrate
 
+    @classmethod
+    def _from_link(cls, link):
+        """Returns the stream information of a link in a chained file or
+        None if it isn't a valid Vorbis stream.
+        """
+
+        if not link.header.startswith(b"\x01vorbis") or \
+                link.last_position == -1:
+            return None
+        info = cls.__new__(cls)
+        info.chain = []
+        try:
+            info._parse_header(link.header)
+        except OggVorbisHeaderError:
+            return None
+        info.serial = link.serial
+        info.length = link.last_position / float(info.sample_rate)
+        return info
+
     def _post_tags(self, fileobj):
         """Raises ogg.error"""
 
-        page = OggPage.find_last(fileobj, self.serial, finishing=True)
+        last = _read_last_page(fileobj)
+        if _is_chained(fileobj, self.serial, last):
+            chain = [self._from_link(l) for l in build_chain_index(fileobj)]
+            self.chain = [info for info in chain if info is not None]
+            if self.chain:
+                self.length = sum(info.length for info in self.chain)
+                return
+
+        if last is not None and last.serial == self.serial and \
+                last.last and last.position != -1:
+            # not muxed, no need to search
+            page = last
+        else:
+            page = OggPage.find_last(fileobj, self.serial, finishing=True)
         if page is None:
             raise OggVorbisHeaderError
         self.length = page.position / float(self.sample_rate)
@@ -137,12 +181,15 @@ class OggVCommentDict(VCommentDict):
         padding_left = len(packets[0]) - len(vcomment_data)
 
         info = PaddingInfo(padding_left, content_size)
+        # the default keeps the old size of the header pages if the
+        # padding fits, so the rest of the file doesn't have to be moved
         new_padding = info._get_padding(padding_func)
 
         # Set the new comment packet.
         packets[0] = vcomment_data + b"\x00" * new_padding
 
-        new_pages = OggPage._from_packets_try_preserve(packets, old_pages)
+        new_pages = OggPage._from_packets_try_preserve(
+            packets, old_pages, keep_count=True)
         OggPage.replace(fileobj, old_pages, new_pages)
 
 
@@ -4,7 +4,7 @@ import os
 import sys
 import shutil
 import contextlib
-from io import StringIO
+from io import StringIO, BytesIO
 from tempfile import mkstemp
 from unittest import TestCase as BaseTestCase
 
@@ -43,6 +43,21 @@ def get_temp_empty(ext=""):
     return filename
 
 
+class WriteCounter(BytesIO):
+    """A file object in memory which counts the bytes written to it, to
+    check how much of a file gets rewritten on save.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as h:
+            super(WriteCounter, self).__init__(h.read())
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return super(WriteCounter, self).write(data)
+
+
 @contextlib.contextmanager
 def capture_output():
     """
@@ -3,7 +3,7 @@ from mutagen._util import DictMixin, cdata, insert_bytes, delete_bytes, \
     decode_terminated, dict_match, enum, get_size, BitReader, BitReaderError, \
     resize_bytes, seek_end, verify_fileobj, fileobj_name, \
     read_full, flags, resize_file, move_bytes, encode_endian, loadfile, \
-    intround, verify_filename
+    intround, verify_filename, copy_bytes
 from tests import TestCase, get_temp_empty
 import os
 import random
@@ -762,6 +762,48 @@ class Tread_full(TestCase):
         self.assertRaises(IOError, read_full, fileobj, 3)
 
 
+class Tcopy_bytes(TestCase):
+
+    def file(self, contents):
+        temp = tempfile.TemporaryFile()
+        temp.write(contents)
+        temp.flush()
+        temp.seek(0)
+        return temp
+
+    def test_fileobj(self):
+        src = BytesIO(b"abc123")
+        dest = BytesIO()
+        dest.write(b"x")
+        copy_bytes(src, dest, 1, 4)
+        self.assertEqual(dest.getvalue(), b"xbc12")
+        self.assertEqual(dest.tell(), 5)
+
+    def test_files(self):
+        data = os.urandom(3 * 2 ** 16 + 1)
+        with self.file(data) as src, self.file(b"foo") as dest:
+            dest.seek(0, 2)
+            copy_bytes(src, dest, 10, len(data) - 20)
+            self.assertEqual(dest.tell(), len(data) - 17)
+            dest.write(b"bar")
+            dest.seek(0)
+            self.assertEqual(dest.read(), b"foo" + data[10:-10] + b"bar")
+
+    def test_mixed(self):
+        with self.file(b"abc123") as src:
+            dest = BytesIO()
+            copy_bytes(src, dest, 2, 3, BUFFER_SIZE=1)
+            self.assertEqual(dest.getvalue(), b"c12")
+
+    def test_invalid(self):
+        src = BytesIO(b"abc")
+        self.assertRaises(ValueError, copy_bytes, src, BytesIO(), -1, 1)
+        self.assertRaises(ValueError, copy_bytes, src, BytesIO(), 0, -1)
+        self.assertRaises(IOError, copy_bytes, src, BytesIO(), 1, 3)
+        with self.file(b"abc") as src, self.file(b"") as dest:
+            self.assertRaises(IOError, copy_bytes, src, dest, 1, 3)
+
+
 class Tget_size(TestCase):
 
     def test_get_size(self):
@@ -1,6 +1,7 @@
 
 import os
 import subprocess
+from io import BytesIO
 
 import pytest
 
@@ -8,12 +9,25 @@ from mutagen import MutagenError
 from mutagen.id3 import ID3, TIT2, ID3NoHeaderError
 from mutagen.flac import to_int_be, Padding, VCFLACDict, MetadataBlock, error
 from mutagen.flac import StreamInfo, SeekTable, CueSheet, FLAC, delete, Picture
+from mutagen.flac import _FrameHeader, _crc8, _FileData
 from mutagen._vorbis import VComment
 
-from tests import TestCase, DATA_DIR, get_temp_copy
+from tests import TestCase, DATA_DIR, get_temp_copy, get_temp_empty, \
+    WriteCounter
 from tests.test__vorbis import TVCommentDict
 
 
+def audio_offset(filename):
+    with open(filename, "rb") as h:
+        h.seek(4)
+        last = False
+        while not last:
+            header = h.read(4)
+            last = bool(ord(header[:1]) & 0x80)
+            h.seek(to_int_be(header[1:]), 1)
+        return h.tell()
+
+
 def call_flac(*args):
     with open(os.devnull, 'wb') as null:
         return subprocess.call(
@@ -301,6 +315,31 @@ class TFLAC(TestCase):
         assert new.info.bitrate == 0
         assert new.info.length == 0.0
 
+    def test_zero_samples_scan_frames(self):
+        self.flac.info.total_samples = 0
+        self.flac.save()
+        new = FLAC(self.flac.filename, scan_frames=True)
+        assert new.info.total_samples == 0
+        assert new.info.length == 162496 / 44100.0
+        assert new.info.bitrate == 101430
+
+    def test_scan_frames_truncated(self):
+        self.flac.info.total_samples = 0
+        self.flac.save()
+        with open(self.NEW, "r+b") as h:
+            h.truncate(audio_offset(self.NEW) + 20000)
+        new = FLAC(self.flac.filename, scan_frames=True)
+        assert new.info.length == 73728 / 44100.0
+
+    def test_scan_frames_no_frames(self):
+        self.flac.info.total_samples = 0
+        self.flac.save()
+        with open(self.NEW, "r+b") as h:
+            h.truncate(audio_offset(self.NEW))
+        new = FLAC(self.flac.filename, scan_frames=True)
+        assert new.info.length == 0
+        assert new.info.bitrate == 0
+
     def test_bitrate(self):
         assert self.flac.info.bitrate == 101430
         old_file_size = os.path.getsize(self.flac.filename)
@@ -519,6 +558,131 @@ class TFLAC(TestCase):
         f = FLAC(self.NEW)
         self.failUnlessEqual(len(f.pictures), c + 1)
 
+    def test_block_index(self):
+        info = self.flac.info
+        index = self.flac.metadata_blocks._index
+        self.assertTrue(index is not None)
+        for i in range(10):
+            self.assertTrue(self.flac.info is info)
+        self.assertTrue(self.flac.metadata_blocks._index is index)
+
+        picture = Picture()
+        self.flac.add_picture(picture)
+        self.assertTrue(self.flac.pictures[-1] is picture)
+        self.flac.metadata_blocks.remove(picture)
+        self.assertFalse(picture in self.flac.pictures)
+        self.flac.metadata_blocks += [picture]
+        self.assertTrue(picture in self.flac.pictures)
+        del self.flac.metadata_blocks[-1:]
+        self.assertFalse(picture in self.flac.pictures)
+
+        new_info = StreamInfo(info.write())
+        new_info.code = StreamInfo.code
+        self.flac.metadata_blocks[0] = new_info
+        self.assertTrue(self.flac.info is new_info)
+        self.flac.metadata_blocks = [info]
+        self.assertTrue(self.flac.info is info)
+        self.assertEqual(self.flac.pictures, [])
+        self.flac.metadata_blocks.pop(0)
+        self.assertRaises(IndexError, getattr, self.flac, "info")
+
+    def test_iter_pictures(self):
+        picture = self.flac.pictures[0]
+        info, = self.flac.iter_pictures()
+        self.assertEqual(info.mime, picture.mime)
+        self.assertEqual(info.type, picture.type)
+        self.assertEqual((info.width, info.height),
+                         (picture.width, picture.height))
+        self.assertEqual(info.size, len(picture.data))
+        with open(self.NEW, "rb") as h:
+            h.seek(info.offset)
+            self.assertEqual(h.read(info.size), picture.data)
+
+        with open(get_temp_empty(), "w+b") as h:
+            h.write(b"x")
+            self.flac.extract_picture(0, h)
+            h.seek(0)
+            self.assertEqual(h.read(), b"x" + picture.data)
+            os.unlink(h.name)
+
+        picture.data = b"foo"
+        info, = self.flac.iter_pictures()
+        self.assertTrue(info.offset is None)
+        dest = BytesIO()
+        self.flac.extract_picture(0, dest)
+        self.assertEqual(dest.getvalue(), b"foo")
+
+        self.flac.save()
+        info, = self.flac.iter_pictures()
+        self.assertTrue(info.offset is None)
+        info, = FLAC(self.NEW).iter_pictures()
+        self.assertEqual(info.size, 3)
+
+    def test_extract_picture_changed_externally(self):
+        picture = self.flac.pictures[0]
+        other = FLAC(self.NEW)
+        other["title"] = "x" * 10000
+        other.save()
+        info, = self.flac.iter_pictures()
+        self.assertTrue(info.offset is not None)
+        dest = BytesIO()
+        self.flac.extract_picture(0, dest)
+        self.assertEqual(dest.getvalue(), picture.data)
+
+        with open(self.NEW, "r+b") as h:
+            h.truncate(info.offset + 1)
+        dest = BytesIO()
+        self.flac.extract_picture(0, dest)
+        self.assertEqual(dest.getvalue(), picture.data)
+
+    def test_picture_data_file(self):
+        data = os.urandom(300000)
+        filename = get_temp_empty()
+        try:
+            with open(filename, "wb") as h:
+                h.write(data)
+            picture = Picture()
+            picture.set_data_file(filename)
+            self.assertEqual(repr(picture), "<Picture '' (300000 bytes)>")
+            self.flac.add_picture(picture)
+
+            def fail(*args):
+                raise AssertionError
+            old_read = _FileData.read
+            _FileData.read = fail
+            dest = BytesIO()
+            try:
+                info = list(self.flac.iter_pictures())[-1]
+                self.assertEqual(info.size, len(data))
+                self.assertTrue(info.offset is None)
+                self.flac.extract_picture(-1, dest)
+                self.flac.save()
+            finally:
+                _FileData.read = old_read
+        finally:
+            os.unlink(filename)
+        self.assertEqual(dest.getvalue(), data)
+
+        new = FLAC(self.NEW)
+        self.assertEqual(new.pictures[-1].data, data)
+        self.assertEqual(new.pictures[:-1], self.flac.pictures[:-1])
+
+    def test_picture_data_fileobj(self):
+        fileobj = BytesIO(b"foobar")
+        fileobj.seek(3)
+        picture = Picture()
+        picture.set_data_file(fileobj)
+        self.assertEqual(picture.data, b"bar")
+        self.assertEqual(Picture(picture.write()).data, b"bar")
+        self.flac.add_picture(picture)
+        self.flac.save()
+        self.assertEqual(FLAC(self.NEW).pictures[-1].data, b"bar")
+
+        picture.data = b"quux"
+        self.assertEqual(picture.data, b"quux")
+        self.flac.save()
+        self.assertEqual(FLAC(self.NEW).pictures[-1].data, b"quux")
+
     def test_clear_pictures(self):
         f = FLAC(self.NEW)
         c1 = len(f.pictures)
@@ -564,6 +728,242 @@ class TFLAC(TestCase):
     def test_load_flac_with_application_block(self):
         FLAC(os.path.join(DATA_DIR, "flac_application.flac"))
 
+    def test_load_few_reads(self):
+        class CountingIO(BytesIO):
+            reads = 0
+
+            def read(self, *args):
+                self.reads += 1
+                return BytesIO.read(self, *args)
+
+        with open(self.NEW, "rb") as h:
+            fileobj = CountingIO(h.read())
+        flac = FLAC(fileobj)
+        self.assertEqual(len(flac.metadata_blocks), 6)
+        self.assertTrue(fileobj.reads <= 2)
+
+    def test_save_changed_externally(self):
+        with open(self.NEW, "rb") as h:
+            data = h.read()
+        offset = audio_offset(self.NEW)
+        self.assertEqual(data[offset:offset + 2], b"\xff\xf8")
+        other = FLAC(self.NEW)
+        other["title"] = "x" * 10000
+        other.save()
+        self.flac["title"] = "foo"
+        self.flac.save()
+        self.assertEqual(FLAC(self.NEW)["title"], ["foo"])
+        with open(self.NEW, "rb") as h:
+            self.assertTrue(h.read().endswith(data[offset:]))
+
+    def test_save_cached_audio_offset(self):
+        pic = Picture()
+        pic.data = b"\x00" * 200000
+        self.flac.add_picture(pic)
+        self.flac.save()
+
+        class ReadCounter(WriteCounter):
+            read_count = 0
+
+            def read(self, *args):
+                data = super(ReadCounter, self).read(*args)
+                self.read_count += len(data)
+                return data
+
+        fileobj = ReadCounter(self.NEW)
+        flac = FLAC(fileobj)
+        for i in range(2):
+            # using the offset from load and then from the last save,
+            # the picture doesn't get read
+            fileobj.read_count = 0
+            flac["title"] = "x" * i
+            fileobj.seek(0)
+            flac.save(fileobj)
+            self.assertTrue(fileobj.read_count < 1000)
+            fileobj.seek(0)
+            self.assertEqual(FLAC(fileobj)["title"], ["x" * i])
+
+    def test_build_seektable(self):
+        old = self.flac.seektable.seekpoints
+        table = self.flac.build_seektable(interval_seconds=1)
+        self.assertTrue(table is self.flac.seektable)
+        self.assertEqual(table.seekpoints, [
+            (0, 0, 4608), (41472, 11852, 4608), (87552, 25022, 4608),
+            (129024, 36867, 4608)])
+        for point in table.seekpoints[:-1]:
+            self.assertTrue(point in old)
+
+    def _all_frames(self):
+        return self.flac.build_seektable(
+            interval_seconds=1.0 / self.flac.info.sample_rate).seekpoints
+
+    def _break_frame(self, offset):
+        with open(self.NEW, "r+b") as h:
+            h.seek(audio_offset(self.NEW) + offset)
+            h.write(b"\x00\x00")
+
+    def test_build_seektable_resync(self):
+        frames = self._all_frames()
+        self.assertEqual(len(frames), 36)
+        self._break_frame(frames[10][1])
+        self.assertEqual(self._all_frames(), frames[:10] + frames[11:])
+
+    def test_build_seektable_first_frame_broken(self):
+        frames = self._all_frames()
+        self._break_frame(0)
+        self.assertEqual(self._all_frames(), frames[1:])
+
+    def test_build_seektable_read_only(self):
+        with open(self.NEW, "rb") as h:
+            fileobj = BytesIO(h.read())
+        table = self.flac.build_seektable(fileobj, interval_seconds=1)
+        self.assertEqual(len(table.seekpoints), 4)
+        self.assertEqual(self.flac.filename, self.NEW)
+
+    def test_build_seektable_save(self):
+        self.flac.seektable = None
+        self.flac.metadata_blocks = [
+            b for b in self.flac.metadata_blocks if b.code != SeekTable.code]
+        self.flac.save()
+        size = os.path.getsize(self.NEW)
+
+        table = self.flac.build_seektable()
+        self.assertEqual(table.seekpoints, [(0, 0, 4608)])
+        self.flac.save()
+        self.assertEqual(os.path.getsize(self.NEW), size)
+        self.assertEqual(FLAC(self.NEW).seektable, table)
+
+    def test_build_seektable_invalid(self):
+        self.assertRaises(
+            ValueError, self.flac.build_seektable, interval_seconds=0)
+        with open(self.NEW, "r+b") as h:
+            h.truncate(self.flac.metadata_blocks[-1].length + 1000)
+        self.assertRaises(error, self.flac.build_seektable)
+
+    def _move_tags_before_padding(self):
+        blocks = self.flac.metadata_blocks
+        blocks.remove(self.flac.tags)
+        blocks.insert(len(blocks) - 1, self.flac.tags)
+        self.flac.save()
+        self.flac = FLAC(self.NEW)
+        with open(self.NEW, "rb") as h:
+            return h.read()
+
+    def test_save_in_place(self):
+        data = self._move_tags_before_padding()
+        fileobj = WriteCounter(self.NEW)
+        flac = FLAC(fileobj)
+        offset = flac._block_layout[-2][1]
+        end = audio_offset(self.NEW)
+        flac["title"] = "foo" * 100
+        fileobj.seek(0)
+        flac.save(fileobj)
+        self.assertEqual(fileobj.written, end - offset)
+
+        new_data = fileobj.getvalue()
+        self.assertEqual(len(new_data), len(data))
+        self.assertEqual(new_data[:offset], data[:offset])
+        self.assertEqual(new_data[end:], data[end:])
+        new = FLAC(BytesIO(new_data))
+        self.assertEqual(new["title"], ["foo" * 100])
+        self.assertEqual(new.metadata_blocks, flac.metadata_blocks)
+        self.assertEqual(new.metadata_blocks[-1].length, 3060 - 300 + 7)
+
+        # again, with the updated layout
+        fileobj.written = 0
+        flac["title"] = "bar"
+        fileobj.seek(0)
+        flac.save(fileobj)
+        self.assertEqual(fileobj.written, end - offset)
+        fileobj.seek(0)
+        self.assertEqual(FLAC(fileobj).metadata_blocks[-1].length, 3064)
+
+    def test_save_in_place_streaminfo_changed(self):
+        self._move_tags_before_padding()
+        fileobj = WriteCounter(self.NEW)
+        flac = FLAC(fileobj)
+        flac.info.total_samples -= 1
+        flac["title"] = "foo"
+        fileobj.seek(0)
+        flac.save(fileobj)
+        self.assertEqual(fileobj.written, audio_offset(self.NEW))
+        fileobj.seek(0)
+        new = FLAC(fileobj)
+        self.assertEqual(new.info.total_samples, flac.info.total_samples)
+        self.assertEqual(new["title"], ["foo"])
+
+    def test_save_in_place_changed_externally(self):
+        self._move_tags_before_padding()
+        other = FLAC(self.NEW)
+        other.clear_pictures()
+        other["title"] = "x" * 100
+        other.save()
+        self.flac["title"] = "foo"
+        self.flac.save()
+        new = FLAC(self.NEW)
+        self.assertEqual(new["title"], ["foo"])
+        self.assertEqual(new.pictures, self.flac.pictures)
+
+    def test_save_in_place_picture_changed(self):
+        self._move_tags_before_padding()
+        picture = self.flac.pictures[0]
+        picture.data = picture.data[::-1]
+        self.flac["title"] = "foo"
+        self.flac.save()
+        new = FLAC(self.NEW)
+        self.assertEqual(new.pictures[0].data, picture.data)
+        self.assertEqual(new["title"], ["foo"])
+
+    def test_save_in_place_padding_func(self):
+        self._move_tags_before_padding()
+        self.flac["title"] = "foo"
+        self.flac.save(padding=lambda info: 42)
+        new = FLAC(self.NEW)
+        self.assertEqual(new.metadata_blocks[-1].length, 42)
+        self.assertEqual(new["title"], ["foo"])
+
+    def test_save_in_place_no_room(self):
+        self._move_tags_before_padding()
+        self.flac["title"] = "foo" * 2000
+        self.flac.save()
+        new = FLAC(self.NEW)
+        self.assertEqual(new["title"], ["foo" * 2000])
+        self.assertEqual(new.metadata_blocks, self.flac.metadata_blocks[:-1] +
+                         [new.metadata_blocks[-1]])
+
+
+class TFrameHeader(TestCase):
+
+    def test_crc8(self):
+        self.assertEqual(_crc8(b"123456789"), 0xF4)
+
+    def test_fixed(self):
+        data = bytearray(b"\xff\xf8\x59\x08\x00")
+        data.append(_crc8(data))
+        header = _FrameHeader(bytes(data) + b"\x00" * 20)
+        self.assertFalse(header.variable)
+        self.assertEqual(header.number, 0)
+        self.assertEqual(header.blocksize, 4608)
+        self.assertEqual(header.size, 6)
+
+    def test_variable(self):
+        # 16 bit block size, 16 bit sample rate, 3 byte coded number
+        data = bytearray(b"\xff\xf9\x7d\x08\xe1\x80\x81\x01\x00")
+        data += b"\xac\x44"
+        data.append(_crc8(data))
+        header = _FrameHeader(bytes(data))
+        self.assertTrue(header.variable)
+        self.assertEqual(header.number, 0x1001)
+        self.assertEqual(header.blocksize, 257)
+        self.assertEqual(header.size, 12)
+
+    def test_invalid(self):
+        data = bytearray(b"\xff\xf8\x59\x08\x00")
+        self.assertRaises(error, _FrameHeader, bytes(data) + b"\x00")
+        self.assertRaises(error, _FrameHeader, b"\xff\xf8\x59\x08\x80\x00")
+        self.assertRaises(error, _FrameHeader, b"\xff\xfa\x59\x08\x00\x00")
+        self.assertRaises(error, _FrameHeader, b"")
+
 
 class TFLACFile(TestCase):
 
@@ -887,6 +887,20 @@ class TID3Write(TestCase):
             h.write(b"nope")
         self.assertRaises(id3.error, ID3().save, self.filename)
 
+    def test_picture_offset(self):
+        tag = ID3(self.filename)
+        data = os.urandom(1000)
+        tag.add(APIC(encoding=3, mime="image/png", type=3, desc="a",
+                     data=data))
+        tag.save(v2_version=3)
+        self.assertTrue(next(tag._iter_pictures()).offset is None)
+
+        tag = ID3(self.filename, translate=False)
+        picture, = tag._iter_pictures()
+        with open(self.filename, "rb") as h:
+            h.seek(picture.offset)
+            self.assertEqual(h.read(picture.size), data)
+
     def test_padding_fill_all(self):
         tag = ID3(self.filename)
         self.assertEqual(tag._padding, 1142)
@@ -7,7 +7,8 @@ from mutagen.mp3 import MP3, error as MP3Error, delete, MPEGInfo, EasyMP3, \
     BitrateMode, iter_sync
 from mutagen.mp3._util import XingHeader, XingHeaderError, VBRIHeader, \
     VBRIHeaderError, LAMEHeader, LAMEError
-from mutagen.id3 import ID3
+from mutagen import File
+from mutagen.id3 import ID3, COMM
 
 
 class TMP3Util(TestCase):
@@ -63,6 +64,8 @@ class TMP3(TestCase):
         assert f.info.bitrate == 40000
         assert f.info.bitrate_mode == 2
         assert f.info.sample_rate == 24000
+        assert f.info.total_samples > 0
+        assert f.info.playable_samples == f.info.total_samples
 
     def test_mode(self):
         from mutagen.mp3 import JOINTSTEREO
@@ -82,6 +85,59 @@ class TMP3(TestCase):
         self.assertTrue(self.mp3.info.track_peak is None)
         self.assertTrue(self.mp3.info.album_gain is None)
 
+    def test_gapless(self):
+        info = self.mp3_lame.info
+        self.assertEqual(info.encoder_delay, 576)
+        self.assertEqual(info.encoder_padding, 1315)
+        self.assertEqual(info.total_samples, 4608)
+        self.assertEqual(info.playable_samples, 2717)
+
+        self.assertEqual(self.mp3_3.info.total_samples, 90432)
+        self.assertEqual(self.mp3_3.info.playable_samples, 88433)
+
+        self.assertTrue(self.mp3.info.encoder_delay is None)
+        self.assertTrue(self.mp3.info.encoder_padding is None)
+        self.assertTrue(self.mp3.info.total_samples is None)
+        self.assertTrue(self.mp3.info.playable_samples is None)
+
+    def test_gapless_itunsmpb(self):
+        self.mp3.tags.add(COMM(encoding=3, lang="eng", desc="iTunSMPB",
+            text=[" 00000000 00000840 000001C8 0000000000046E00 00000000"]))
+        self.mp3.save()
+        info = MP3(self.filename).info
+        self.assertEqual(info.encoder_delay, 0x840)
+        self.assertEqual(info.encoder_padding, 0x1C8)
+        self.assertEqual(info.playable_samples, 0x46E00)
+        self.assertEqual(info.total_samples, 0x840 + 0x46E00 + 0x1C8)
+
+    def test_gapless_itunsmpb_easy(self):
+        self.mp3.tags.add(COMM(encoding=3, lang="eng", desc="iTunSMPB",
+            text=[" 00000000 00000840 000001C8 0000000000046E00 00000000"]))
+        self.mp3.save()
+        self.assertEqual(EasyMP3(self.filename).info.encoder_delay, 0x840)
+        self.assertEqual(
+            File(self.filename, easy=True).info.encoder_delay, 0x840)
+
+    def test_gapless_itunsmpb_invalid(self):
+        self.mp3.tags.add(COMM(encoding=3, lang="eng", desc="iTunSMPB",
+                               text=["foo bar"]))
+        self.mp3.save()
+        info = MP3(self.filename).info
+        self.assertTrue(info.encoder_delay is None)
+
+    def test_gapless_itunsmpb_lame_first(self):
+        filename = get_temp_copy(self.silence_mpeg2)
+        try:
+            f = MP3(filename)
+            if f.tags is None:
+                f.add_tags()
+            f.tags.add(COMM(encoding=3, lang="eng", desc="iTunSMPB",
+                text=[" 00000000 00000840 000001C8 0000000000046E00"]))
+            f.save()
+            self.assertEqual(MP3(filename).info.encoder_delay, 576)
+        finally:
+            os.unlink(filename)
+
     def test_channels(self):
         self.assertEqual(self.mp3.info.channels, 2)
         self.assertEqual(self.mp3_2.info.channels, 2)
@@ -1,19 +1,22 @@
 
+import codecs
 import os
 import struct
 import subprocess
+import sys
+from array import array
 from io import BytesIO
 
 import pytest
 
-from tests import TestCase, DATA_DIR, get_temp_copy
+from tests import TestCase, DATA_DIR, get_temp_copy, get_temp_empty
 from mutagen.mp4 import (MP4, MP4Tags, MP4Info, delete, MP4Cover,
                          MP4MetadataError, MP4FreeForm, error, AtomDataType,
-                         _item_sort_key, MP4StreamInfoError)
+                         _item_sort_key, MP4StreamInfoError, _add_to_entries)
 from mutagen.mp4._atom import Atom, Atoms, AtomError
 from mutagen.mp4._util import parse_full_atom
 from mutagen.mp4._as_entry import AudioSampleEntry, ASEntryError
-from mutagen._util import cdata
+from mutagen._util import cdata, _FileData
 
 
 class TAtom(TestCase):
@@ -125,6 +128,45 @@ class TAtoms(TestCase):
     def test_repr(self):
         repr(self.atoms)
 
+    def test_lazy_children(self):
+        broken = b"\x00\x00\x00\x02free"
+        self.assertRaises(
+            AtomError, Atoms, BytesIO(Atom.render(b"moov", broken)))
+
+        data = BytesIO(Atom.render(b"moof", broken))
+        atoms = Atoms(data)
+        self.assertRaises(AtomError, getattr, atoms[b"moof", ], "children")
+
+    def test_lazy_children_closed(self):
+        data = BytesIO(Atom.render(b"moof", Atom.render(b"traf", b"")))
+        atoms = Atoms(data)
+        data.close()
+        self.assertRaises(AtomError, getattr, atoms[b"moof", ], "children")
+
+    def test_lazy_tracks(self):
+        # only the track subtrees are left for later
+        self.assertTrue(self.atoms[b"moov.udta.meta.ilst"].children)
+        trak = self.atoms[b"moov.trak"]
+        self.assertRaises(AtomError, getattr, trak, "children")
+        self.assertRaises(AtomError, self.atoms.__getitem__,
+                          b"moov.trak.mdia")
+
+    def test_preload(self):
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            atoms.preload()
+        self.assertTrue(atoms[b"moov.udta.meta.ilst"].children)
+        self.assertEqual(len(list(atoms[b"moov", ].findall(b"stco", True))),
+                         1)
+
+    def test_index(self):
+        data = BytesIO(Atom.render(b"free", b"") + Atom.render(b"mdat", b"") +
+                       Atom.render(b"free", b"\x00"))
+        atoms = Atoms(data)
+        self.assertEqual(atoms[b"free"].offset, 0)
+        self.assertEqual(atoms[b"mdat"].offset, 8)
+        self.assertEqual(len(atoms.atoms), 3)
+
 
 class TMP4Info(TestCase):
 
@@ -161,6 +203,62 @@ class TMP4Info(TestCase):
         info = MP4Info(atoms, fileobj)
         self.failUnlessEqual(info.length, 8)
 
+    def _make_trak(self, handler, language, entry):
+        code = 0
+        for c in bytearray(language):
+            code = code << 5 | (c - 0x60)
+        mdhd = Atom.render(
+            b"mdhd", struct.pack(">IIIIIH", 0, 0, 0, 10, 20, code))
+        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + handler)
+        stsd = Atom.render(b"stsd", struct.pack(">II", 0, 1) + entry)
+        minf = Atom.render(b"minf", Atom.render(b"stbl", stsd))
+        return Atom.render(b"trak", Atom.render(b"mdia", mdhd + hdlr + minf))
+
+    def _audio_entry(self, channels, sample_rate):
+        return Atom.render(
+            b"mp4a", b"\x00" * 16 +
+            struct.pack(">HHII", channels, 16, 0, sample_rate << 16) +
+            Atom.render(b"free", b""))
+
+    def test_tracks(self):
+        moov = Atom.render(b"moov", (
+            self._make_trak(b"vide", b"und", Atom.render(b"avc1", b"")) +
+            self._make_trak(b"soun", b"deu", self._audio_entry(2, 48000)) +
+            self._make_trak(b"soun", b"fra", self._audio_entry(6, 44100)) +
+            self._make_trak(b"soun", b"\x60\x60\x60", b"")))
+        fileobj = BytesIO(moov)
+        info = MP4Info(Atoms(fileobj), fileobj)
+
+        self.assertEqual(info.channels, 2)
+        self.assertEqual(info.sample_rate, 48000)
+        self.assertEqual(info.length, 2.0)
+        self.assertEqual(
+            [(t.handler_type, t.language, t.codec, t.channels, t.sample_rate)
+             for t in info.tracks],
+            [(u"vide", u"und", u"avc1", 0, 0),
+             (u"soun", u"deu", u"mp4a", 2, 48000),
+             (u"soun", u"fra", u"mp4a", 6, 44100),
+             (u"soun", u"und", u"", 0, 0)])
+        self.assertEqual(info.tracks[0].codec_description, u"AVC1")
+        self.assertEqual(info.tracks[2].bits_per_sample, 16)
+        self.assertEqual(info.tracks[2].length, 2.0)
+
+    def test_tracks_invalid_entry(self):
+        # only the first audio track has to be valid
+        moov = Atom.render(b"moov", (
+            self._make_trak(b"soun", b"eng", self._audio_entry(1, 8000)) +
+            self._make_trak(b"soun", b"eng", Atom.render(b"mp4a", b""))))
+        fileobj = BytesIO(moov)
+        info = MP4Info(Atoms(fileobj), fileobj)
+        self.assertEqual(info.channels, 1)
+        self.assertEqual(info.tracks[1].channels, 0)
+
+        moov = Atom.render(b"moov", (
+            self._make_trak(b"soun", b"eng", Atom.render(b"mp4a", b""))))
+        fileobj = BytesIO(moov)
+        with self.assertRaises(MP4StreamInfoError):
+            MP4Info(Atoms(fileobj), fileobj)
+
     def test_no_tracks(self):
         moov = Atom.render(b"moov", b"")
         fileobj = BytesIO(moov)
@@ -168,6 +266,88 @@ class TMP4Info(TestCase):
         with self.assertRaises(MP4StreamInfoError):
             MP4Info(atoms, fileobj)
 
+    def _scan_samples(self, stts, sizes, sample_size=0, count=None):
+        mdhd = Atom.render(b"mdhd", struct.pack(">IIIII", 0, 0, 0, 10, 20))
+        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"soun")
+        stts = Atom.render(b"stts", struct.pack(">II", 0, len(stts)) +
+                           b"".join(struct.pack(">II", *e) for e in stts))
+        stsz = Atom.render(b"stsz", struct.pack(
+            ">III", 0, sample_size,
+            len(sizes) if count is None else count) +
+            (b"" if sample_size else struct.pack(">%dI" % len(sizes), *sizes)))
+        minf = Atom.render(b"minf", Atom.render(b"stbl", stts + stsz))
+        trak = Atom.render(b"trak", Atom.render(b"mdia", mdhd + hdlr + minf))
+        fileobj = BytesIO(Atom.render(b"moov", trak))
+        return MP4Info(Atoms(fileobj), fileobj, scan_samples=True)
+
+    def test_scan_samples(self):
+        # 2 seconds, the second one using twice the space
+        info = self._scan_samples([(20, 1)], [100] * 10 + [200] * 10)
+        self.assertEqual(info.bitrate, 12000)
+        self.assertEqual(info.max_bitrate, 16000)
+        self.assertEqual(len(info.tracks), 1)
+        track = info.tracks[0]
+        self.assertEqual(track.handler_type, u"soun")
+        self.assertEqual(track.track_id, 0)
+        self.assertEqual(track.length, 2.0)
+        self.assertEqual(track.bitrate, 12000)
+        self.assertEqual(track.max_bitrate, 16000)
+
+    def test_scan_samples_variable_duration(self):
+        # 5 samples in the first second, 10 in the second one
+        info = self._scan_samples([(5, 2), (10, 1)], [0] * 15, 50)
+        self.assertEqual(info.bitrate, 3000)
+        self.assertEqual(info.max_bitrate, 4000)
+
+    def test_scan_samples_short(self):
+        info = self._scan_samples([(4, 1)], [100, 100, 100, 100])
+        self.assertEqual(info.bitrate, 8000)
+        self.assertEqual(info.max_bitrate, 8000)
+
+    def test_scan_samples_huge_count(self):
+        # nothing gets expanded per sample
+        info = self._scan_samples(
+            [(2 ** 32 - 1, 1)], [], 1, count=2 ** 32 - 1)
+        self.assertEqual(info.bitrate, 80)
+        self.assertEqual(info.max_bitrate, 80)
+
+    def test_scan_samples_count_mismatch(self):
+        # stts describing more samples than stsz are ignored
+        info = self._scan_samples([(5, 2), (2 ** 32 - 1, 1)], [0] * 15, 50)
+        self.assertEqual(info.bitrate, 3000)
+        self.assertEqual(info.max_bitrate, 4000)
+        info = self._scan_samples([(5, 2), (2 ** 32 - 1, 1)], [50] * 15)
+        self.assertEqual(info.bitrate, 3000)
+        self.assertEqual(info.max_bitrate, 4000)
+
+    def test_scan_samples_no_hdlr(self):
+        mdhd = Atom.render(b"mdhd", struct.pack(">IIIII", 0, 0, 0, 10, 20))
+        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"soun")
+        audio = Atom.render(b"trak", Atom.render(b"mdia", mdhd + hdlr))
+        other = Atom.render(b"trak", Atom.render(b"mdia", mdhd))
+        fileobj = BytesIO(Atom.render(b"moov", audio + other))
+        info = MP4Info(Atoms(fileobj), fileobj)
+        self.assertEqual(info.length, 2.0)
+        self.assertEqual(len(info.tracks), 2)
+        self.assertEqual(info.tracks[0].handler_type, u"soun")
+        self.assertEqual(info.tracks[1].handler_type, u"")
+
+    def test_broken_track(self):
+        mdhd = Atom.render(b"mdhd", struct.pack(">IIIII", 0, 0, 0, 10, 20))
+        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"soun")
+        audio = Atom.render(b"trak", Atom.render(b"mdia", mdhd + hdlr))
+        other = Atom.render(b"trak", b"\x00\x00\x00\x02free")
+        fileobj = BytesIO(Atom.render(b"moov", audio + other))
+        info = MP4Info(Atoms(fileobj), fileobj)
+        self.assertEqual(info.length, 2.0)
+        self.assertEqual(len(info.tracks), 2)
+
+    def test_scan_samples_invalid(self):
+        info = self._scan_samples([], [])
+        self.assertEqual(info.bitrate, 0)
+        self.assertEqual(info.max_bitrate, 0)
+        self.assertEqual(info.length, 2.0)
+
 
 class TMP4Tags(TestCase):
 
@@ -515,6 +695,14 @@ class TMP4Mixin(object):
         size2 = os.path.getsize(self.audio.filename)
         self.failUnless(size1, size2)
 
+    def test_moov_at_end(self):
+        self.audio["\xa9nam"] = u"wheeee" * 1000
+        self.audio.save(moov_at_end=True)
+        audio = MP4(self.audio.filename)
+        self.assertEqual(audio["\xa9nam"], [u"wheeee" * 1000])
+        self.assertEqual(audio.info.length, self.audio.info.length)
+        self.faad()
+
     def test_padding_2(self):
         self.audio["\xa9nam"] = u"wheeee" * 10
         self.audio.save()
@@ -698,6 +886,54 @@ class TMP4Mixin(object):
             MP4Cover(b'hoooo', MP4Cover.FORMAT_JPEG),
         ])
 
+    def test_cover_data_file(self):
+        data = os.urandom(300000)
+        filename = get_temp_empty()
+        try:
+            with open(filename, "wb") as h:
+                h.write(data)
+            cover = MP4Cover.from_file(filename, MP4Cover.FORMAT_PNG)
+            self.assertEqual(
+                repr(cover), "<MP4Cover from file (300000 bytes), "
+                "<AtomDataType.PNG: 14>>")
+            self.assertEqual(cover, cover)
+            self.assertNotEqual(cover, MP4Cover(b"", MP4Cover.FORMAT_PNG))
+            self.audio["covr"] = [MP4Cover(b"woooo"), cover]
+            self.assertTrue(
+                "[300000 bytes of data]" in self.audio.tags.pprint())
+
+            def fail(*args):
+                raise AssertionError
+            old_read = _FileData.read
+            _FileData.read = fail
+            dest = BytesIO()
+            try:
+                info = list(self.audio.iter_pictures())[-1]
+                self.assertEqual(info.size, len(data))
+                self.assertEqual(info.mime, u"image/png")
+                self.audio.extract_picture(-1, dest)
+                self.audio.save()
+                # replace the file backed cover in place
+                self.audio["covr"] = [MP4Cover(b"hoooo"), cover]
+                self.audio.save()
+            finally:
+                _FileData.read = old_read
+        finally:
+            os.unlink(filename)
+        self.assertEqual(dest.getvalue(), data)
+
+        covr = MP4(self.audio.filename)["covr"]
+        self.assertEqual(covr, [
+            MP4Cover(b"hoooo"), MP4Cover(data, MP4Cover.FORMAT_PNG)])
+        self.faad()
+
+    def test_cover_data_fileobj(self):
+        fileobj = BytesIO(b"foobar")
+        fileobj.seek(3)
+        self.audio["covr"] = [MP4Cover.from_file(fileobj)]
+        self.audio.save()
+        self.assertEqual(MP4(self.audio.filename)["covr"], [b"bar"])
+
     def test_podcast_url(self):
         self.set_key('purl', ['http://pdl.warnerbros.com/wbie/'
                               'justiceleagueheroes/audio/JLH_EA.xml'])
@@ -858,10 +1094,63 @@ class TMP4Datatypes(TMP4, TMP4HasTagsMixin):
         text = self.audio.tags.pprint().splitlines()
         self.assertTrue(u"©ART=Test Artist" in text)
 
+    def test_iter_pictures(self):
+        covr = self.audio.tags["covr"]
+        pictures = list(self.audio.iter_pictures())
+        self.assertEqual([p.mime for p in pictures],
+                         ["image/png", "image/jpeg"])
+        self.assertEqual([p.size for p in pictures], [len(c) for c in covr])
+        with open(self.filename, "rb") as h:
+            data = h.read()
+        for picture, cover in zip(pictures, covr):
+            self.assertEqual(
+                data[picture.offset:picture.offset + picture.size], cover)
+            dest = BytesIO()
+            self.audio.extract_picture(pictures.index(picture), dest)
+            self.assertEqual(dest.getvalue(), cover)
+
+        self.audio.save()
+        pictures = list(self.audio.iter_pictures())
+        self.assertEqual([p.offset for p in pictures], [None, None])
+        dest = BytesIO()
+        self.audio.extract_picture(1, dest)
+        self.assertEqual(dest.getvalue(), covr[1])
+        self.assertRaises(IndexError, self.audio.extract_picture, 2, dest)
+
     def test_get_padding(self):
         self.assertEqual(self.audio._padding, 1634)
 
 
+class TMP4ScanSamples(TestCase):
+
+    def test_tracks(self):
+        audio = MP4(os.path.join(DATA_DIR, "has-tags.m4a"))
+        self.assertEqual(audio.info.bitrate, 2914)
+        self.assertEqual(audio.info.max_bitrate, 0)
+        track, = audio.info.tracks
+        self.assertEqual(track.track_id, 1)
+        self.assertEqual(track.handler_type, u"soun")
+        self.assertEqual(track.bitrate, 2914)
+        self.assertAlmostEqual(track.length, 3.7, 1)
+
+    def test_scan_samples(self):
+        audio = MP4(os.path.join(DATA_DIR, "has-tags.m4a"), scan_samples=True)
+        self.assertEqual(audio.info.bitrate, 3143)
+        self.assertEqual(audio.info.max_bitrate, 3304)
+        self.assertEqual(audio.info.tracks[0].bitrate, 3143)
+
+    def test_chapter_track(self):
+        audio = MP4(os.path.join(DATA_DIR, "ep7.m4b"), scan_samples=True)
+        self.assertEqual([t.handler_type for t in audio.info.tracks],
+                         [u"soun", u"text"])
+        self.assertEqual([t.language for t in audio.info.tracks],
+                         [u"eng", u"und"])
+        self.assertEqual(audio.info.tracks[0].codec, u"mp4a.40.2")
+        self.assertEqual(audio.info.tracks[1].codec, u"text")
+        self.assertEqual(audio.info.bitrate, 125591)
+        self.assertEqual(audio.info.tracks[1].bitrate, 92)
+
+
 class TMP4CovrWithName(TMP4, TMP4Mixin):
     # http://bugs.musicbrainz.org/ticket/5894
     original = os.path.join(DATA_DIR, "covr-with-name.m4a")
@@ -943,6 +1232,569 @@ class TMP4UpdateParents64Bit(TestCase):
         os.unlink(self.filename)
 
 
+def _make_offsets_file(filename, tables, mdat_size=100, skip=0, free={}):
+    """Writes a minimal MP4 with moov before mdat. tables is a list of
+    (name, offsets) for the chunk offset tables, one track each. Offsets
+    are relative to the start of mdat. If skip is given, a sparse free
+    atom of that size gets placed in front of moov. free maps container
+    names in moov to the size of a free atom appended to them.
+    """
+
+    def render(name, data):
+        if name in free:
+            data += Atom.render(b"free", b"\x00" * (free[name] - 8))
+        return Atom.render(name, data)
+
+    def render_table(name, offsets, base):
+        typecode = "Q" if name == b"co64" else "I"
+        values = array(typecode, [base + o for o in offsets]
+                       if base is not None else [0] * len(offsets))
+        if sys.byteorder == "little":
+            values.byteswap()
+        return Atom.render(name, b"\x00" * 4 +
+                           struct.pack(">I", len(values)) + values.tobytes())
+
+    def render_moov(base):
+        ilst = Atom.render(b"ilst", b"")
+        udta = render(
+            b"udta", Atom.render(b"meta", b"\x00" * 4 + ilst))
+        mvhd = Atom.render(
+            b"mvhd", struct.pack(">4xIIII", 0, 0, 1000, 1000) + b"\x00" * 80)
+        hdlr = Atom.render(b"hdlr", b"\x00" * 8 + b"vide" + b"\x00" * 12)
+        traks = b"".join(
+            Atom.render(b"trak", Atom.render(b"mdia", hdlr + Atom.render(
+                b"minf", render(b"stbl", render_table(n, o, base)))))
+            for n, o in tables)
+        return render(b"moov", mvhd + udta + traks)
+
+    ftyp = Atom.render(b"ftyp", b"M4B " + b"\x00" * 4)
+    base = len(ftyp) + skip + len(render_moov(None)) + 8
+    with open(filename, "wb") as h:
+        h.write(ftyp)
+        if skip:
+            h.write(struct.pack(">I4s", skip, b"free"))
+            h.seek(len(ftyp) + skip)
+        h.write(render_moov(base))
+        h.write(struct.pack(">I4s", mdat_size + 8, b"mdat"))
+        h.truncate(base + mdat_size)
+    return base
+
+
+def _read_offsets(filename):
+    result = []
+    with open(filename, "rb") as h:
+        atoms = Atoms(h)
+        mdat = atoms[b"mdat"]
+        for trak in atoms[b"moov"].findall(b"trak"):
+            table = trak[b"mdia", b"minf", b"stbl"].children[0]
+            ok, data = table.read(h)
+            typecode = "Q" if table.name == b"co64" else "I"
+            values = array(typecode, data[8:])
+            if sys.byteorder == "little":
+                values.byteswap()
+            result.append(
+                (table.name, [v - mdat._dataoffset for v in values]))
+    return result
+
+
+class TMP4OffsetTables(TestCase):
+
+    def setUp(self):
+        self.filename = get_temp_empty(".m4b")
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def _tag(self, padding=0, **kwargs):
+        with open(self.filename, "rb") as fileobj:
+            tags = MP4Tags(Atoms(fileobj), fileobj)
+        tags["\xa9nam"] = u"x" * 1000
+        tags.save(self.filename, padding=lambda x: padding, **kwargs)
+
+    def _names(self):
+        with open(self.filename, "rb") as h:
+            return [atom.name for atom in Atoms(h).atoms]
+
+    def test_ten_hours(self):
+        # 10 hours of 44.1 kHz AAC with one frame per chunk
+        count = 10 * 3600 * 44100 // 1024
+        offsets = list(range(0, count * 4, 4))
+        _make_offsets_file(
+            self.filename, [(b"stco", offsets), (b"co64", offsets)])
+        self._tag()
+        self.assertEqual(_read_offsets(self.filename),
+                         [(b"stco", offsets), (b"co64", offsets)])
+
+    def test_mixed(self):
+        # entries pointing before moov stay the same
+        base = _make_offsets_file(self.filename, [(b"stco", [0] * 5)])
+        _make_offsets_file(
+            self.filename, [(b"stco", [0, -base, 10, -base + 8, 20])])
+        self._tag()
+        with open(self.filename, "rb") as h:
+            new_base = Atoms(h)[b"mdat"]._dataoffset
+        self.assertTrue(new_base > base)
+        (name, values), = _read_offsets(self.filename)
+        self.assertEqual(
+            values, [0, -new_base, 10, -new_base + 8, 20])
+
+    def test_unchanged(self):
+        _make_offsets_file(self.filename, [(b"stco", [0, 4])])
+        self._tag(padding=1000)
+        with open(self.filename, "rb") as h:
+            h.seek(0, 2)
+            size = h.tell()
+        # grows into the padding, nothing moves
+        self._tag(padding=0)
+        with open(self.filename, "rb") as h:
+            h.seek(0, 2)
+            self.assertEqual(h.tell(), size - 1000)
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+    def test_add_to_entries(self):
+        data = struct.pack(">3I", 10, 2 ** 32 - 3, 4)
+        self.assertEqual(_add_to_entries(data, 4, 2),
+                         struct.pack(">3I", 12, 2 ** 32 - 1, 6))
+        self.assertEqual(_add_to_entries(data, 4, -4),
+                         struct.pack(">3I", 6, 2 ** 32 - 7, 0))
+        data = struct.pack(">2Q", 2 ** 40, 1)
+        self.assertEqual(_add_to_entries(data, 8, 2 ** 33),
+                         struct.pack(">2Q", 2 ** 40 + 2 ** 33, 2 ** 33 + 1))
+        self.assertEqual(_add_to_entries(b"", 8, 1), b"")
+
+    def _check_atoms(self):
+        # all container sizes still add up
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            h.seek(0, 2)
+            self.assertEqual(atoms[b"mdat"].offset + atoms[b"mdat"].length,
+                             h.tell())
+
+    def test_overflow(self):
+        base = _make_offsets_file(self.filename, [(b"stco", [0])])
+        _make_offsets_file(self.filename, [(b"stco", [2 ** 32 - 10 - base])])
+        self._tag()
+        self._check_atoms()
+        (name, values), = _read_offsets(self.filename)
+        self.assertEqual(name, b"co64")
+        self.assertEqual(values, [2 ** 32 - 10 - base])
+
+    def test_promote_sparse(self):
+        # mdat starts right below 4 GiB, entries pointing in front of
+        # moov stay the same
+        tables = [(b"stco", [0, 50, 99]), (b"stco", [0])]
+        base = _make_offsets_file(self.filename, tables)
+        skip = 2 ** 32 - 600 - base
+        tables[1] = (b"stco", [-(base + skip) + 8])
+        base = _make_offsets_file(self.filename, tables, skip=skip)
+        self.assertEqual(base, 2 ** 32 - 600)
+        self._tag()
+        self._check_atoms()
+        with open(self.filename, "rb") as h:
+            new_base = Atoms(h)[b"mdat"]._dataoffset
+        self.assertTrue(new_base > 2 ** 32)
+        self.assertEqual(_read_offsets(self.filename), [
+            (b"co64", [0, 50, 99]), (b"stco", [-new_base + 8])])
+
+    def test_promote_cascade(self):
+        # the first table fits after the tag change, but not after the
+        # second one got converted
+        tables = [(b"stco", [0]), (b"stco", [2500] * 1000)]
+        base = _make_offsets_file(self.filename, tables, mdat_size=3000)
+        skip = 2 ** 32 - 3000 - base
+        base = _make_offsets_file(
+            self.filename, tables, mdat_size=3000, skip=skip)
+        self.assertEqual(base, 2 ** 32 - 3000)
+        self._tag()
+        self._check_atoms()
+        self.assertEqual(_read_offsets(self.filename), [
+            (b"co64", [0]), (b"co64", [2500] * 1000)])
+
+    def test_promote_noop(self):
+        tables = [(b"stco", [0, 10])]
+        base = _make_offsets_file(self.filename, tables)
+        skip = 2 ** 32 - 5000 - base
+        _make_offsets_file(self.filename, tables, skip=skip)
+        self._tag()
+        self._check_atoms()
+        self.assertEqual(_read_offsets(self.filename),
+                         [(b"stco", [0, 10])])
+
+    def test_moov_at_end(self):
+        base = _make_offsets_file(self.filename, [(b"stco", [0, 4])])
+        self._tag(padding=10, moov_at_end=True)
+        self.assertEqual(self._names(), [b"ftyp", b"free", b"mdat", b"moov"])
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            self.assertEqual(atoms[b"mdat"]._dataoffset, base)
+            free = atoms[b"free"]
+            h.seek(free._dataoffset)
+            self.assertEqual(h.read(free.datalength),
+                             b"\x00" * free.datalength)
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+        # fits into the padding now, so stays in place
+        self._tag(moov_at_end=True)
+        self.assertEqual(self._names(), [b"ftyp", b"free", b"mdat", b"moov"])
+        with open(self.filename, "rb") as fileobj:
+            tags = MP4Tags(Atoms(fileobj), fileobj)
+        self.assertEqual(tags["\xa9nam"], [u"x" * 1000])
+
+    def test_moov_at_end_fits(self):
+        _make_offsets_file(self.filename, [(b"stco", [0, 4])])
+        self._tag(padding=10)
+        self._tag(moov_at_end=True)
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat"])
+
+    def test_moov_at_end_zero_size(self):
+        _make_offsets_file(self.filename, [(b"stco", [0, 4])])
+        with open(self.filename, "r+b") as h:
+            h.seek(Atoms(h)[b"mdat"].offset)
+            h.write(b"\x00" * 4)
+        self._tag(moov_at_end=True)
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat"])
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+    def _free_atoms(self):
+        with open(self.filename, "rb") as h:
+            moov = Atoms(h)[b"moov"]
+            return [(atom.offset, atom.length)
+                    for atom in moov.findall(b"free", True)]
+
+    def test_reclaim(self):
+        base = _make_offsets_file(
+            self.filename, [(b"stco", [0, 4]), (b"stco", [8])],
+            free={b"udta": 600, b"stbl": 600, b"moov": 600})
+        with open(self.filename, "rb") as h:
+            moov_length = Atoms(h)[b"moov"].length
+        self._tag()
+        self._check_atoms()
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            self.assertEqual(atoms[b"moov"].length, moov_length)
+            self.assertEqual(atoms[b"mdat"]._dataoffset, base)
+            meta = atoms[b"moov", b"udta", b"meta"]
+            self.assertEqual(
+                [a.name for a in meta.children], [b"ilst", b"free"])
+            tags = MP4Tags(atoms, h)
+        self.assertEqual(tags["\xa9nam"], [u"x" * 1000])
+        self.assertEqual(_read_offsets(self.filename),
+                         [(b"stco", [0, 4]), (b"stco", [8])])
+
+        # the closest ones got used, the one at the end of moov is left
+        free = self._free_atoms()
+        self.assertEqual(len(free), 3)
+        self.assertEqual(free[-1], (base - 8 - 600, 600))
+
+    def test_reclaim_cover_data_file(self):
+        base = _make_offsets_file(
+            self.filename, [(b"stco", [0, 4])], free={b"stbl": 2000})
+        with open(self.filename, "rb") as fileobj:
+            tags = MP4Tags(Atoms(fileobj), fileobj)
+        tags["covr"] = [MP4Cover.from_file(BytesIO(b"woooo" * 100))]
+        tags.save(self.filename, padding=lambda x: 0)
+        self._check_atoms()
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            self.assertEqual(atoms[b"mdat"]._dataoffset, base)
+            tags = MP4Tags(atoms, h)
+        self.assertEqual(tags["covr"], [MP4Cover(b"woooo" * 100)])
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+    def test_reclaim_skip(self):
+        base = _make_offsets_file(
+            self.filename, [(b"stco", [0, 4])], free={b"stbl": 2000})
+        with open(self.filename, "r+b") as h:
+            free = Atoms(h)[b"moov"].findall(b"free", True)
+            h.seek(next(free).offset + 4)
+            h.write(b"skip")
+        self._tag(padding=100)
+        self._check_atoms()
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            self.assertEqual(atoms[b"mdat"]._dataoffset, base)
+            self.assertFalse(list(atoms[b"moov"].findall(b"skip", True)))
+            # everything gets used as padding
+            padding = atoms[b"moov", b"udta", b"meta", b"free"]
+            self.assertTrue(padding.length > 900)
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+    def test_reclaim_not_enough(self):
+        base = _make_offsets_file(
+            self.filename, [(b"stco", [0, 4])], free={b"stbl": 500})
+        self._tag()
+        self._check_atoms()
+        with open(self.filename, "rb") as h:
+            self.assertTrue(Atoms(h)[b"mdat"]._dataoffset > base)
+        self.assertEqual(len(self._free_atoms()), 2)
+        self.assertEqual(_read_offsets(self.filename), [(b"stco", [0, 4])])
+
+    def test_reclaim_moov_at_end(self):
+        _make_offsets_file(
+            self.filename, [(b"stco", [0, 4])], free={b"moov": 2000})
+        self._tag(moov_at_end=True)
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat"])
+        self._check_atoms()
+
+    def test_invalid_table(self):
+        _make_offsets_file(self.filename, [(b"stco", [0, 4])])
+        with open(self.filename, "r+b") as h:
+            stco = Atoms(h)[b"moov"].findall(b"stco", True)
+            h.seek(next(stco).offset + 12)
+            h.write(struct.pack(">I", 3))
+        self.assertRaises(MP4MetadataError, self._tag)
+
+
+class TMP4OptimizeLayout(TestCase):
+
+    def setUp(self):
+        self.filename = get_temp_copy(os.path.join(DATA_DIR, "has-tags.m4a"))
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def _names(self):
+        with open(self.filename, "rb") as h:
+            return [atom.name for atom in Atoms(h).atoms]
+
+    def _chunks(self):
+        # the start of every chunk
+        chunks = []
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            for atom in atoms[b"moov"].findall(b"stco", True):
+                ok, data = atom.read(h)
+                for offset in struct.unpack(">%dI" % (len(data) // 4 - 2),
+                                            data[8:]):
+                    h.seek(offset)
+                    chunks.append(h.read(16))
+        return chunks
+
+    def test_faststart(self):
+        audio = MP4(self.filename)
+        chunks = self._chunks()
+        self.assertEqual(self._names(), [b"ftyp", b"mdat", b"moov"])
+        audio.optimize_layout()
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat"])
+        self.assertEqual(self._chunks(), chunks)
+        new = MP4(self.filename)
+        self.assertEqual(new.tags, audio.tags)
+        self.assertEqual(new.info.length, audio.info.length)
+
+        audio.optimize_layout(faststart=False)
+        self.assertEqual(self._names(), [b"ftyp", b"mdat", b"moov"])
+        self.assertEqual(self._chunks(), chunks)
+        self.assertEqual(MP4(self.filename).tags, audio.tags)
+
+    def test_padding(self):
+        audio = MP4(self.filename)
+        audio.optimize_layout(padding=lambda info: 5000)
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            meta = atoms[b"moov", b"udta", b"meta"]
+            self.assertEqual(
+                [c.length for c in meta.children if c.name == b"free"],
+                [5008])
+            mdat = atoms[b"mdat"].offset
+
+        # saving uses the padding
+        audio["\xa9nam"] = u"x" * 4000
+        audio.save()
+        with open(self.filename, "rb") as h:
+            self.assertEqual(Atoms(h)[b"mdat"].offset, mdat)
+        self.assertEqual(MP4(self.filename)["\xa9nam"], [u"x" * 4000])
+
+    def test_unchanged(self):
+        audio = MP4(self.filename)
+        audio.optimize_layout(padding=lambda info: 100)
+        with open(self.filename, "rb") as h:
+            data = h.read()
+        audio.optimize_layout(padding=lambda info: 100)
+        with open(self.filename, "rb") as h:
+            self.assertEqual(h.read(), data)
+
+    def test_free_removed(self):
+        audio = MP4(self.filename)
+        chunks = self._chunks()
+        audio["\xa9nam"] = u"x" * 4000
+        audio.save(moov_at_end=True)
+        audio.optimize_layout(faststart=False)
+        self.assertEqual(self._names(), [b"ftyp", b"mdat", b"moov"])
+        self.assertEqual(self._chunks(), chunks)
+
+    def test_fragmented(self):
+        os.unlink(self.filename)
+        self.filename = get_temp_copy(os.path.join(DATA_DIR, "no-tags.3g2"))
+        audio = MP4(self.filename)
+        audio.optimize_layout()
+        with open(self.filename, "rb") as h:
+            data = h.read()
+        audio.optimize_layout()
+        with open(self.filename, "rb") as h:
+            self.assertEqual(h.read(), data)
+        self.assertRaises(error, audio.optimize_layout,
+                          faststart=False)
+
+    def test_no_tags(self):
+        os.unlink(self.filename)
+        self.filename = get_temp_copy(os.path.join(DATA_DIR, "no-tags.m4a"))
+        audio = MP4(self.filename)
+        audio.optimize_layout()
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat", b"mdat"])
+        self.assertEqual(MP4(self.filename).info.length, audio.info.length)
+
+        # space for tags got reserved, so adding some doesn't move mdat
+        with open(self.filename, "rb") as h:
+            mdat = Atoms(h)[b"mdat"].offset
+        audio = MP4(self.filename)
+        self.assertEqual(len(audio.tags), 0)
+        audio["\xa9nam"] = u"foo"
+        audio.save()
+        with open(self.filename, "rb") as h:
+            self.assertEqual(Atoms(h)[b"mdat"].offset, mdat)
+        self.assertEqual(MP4(self.filename)["\xa9nam"], [u"foo"])
+
+    def test_promote(self):
+        os.unlink(self.filename)
+        self.filename = get_temp_empty(".m4b")
+        base = _make_offsets_file(self.filename, [(b"stco", [0, 0])])
+        offsets = [(b"stco", [0, 2 ** 32 - 20 - base])]
+        _make_offsets_file(self.filename, offsets)
+        audio = MP4(self.filename)
+        audio.optimize_layout(faststart=False, padding=lambda info: 0)
+        self.assertEqual(self._names(), [b"ftyp", b"mdat", b"moov"])
+        self.assertEqual(_read_offsets(self.filename), offsets)
+
+        # moov grows by the padding, which pushes the entries over 4 GiB
+        audio.optimize_layout(padding=lambda info: 100)
+        self.assertEqual(self._names(), [b"ftyp", b"moov", b"mdat"])
+        self.assertEqual(_read_offsets(self.filename),
+                         [(b"co64", [0, 2 ** 32 - 20 - base])])
+        self.assertEqual(MP4(self.filename).tags, audio.tags)
+
+
+def _make_fragmented_file(filename, count):
+    """Writes a fragmented MP4 with count moof atoms, each followed by
+    an mdat containing its index, and an mfra with a tfra version 0 and
+    version 1 table pointing to all of them.
+    """
+
+    ftyp = Atom.render(b"ftyp", b"iso5" + b"\x00" * 4)
+    mvhd = Atom.render(
+        b"mvhd", struct.pack(">4xIIII", 0, 0, 1000, 1000) + b"\x00" * 80)
+    udta = Atom.render(b"udta", Atom.render(
+        b"meta", b"\x00" * 4 + Atom.render(b"ilst", b"")))
+    data = ftyp + Atom.render(b"moov", mvhd + udta)
+
+    def render_moof(base):
+        tfhd = Atom.render(b"tfhd", struct.pack(">IIQ", 1, 1, base))
+        traf = Atom.render(b"traf", tfhd)
+        return Atom.render(b"moof", Atom.render(b"mfhd", b"\x00" * 8) + traf)
+
+    moofs = []
+    for i in range(count):
+        moofs.append(len(data))
+        # base data offset pointing to the mdat payload
+        moof = render_moof(len(data) + len(render_moof(0)) + 8)
+        data += moof + Atom.render(b"mdat", struct.pack(">I", i))
+
+    entries = b"".join(struct.pack(">II3B", i, o, 1, 1, 1)
+                       for i, o in enumerate(moofs))
+    tfra0 = Atom.render(b"tfra", struct.pack(
+        ">IIII", 0, 1, 0, len(moofs)) + entries)
+    entries = b"".join(struct.pack(">QQBHB", i, o, 1, 1, 1)
+                       for i, o in enumerate(moofs))
+    tfra1 = Atom.render(b"tfra", struct.pack(
+        ">IIII", 1 << 24, 1, 0b000100, len(moofs)) + entries)
+    mfro = Atom.render(b"mfro", struct.pack(">II", 0, 8 + len(tfra0) +
+                                            len(tfra1) + 16))
+    data += Atom.render(b"mfra", tfra0 + tfra1 + mfro)
+
+    with open(filename, "wb") as h:
+        h.write(data)
+
+
+class TMP4Fragments(TestCase):
+
+    def setUp(self):
+        self.filename = get_temp_empty(".m4a")
+        _make_fragmented_file(self.filename, 1000)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def _check(self):
+        with open(self.filename, "rb") as h:
+            atoms = Atoms(h)
+            moofs = [a for a in atoms.atoms if a.name == b"moof"]
+            self.assertEqual(len(moofs), 1000)
+            for i, moof in enumerate(moofs):
+                tfhd = next(moof.findall(b"tfhd", True))
+                ok, data = tfhd.read(h)
+                base, = struct.unpack(">Q", data[8:16])
+                h.seek(base)
+                self.assertEqual(h.read(4), struct.pack(">I", i))
+
+            ok, data = atoms[b"mfra"].read(h)
+            # version 0, then version 1
+            tables = [(4, ">I", 11), (8, ">Q", 20)]
+            pos = 0
+            for size, fmt, entry_size in tables:
+                count, = struct.unpack(">I", data[pos + 20:pos + 24])
+                self.assertEqual(count, 1000)
+                for i in range(count):
+                    start = pos + 24 + i * entry_size + size
+                    offset, = struct.unpack(fmt, data[start:start + size])
+                    self.assertEqual(offset, moofs[i].offset)
+                pos += 24 + count * entry_size
+
+    def test_initial(self):
+        self._check()
+
+    def test_save(self):
+        audio = MP4(self.filename)
+        audio["\xa9nam"] = u"x" * 2000
+        audio.save()
+        self._check()
+        audio = MP4(self.filename)
+        self.assertEqual(audio["\xa9nam"], [u"x" * 2000])
+        del audio["\xa9nam"]
+        audio.save(padding=lambda info: 0)
+        self._check()
+
+    def test_optimize_layout(self):
+        audio = MP4(self.filename)
+        audio.optimize_layout(padding=lambda info: 5000)
+        self._check()
+
+    def test_invalid_tfra(self):
+        with open(self.filename, "r+b") as h:
+            mfra = Atoms(h)[b"mfra"]
+            h.seek(mfra._dataoffset + 20)
+            h.write(struct.pack(">I", 2000))
+        with open(self.filename, "rb") as h:
+            data = h.read()
+        audio = MP4(self.filename)
+        audio["\xa9nam"] = u"x" * 2000
+        self.assertRaises(MP4MetadataError, audio.save)
+        self.assertRaises(MP4MetadataError, audio.optimize_layout,
+                          padding=lambda info: 5000)
+        with open(self.filename, "rb") as h:
+            self.assertEqual(h.read(), data)
+
+    def test_invalid_tfra_in_place(self):
+        audio = MP4(self.filename)
+        audio.save(padding=lambda info: 5000)
+        with open(self.filename, "r+b") as h:
+            mfra = Atoms(h)[b"mfra"]
+            h.seek(mfra._dataoffset + 20)
+            h.write(struct.pack(">I", 2000))
+        # nothing gets moved, so the fragments aren't looked at
+        audio["\xa9nam"] = u"x" * 2000
+        audio.save()
+        self.assertEqual(MP4(self.filename)["\xa9nam"], [u"x" * 2000])
+
+
 class TMP4ALAC(TestCase):
     original = os.path.join(DATA_DIR, "alac.m4a")
 
@@ -1186,6 +2038,14 @@ class TMP4AudioSampleEntry(TestCase):
         self.assertRaises(ASEntryError, AudioSampleEntry, atom, fileobj)
 
 
+def test_broken_nested_atom():
+    data = (Atom.render(b"ftyp", b"M4A \x00\x00\x00\x00") +
+            Atom.render(b"moov", Atom.render(
+                b"udta", b"\x00\x00\x00\x02free")))
+    with pytest.raises(error):
+        MP4(BytesIO(data))
+
+
 def test_weird_descriptor_size():
     path = os.path.join(DATA_DIR, "ep7.m4b")
     t = MP4(path)
@@ -1213,6 +2073,136 @@ class TMP4Chapters(TMP4):
             self.failUnlessEqual(c.title, str(i + 1).zfill(3))
 
 
+def _make_chapter_file(filename, titles, co64=False, handler=b"text"):
+    """Writes an MP4 with an audio track referencing a text track with one
+    sample per chapter title, each one second long. The first chunk
+    holds three samples, all following ones two.
+    """
+
+    R = Atom.render
+    samples = []
+    for title in titles:
+        text = title.encode("utf-8")
+        if not text.isascii():
+            text = codecs.BOM_UTF16_BE + title.encode("utf-16-be")
+        samples.append(struct.pack(">H", len(text)) + text +
+                       R(b"encd", b"\x00\x00\x01\x00"))
+    sizes = [len(s) for s in samples]
+    chunks = [samples[:3]] + [samples[i:i + 2]
+                              for i in range(3, len(samples), 2)]
+
+    def render_moov(base):
+        offsets = []
+        for chunk in chunks:
+            offsets.append(base)
+            base += sum(len(s) for s in chunk)
+        if co64:
+            table = R(b"co64", struct.pack(
+                ">II%dQ" % len(offsets), 0, len(offsets), *offsets))
+        else:
+            table = R(b"stco", struct.pack(
+                ">II%dI" % len(offsets), 0, len(offsets), *offsets))
+        stbl = R(b"stbl",
+                 R(b"stts", struct.pack(">IIII", 0, 1, len(titles), 600)) +
+                 R(b"stsc", struct.pack(">8I", 0, 2, 1, 3, 1, 2, 2, 1)) +
+                 R(b"stsz", struct.pack(">III%dI" % len(sizes), 0, 0,
+                                        len(sizes), *sizes)) +
+                 table)
+        text = R(b"trak", R(b"tkhd", struct.pack(">IIII", 0, 0, 0, 2)) +
+                 R(b"mdia",
+                   R(b"mdhd", struct.pack(">IIIII", 0, 0, 0, 600,
+                                          600 * len(titles))) +
+                   R(b"hdlr", b"\x00" * 8 + handler + b"\x00" * 12) +
+                   R(b"minf", stbl)))
+        audio = R(b"trak", R(b"tkhd", struct.pack(">IIII", 0, 0, 0, 1)) +
+                  R(b"tref", R(b"chap", struct.pack(">I", 2))) +
+                  R(b"mdia",
+                    R(b"mdhd", struct.pack(">IIIII", 0, 0, 0, 1000, 1000)) +
+                    R(b"hdlr", b"\x00" * 8 + b"soun" + b"\x00" * 12)))
+        mvhd = R(b"mvhd", struct.pack(">4xIIII", 0, 0, 1000, 1000) +
+                 b"\x00" * 80)
+        return R(b"moov", mvhd + audio + text)
+
+    ftyp = R(b"ftyp", b"M4B " + b"\x00" * 4)
+    base = len(ftyp) + len(render_moov(0)) + 8
+    with open(filename, "wb") as h:
+        h.write(ftyp + render_moov(base) + R(b"mdat", b"".join(samples)))
+
+
+class TMP4ChapterTrack(TestCase):
+
+    def setUp(self):
+        self.filename = get_temp_empty(".m4b")
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def test_many(self):
+        titles = [u"Chapter %d" % i for i in range(2000)]
+        _make_chapter_file(self.filename, titles)
+        chapters = MP4(self.filename).chapters
+        self.assertEqual([c.title for c in chapters], titles)
+        self.assertEqual([c.start for c in chapters], list(range(2000)))
+
+    def test_co64_utf16(self):
+        titles = [u"foo", u"\u2603", u"bar", u"", u"\xe4"]
+        _make_chapter_file(self.filename, titles, co64=True)
+        chapters = MP4(self.filename).chapters
+        self.assertEqual([c.title for c in chapters], titles)
+
+    def test_no_chapters(self):
+        _make_chapter_file(self.filename, [])
+        self.assertEqual(len(MP4(self.filename).chapters), 0)
+
+    def test_quicktime(self):
+        os.unlink(self.filename)
+        self.filename = get_temp_copy(os.path.join(DATA_DIR, "ep7.m4b"))
+        with open(self.filename, "r+b") as h:
+            chpl = Atoms(h)[b"moov.udta.chpl"]
+            h.seek(chpl.offset + 4)
+            h.write(b"free")
+        chapters = MP4(self.filename).chapters
+        self.assertEqual([(c.start, c.title) for c in chapters],
+                         [(0.0, u"Chapter 1")])
+
+    def test_invalid_title(self):
+        _make_chapter_file(self.filename, [u"foo"])
+        with open(self.filename, "r+b") as h:
+            data = h.read()
+            h.seek(data.rindex(b"foo"))
+            h.write(b"\xff")
+        audio = MP4(self.filename)
+        self.assertIsNone(audio.chapters)
+        self.assertEqual(audio.info.length, 1.0)
+
+    def test_invalid_stsc(self):
+        _make_chapter_file(self.filename, [u"foo"])
+        with open(self.filename, "r+b") as h:
+            stsc = Atoms(h)[b"moov"].findall(b"trak")
+            stsc = list(stsc)[1][b"mdia", b"minf", b"stbl", b"stsc"]
+            h.seek(stsc.offset + 12)
+            h.write(struct.pack(">I", 2 ** 30))
+        self.assertIsNone(MP4(self.filename).chapters)
+
+    def test_stsc_first_chunk_zero(self):
+        _make_chapter_file(self.filename, [u"foo"])
+        with open(self.filename, "r+b") as h:
+            stsc = Atoms(h)[b"moov"].findall(b"trak")
+            stsc = list(stsc)[1][b"mdia", b"minf", b"stbl", b"stsc"]
+            h.seek(stsc.offset + 16)
+            h.write(struct.pack(">I", 0))
+        self.assertIsNone(MP4(self.filename).chapters)
+
+    def test_image_track(self):
+        _make_chapter_file(self.filename, [u"foo"], handler=b"vide")
+        self.assertIsNone(MP4(self.filename).chapters)
+
+    def test_subtitle_track(self):
+        _make_chapter_file(self.filename, [u"foo"], handler=b"sbtl")
+        chapters = MP4(self.filename).chapters
+        self.assertEqual([c.title for c in chapters], [u"foo"])
+
+
 def call_faad(*args):
     with open(os.devnull, 'wb') as null:
         return subprocess.call(
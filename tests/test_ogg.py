@@ -5,7 +5,8 @@ import subprocess
 from io import BytesIO
 
 from tests import TestCase, DATA_DIR, get_temp_copy
-from mutagen.ogg import OggPage, error as OggError
+from mutagen.ogg import OggPage, error as OggError, build_chain_index, \
+    build_seek_index
 from mutagen._util import cdata
 from mutagen import _util
 
@@ -235,6 +236,21 @@ class TOggPage(TestCase):
         pages = [OggPage(fileobj) for i in range(3)]
         self.failUnlessEqual([page.sequence for page in pages], [20, 21, 22])
 
+    def test_renumber_invalid_crc(self):
+        fileobj = BytesIO()
+        for page in self.pages:
+            fileobj.write(page.write())
+        # break the CRC of the second page
+        data = bytearray(fileobj.getvalue())
+        data[self.pages[0].size + 22] ^= 0xff
+        fileobj = BytesIO(data)
+        OggPage.renumber(fileobj, 1, 10)
+        fileobj.seek(0)
+        data = fileobj.getvalue()
+        for page in OggPage.iter_pages(fileobj):
+            raw = data[page.offset:page.offset + page.size]
+            self.assertEqual(raw, page.write())
+
     def test_renumber_extradata(self):
         fileobj = BytesIO()
         for page in self.pages:
@@ -279,6 +295,78 @@ class TOggPage(TestCase):
         finally:
             os.unlink(filename)
 
+    def test_iter_pages(self):
+        filename = os.path.join(DATA_DIR, "multipagecomment.ogg")
+        with open(filename, "rb") as h:
+            expected = []
+            while True:
+                try:
+                    expected.append(OggPage(h))
+                except EOFError:
+                    break
+            end = h.tell()
+            for buffer_size in [1, 27, 100, 4096, 2 ** 16]:
+                h.seek(0)
+                pages = list(OggPage.iter_pages(h, buffer_size=buffer_size))
+                self.assertEqual(pages, expected)
+                self.assertEqual(
+                    [p.offset for p in pages], [p.offset for p in expected])
+                self.assertEqual(
+                    [p.size for p in pages], [p.size for p in expected])
+                self.assertEqual(h.tell(), end)
+
+    def test_iter_pages_lazy_packets(self):
+        packets = [b"foo" * 200, b"bar", b"", b"x" * 255]
+        pages = OggPage.from_packets(packets, default_size=300)
+        fileobj = BytesIO(b"".join(p.write() for p in pages))
+        read = list(OggPage.iter_pages(fileobj))
+        self.assertEqual([p.size for p in read], [p.size for p in pages])
+        self.assertEqual([p.write() for p in read], [p.write() for p in pages])
+        self.assertEqual(OggPage.to_packets(read), packets)
+        self.assertTrue(all(isinstance(p, bytes) for p in read[0].packets))
+
+    def test_iter_pages_empty(self):
+        self.assertEqual(list(OggPage.iter_pages(BytesIO())), [])
+        self.assertEqual(list(OggPage.iter_pages(BytesIO(b"\x00" * 5))), [])
+
+    def test_iter_pages_trailing_garbage(self):
+        data = b"".join(p.write() for p in self.pages)
+        fileobj = BytesIO(data + b"garbage")
+        pages = []
+        with self.assertRaises(OggError):
+            for page in OggPage.iter_pages(fileobj):
+                pages.append(page)
+        self.assertEqual(pages, self.pages)
+        self.assertEqual(fileobj.tell(), len(data))
+
+    def test_iter_pages_truncated(self):
+        data = b"".join(p.write() for p in self.pages)
+        fileobj = BytesIO(data[:-1])
+        self.assertRaises(OggError, list, OggPage.iter_pages(fileobj))
+
+    def test_iter_pages_seek_between(self):
+        data = b"".join(p.write() for p in self.pages)
+        fileobj = BytesIO(data)
+        pages = []
+        for page in OggPage.iter_pages(fileobj, buffer_size=1):
+            fileobj.seek(0)
+            pages.append(page)
+        self.assertEqual(pages, self.pages)
+
+    def test_renumber_crc(self):
+        packets = [b"x" * i for i in range(0, 5000, 333)]
+        pages = OggPage.from_packets(packets, default_size=512)
+        for page in pages:
+            page.serial = 3
+        fileobj = BytesIO(b"".join(p.write() for p in pages))
+        OggPage.renumber(fileobj, 3, 1234567)
+        fileobj.seek(0)
+        data = fileobj.getvalue()
+        for i, page in enumerate(OggPage.iter_pages(fileobj)):
+            self.assertEqual(page.sequence, 1234567 + i)
+            self.assertEqual(
+                page.write(), data[page.offset:page.offset + page.size])
+
     def test_renumber_muxed(self):
         pages = [OggPage() for i in range(10)]
         for seq, page in enumerate(pages[0:1] + pages[2:]):
@@ -368,6 +456,54 @@ class TOggPage(TestCase):
         new_pages = OggPage._from_packets_try_preserve(other_packets, pages)
         self.assertEqual(new_pages, other_pages)
 
+    def test__from_packets_keep_count(self):
+        packets = [b"1" * 1000, b"2" * 10, b"", b"3" * 510]
+        pages = OggPage.from_packets(
+            packets, sequence=3, default_size=300, wiggle_room=0)
+        self.assertTrue(len(pages) > 1)
+
+        new_packets = [b"1" * 10, b"2" * 2000, b"", b"3" * 255]
+        new_pages = OggPage._from_packets_keep_count(new_packets, pages)
+        self.assertEqual(len(new_pages), len(pages))
+        self.assertEqual(
+            [p.sequence for p in new_pages], [p.sequence for p in pages])
+        self.assertEqual(OggPage.to_packets(new_pages, strict=True),
+                         new_packets)
+        for page in new_pages:
+            self.assertEqual(page.position == -1, not page.complete and
+                             len(page.packets) == 1)
+
+        # too small or too large
+        self.assertTrue(
+            OggPage._from_packets_keep_count([b"x"], pages) is None)
+        self.assertTrue(OggPage._from_packets_keep_count(
+            [b"x" * 255 * 255 * 4], pages) is None)
+        self.assertTrue(OggPage._from_packets_keep_count([], pages) is None)
+
+    def test__from_packets_keep_count_incomplete(self):
+        pages = OggPage.from_packets([b"1" * 100, b"2" * 2000])
+        self.assertEqual(len(pages), 1)
+        pages[0].complete = False
+
+        # the unfinished packet has to end on a segment boundary
+        new_pages = OggPage._from_packets_keep_count(
+            [b"1" * 1000, b"2" * 510], pages)
+        self.assertEqual(len(new_pages), 1)
+        self.assertFalse(new_pages[0].complete)
+        self.assertEqual(new_pages[0].position, 0)
+        self.assertTrue(OggPage._from_packets_keep_count(
+            [b"1" * 1000, b"2" * 511], pages) is None)
+
+    def test__from_packets_try_preserve_keep_count(self):
+        packets = [b"1" * 100000, b"2" * 100000, b"3" * 100000]
+        pages = OggPage.from_packets(packets, sequence=42, default_size=977)
+        other_packets = list(packets)
+        other_packets[1] += b"\xff" * 1000
+        new_pages = OggPage._from_packets_try_preserve(
+            other_packets, pages, keep_count=True)
+        self.assertEqual(len(new_pages), len(pages))
+        self.assertEqual(OggPage.to_packets(new_pages), other_packets)
+
     def test_random_data_roundtrip(self):
         try:
             random_file = open("/dev/urandom", "rb")
@@ -527,6 +663,52 @@ class TOggPage(TestCase):
         self.failUnlessEqual(
             OggPage.find_last(data, pages[0].serial), pages[-2])
 
+    def test_find_last_muxed_large(self):
+        # two interleaved streams, the second one ends last: only the end
+        # of the file should be read
+        pages = []
+        for i in range(2000):
+            for serial in [1, 2]:
+                page = OggPage()
+                page.serial = serial
+                page.sequence = i
+                page.position = i
+                page.packets = [b"x" * 1000]
+                pages.append(page)
+        pages[-2].last = True
+        pages[-1].last = True
+        pages[-1].position = -1
+        data = b"".join([page.write() for page in pages])
+
+        class CountingIO(BytesIO):
+            read_bytes = 0
+
+            def read(self, *args):
+                data = BytesIO.read(self, *args)
+                self.read_bytes += len(data)
+                return data
+
+        fileobj = CountingIO(data)
+        page = OggPage.find_last(fileobj, 1)
+        self.assertEqual(page, pages[-2])
+        self.assertEqual(page.offset, len(data) - 2 * pages[-1].size)
+        page = OggPage.find_last(fileobj, 2, finishing=True)
+        self.assertEqual(page, pages[-3])
+        self.assertTrue(fileobj.read_bytes < len(data) // 4)
+
+    def test_find_last_muxed_bad_crc(self):
+        pages = [OggPage() for i in range(10)]
+        for i, page in enumerate(pages):
+            page.sequence = i
+            page.position = i
+        pages[-1].serial = pages[0].serial + 1
+        data = bytearray(b"".join([page.write() for page in pages]))
+        # break the CRC of the last page of the first stream
+        offset = sum(p.size for p in pages[:-2]) + 22
+        data[offset] ^= 0xff
+        page = OggPage.find_last(BytesIO(bytes(data)), pages[0].serial)
+        self.assertEqual(page.position, 8)
+
     def test_find_last_no_serial(self):
         pages = [OggPage() for i in range(10)]
         for i, page in enumerate(pages):
@@ -550,6 +732,123 @@ class TOggPage(TestCase):
         page = OggPage.find_last(data, 0)
         self.failIf(page)
 
+    def test_build_chain_index(self):
+        with open(os.path.join(DATA_DIR, "empty.ogg"), "rb") as h:
+            first = h.read()
+        with open(os.path.join(DATA_DIR, "multipage-setup.ogg"), "rb") as h:
+            second = h.read()
+        fileobj = BytesIO(first + second + b"garbage")
+        links = build_chain_index(fileobj)
+        self.assertEqual(len(links), 2)
+        self.assertEqual(links[0].serial, 1002429366)
+        self.assertEqual(links[0].offset, 0)
+        self.assertEqual(links[0].end, len(first))
+        self.assertEqual(links[0].first_position, 0)
+        self.assertEqual(links[0].last_position, 162496)
+        self.assertTrue(links[0].header.startswith(b"\x01vorbis"))
+        self.assertEqual(links[1].serial, 1806412655)
+        self.assertEqual(links[1].offset, len(first))
+        self.assertEqual(links[1].end, len(first) + len(second))
+        self.assertTrue(links[1].header.startswith(b"\x01vorbis"))
+        self.assertTrue(repr(links[1]))
+
+        self.assertEqual(build_chain_index(BytesIO()), [])
+
+    def test_build_chain_index_skips_data(self):
+        class ReadCounter(BytesIO):
+            read_size = 0
+
+            def read(self, *args):
+                data = BytesIO.read(self, *args)
+                self.read_size += len(data)
+                return data
+
+        pages = []
+        for i in range(20):
+            page = OggPage()
+            page.serial = 1
+            page.sequence = i
+            page.first = (i == 0)
+            page.packets = [b"x" * 10000]
+            pages.append(page)
+        fileobj = ReadCounter(b"".join(p.write() for p in pages))
+        links = build_chain_index(fileobj)
+        self.assertEqual(len(links), 1)
+        self.assertEqual(links[0].end, len(fileobj.getvalue()))
+        self.assertEqual(links[0].header, b"x" * 10000)
+        # the first page and the headers of the others
+        self.assertTrue(fileobj.read_size < 12000)
+
+    def test_build_chain_index_truncated(self):
+        pages = []
+        for i in range(3):
+            page = OggPage()
+            page.serial = 1
+            page.sequence = i
+            page.packets = [b"x" * 100]
+            pages.append(page)
+        data = b"".join(p.write() for p in pages)
+        links = build_chain_index(BytesIO(data[:-1]))
+        self.assertEqual(links[0].end, pages[0].size + pages[1].size)
+
+    def test_build_seek_index(self):
+        pages = []
+        for i in range(100):
+            for serial in [1, 2]:
+                page = OggPage()
+                page.serial = serial
+                page.sequence = i
+                page.position = i * 10 if i % 3 else -1
+                page.packets = [b"x" * 100]
+                pages.append(page)
+        pages[-2].last = True
+        fileobj = BytesIO(b"".join(p.write() for p in pages))
+
+        index = build_seek_index(fileobj, 1)
+        expected = [(p.position, p.offset) for p in
+                    OggPage.iter_pages(BytesIO(fileobj.getvalue()))
+                    if p.serial == 1 and p.position != -1]
+        self.assertEqual(list(index), expected)
+        self.assertEqual(len(index), len(expected))
+        self.assertTrue(repr(index))
+
+        index = build_seek_index(fileobj, 1, interval=100)
+        granules = list(index.granules)
+        self.assertEqual(granules[:3], [10, 110, 220])
+        self.assertEqual(index.find(5), None)
+        self.assertEqual(index.find(10), index.offsets[0])
+        self.assertEqual(index.find(219), index.offsets[1])
+        self.assertEqual(index.find(10 ** 9), index.offsets[-1])
+
+        self.assertEqual(len(build_seek_index(fileobj, 3)), 0)
+        self.assertEqual(len(build_seek_index(BytesIO(b"foo"), 1)), 0)
+
+    def test_crc32(self):
+        from mutagen.ogg import _crc32
+
+        def reference(data):
+            crc = 0
+            for byte in data:
+                crc ^= byte << 24
+                for i in range(8):
+                    crc <<= 1
+                    if crc & 0x100000000:
+                        crc ^= 0x104C11DB7
+            return crc
+
+        for data in [b"", b"\x00", b"OggS", bytes(range(256)) * 3]:
+            self.assertEqual(_crc32([data]), reference(data))
+            self.assertEqual(
+                _crc32([data[:5], memoryview(data[5:])]), reference(data))
+
+    def test_crc32_swapped(self):
+        from mutagen.ogg import _crc32, _crc32_swapped
+
+        data = bytes(range(256)) * 3
+        swapped = memoryview(data.translate(cdata.bitswap))
+        self.assertEqual(
+            _crc32_swapped([swapped[:7], swapped[7:]]), _crc32([data]))
+
     def test_crc_py25(self):
         # Make sure page.write can handle both signed/unsigned int
         # return values of crc32.
@@ -661,6 +960,18 @@ class TOggFileTypeMixin(object):
         # deleting shouldn't add padding
         self.assertTrue(os.path.getsize(self.audio.filename) <= filesize)
 
+    def test_save_shrunk_reduces_padding(self):
+        if not self.PADDING_SUPPORT:
+            return
+        size = os.path.getsize(self.filename)
+        self.audio["foo"] = "foo" * (2 ** 16)
+        self.audio.save()
+        del self.audio["foo"]
+        self.audio.save()
+        # too much padding left, so it gets reduced to the default
+        self.assertTrue(os.path.getsize(self.filename) < size + 2 ** 16)
+        self.scan_file()
+
     def test_really_big(self):
         self.audio["foo"] = "foo" * (2 ** 16)
         self.audio["bar"] = "bar" * (2 ** 16)
@@ -4,7 +4,7 @@ from io import BytesIO
 
 from mutagen.oggopus import OggOpus, OggOpusInfo, delete, error
 from mutagen.ogg import OggPage
-from tests import TestCase, DATA_DIR, get_temp_copy
+from tests import TestCase, DATA_DIR, get_temp_copy, WriteCounter
 from tests.test_ogg import TOggFileTypeMixin
 
 
@@ -86,6 +86,38 @@ class TOggOpus(TestCase, TOggFileTypeMixin):
     def test_bitrate(self):
         assert self.audio.info.bitrate == 45243
 
+    def test_save_in_place(self):
+        # fits into the padding, so only the tags page gets written
+        with open(self.filename, "rb") as h:
+            old_pages = list(OggPage.iter_pages(h))
+        fileobj = WriteCounter(self.filename)
+        audio = self.Kind(fileobj)
+        audio["COMMENT"] = ["x" * 100]
+        audio.save(fileobj)
+        self.assertEqual(fileobj.written, old_pages[1].size)
+        self.assertEqual(len(fileobj.getvalue()),
+                         os.path.getsize(self.filename))
+        fileobj.seek(0)
+        self.assertEqual(self.Kind(fileobj)["COMMENT"], ["x" * 100])
+
+    def test_save_grown(self):
+        with open(self.filename, "rb") as h:
+            old_pages = list(OggPage.iter_pages(h))
+        fileobj = WriteCounter(self.filename)
+        audio = self.Kind(fileobj)
+        audio["COMMENT"] = ["x" * 8000]
+        audio.save(fileobj)
+
+        fileobj.seek(0)
+        new_pages = list(OggPage.iter_pages(fileobj))
+        self.assertEqual(len(new_pages), len(old_pages))
+        self.assertEqual(new_pages[2:], old_pages[2:])
+        # the audio pages got moved once and not renumbered
+        moved = sum(p.size for p in old_pages[2:])
+        self.assertTrue(fileobj.written <= moved + 2 * new_pages[1].size)
+        fileobj.seek(0)
+        self.assertEqual(self.Kind(fileobj)["COMMENT"], ["x" * 8000])
+
     def test_bitrate_stable_after_tag_change(self):
         bitrate_before = self.audio.info.bitrate
         assert bitrate_before != 0
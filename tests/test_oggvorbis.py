@@ -6,7 +6,7 @@ from io import BytesIO
 from mutagen.ogg import OggPage
 from mutagen.oggvorbis import OggVorbis, OggVorbisInfo, delete, error
 
-from tests import TestCase, DATA_DIR, get_temp_copy
+from tests import TestCase, DATA_DIR, get_temp_copy, WriteCounter
 from tests.test_ogg import TOggFileTypeMixin
 
 
@@ -173,6 +173,57 @@ class TOggVorbis(TestCase, TOggFileTypeMixin):
             self.failUnlessEqual(vfc[key], self.audio[key])
         self.ogg_reference(self.filename)
 
+    def test_save_grown(self):
+        fn = os.path.join(DATA_DIR, "multipage-setup.ogg")
+        with open(fn, "rb") as h:
+            old_pages = list(OggPage.iter_pages(h))
+        fileobj = WriteCounter(fn)
+        audio = OggVorbis(fileobj)
+        audio["foobar"] = ["quux" * 1000]
+        tags = audio.tags
+        audio.save(fileobj)
+
+        fileobj.seek(0)
+        new_pages = list(OggPage.iter_pages(fileobj))
+        self.assertEqual(len(new_pages), len(old_pages))
+        self.assertEqual(new_pages[3:], old_pages[3:])
+        # the audio pages got moved once and not renumbered
+        moved = sum(p.size for p in old_pages[3:])
+        header = sum(p.size for p in new_pages[1:3])
+        self.assertTrue(fileobj.written <= moved + 2 * header)
+        fileobj.seek(0)
+        self.assertEqual(OggVorbis(fileobj).tags, tags)
+
+    def test_save_in_place(self):
+        fn = os.path.join(DATA_DIR, "multipage-setup.ogg")
+        fileobj = WriteCounter(fn)
+        audio = OggVorbis(fileobj)
+        audio["foobar"] = ["quux" * 1000]
+        audio.save(fileobj, padding=lambda info: 1000)
+        with open(self.filename, "wb") as h:
+            h.write(fileobj.getvalue())
+        with open(self.filename, "rb") as h:
+            old_pages = list(OggPage.iter_pages(h))
+
+        # smaller, keeps the size by using more padding
+        fileobj = WriteCounter(self.filename)
+        audio = OggVorbis(fileobj)
+        audio["foobar"] = ["quux" * 500]
+        audio.save(fileobj)
+        self.assertEqual(fileobj.written, old_pages[1].size)
+        self.assertEqual(len(fileobj.getvalue()),
+                         os.path.getsize(self.filename))
+        fileobj.seek(0)
+        new_pages = list(OggPage.iter_pages(fileobj))
+        self.assertEqual(new_pages[3:], old_pages[3:])
+        fileobj.seek(0)
+        self.assertEqual(OggVorbis(fileobj)["foobar"], ["quux" * 500])
+
+    def test_chain_not_shared(self):
+        other = OggVorbis(self.filename)
+        self.assertEqual(self.audio.info.chain, [])
+        self.assertIsNot(self.audio.info.chain, other.info.chain)
+
     def test_mime(self):
         self.failUnless("audio/vorbis" in self.audio.mime)
 
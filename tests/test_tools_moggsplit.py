@@ -37,3 +37,44 @@ class TMOggSPlit(_TTools):
                 d, str(stream) + ".ogg")
             self.failUnless(os.path.exists(stream_path))
             os.unlink(stream_path)
+
+    def test_copies_pages(self):
+        d = os.path.dirname(self.filename)
+        p = os.path.join(d, "%(stream)d.%(ext)s")
+        res, out = self.call("--pattern", p, self.filename)
+        self.failIf(res)
+
+        for stream, name in [(1002429366, "multipagecomment.ogg"),
+                             (1806412655, "multipage-setup.ogg")]:
+            stream_path = os.path.join(d, str(stream) + ".ogg")
+            with open(stream_path, "rb") as h:
+                data = h.read()
+            os.unlink(stream_path)
+            with open(os.path.join(DATA_DIR, name), "rb") as h:
+                self.assertEqual(data, h.read())
+
+    def test_serial(self):
+        d = os.path.dirname(self.filename)
+        p = os.path.join(d, "%(stream)d.%(ext)s")
+        res, out = self.call(
+            "--serial", "1806412655", "--pattern", p, self.filename)
+        self.failIf(res)
+        self.failIf(out)
+
+        self.failIf(os.path.exists(os.path.join(d, "1002429366.ogg")))
+        stream_path = os.path.join(d, "1806412655.ogg")
+        self.failUnless(os.path.exists(stream_path))
+        os.unlink(stream_path)
+
+    def test_stats(self):
+        d = os.path.dirname(self.filename)
+        p = os.path.join(d, "%(stream)d.%(ext)s")
+        res, out = self.call("--stats", "--pattern", p, self.filename)
+        self.failIf(res)
+
+        size = os.path.getsize(os.path.join(DATA_DIR, "multipage-setup.ogg"))
+        self.assertTrue("- 1806412655: " in out)
+        self.assertTrue(" %d bytes" % size in out)
+        self.assertTrue(self.filename in out)
+        for stream in [1002429366, 1806412655]:
+            self.failIf(os.path.exists(os.path.join(d, "%d.ogg" % stream)))
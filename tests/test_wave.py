@@ -1,5 +1,6 @@
 
 import os
+from io import BytesIO
 
 from mutagen.wave import WAVE
 from mutagen._iff import InvalidChunk
@@ -32,6 +33,30 @@ class TWave(TestCase):
             os.path.join(DATA_DIR, "silence-2s-PCM-44100-16-ID3v23.wav")
         self.wav_pcm_2s_44100_16_ID3v23 = WAVE(fn_wav_pcm_2s_44100_16_id3v23)
 
+    def test_iter_pictures(self):
+        wave = self.wav_pcm_2s_16000_08_ID3v23
+        apic = wave.tags.getall("APIC")[0]
+        pictures = list(wave.iter_pictures())
+        self.assertEqual(len(pictures), 1)
+        self.assertEqual(pictures[0].mime, apic.mime)
+        self.assertEqual(pictures[0].type, apic.type)
+        self.assertEqual(pictures[0].size, len(apic.data))
+        with open(wave.filename, "rb") as h:
+            h.seek(pictures[0].offset)
+            self.assertEqual(h.read(pictures[0].size), apic.data)
+        dest = BytesIO()
+        wave.extract_picture(0, dest)
+        self.assertEqual(dest.getvalue(), apic.data)
+
+        apic.data = b"foo"
+        picture, = wave.iter_pictures()
+        self.assertTrue(picture.offset is None)
+        dest = BytesIO()
+        wave.extract_picture(0, dest)
+        self.assertEqual(dest.getvalue(), b"foo")
+        self.assertEqual(
+            list(self.wav_pcm_2s_16000_08_notags.iter_pictures()), [])
+
     def test_channels(self):
         self.failUnlessEqual(self.wav_pcm_2s_16000_08_ID3v23.info.channels, 2)
         self.failUnlessEqual(self.wav_pcm_2s_44100_16_ID3v23.info.channels, 2)